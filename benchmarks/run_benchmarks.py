@@ -0,0 +1,207 @@
+# File: grid_parser_project/benchmarks/run_benchmarks.py
+# Purpose: Time + peak-memory benchmarks of the pipeline hot paths, with stored baselines
+#
+# Usage (from the project root):
+#   python -m benchmarks.run_benchmarks                       # compare against baselines
+#   python -m benchmarks.run_benchmarks --update-baselines    # record new baselines
+#   python -m benchmarks.run_benchmarks --sizes 1000 1000000 --only map_ui_to_grid
+
+import os, sys, io, json, time, argparse, tempfile, tracemalloc, contextlib, platform
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import (
+    make_components, make_ocr_table, write_workload, make_evaluation_table
+)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+REGRESSION_THRESHOLD = 1.25  # fail when time or peak memory grows by more than 25%
+
+
+# ----------------------
+# Benchmark definitions: setup(n, tmp) -> zero-argument callable
+# ----------------------
+def _bench_map_ui_to_grid(n, tmp):
+    from step2_grid_parsing import map_ui_to_grid
+    comps = make_components(n)
+    return lambda: map_ui_to_grid([dict(c) for c in comps], 8, 8)
+
+
+def _bench_evaluate_grid_variants(n, tmp):
+    import step2_grid_parsing
+    json_dir, shot_dir = write_workload(tmp, n)
+    step2_grid_parsing.UI_DATA_DIR = tmp
+    step2_grid_parsing.RESULTS_DIR = os.path.join(tmp, "results")
+    return lambda: step2_grid_parsing.evaluate_grid_variants(json_dir=json_dir, screenshot_dir=shot_dir)
+
+
+def _bench_calculate_layout_metrics(n, tmp):
+    from step4_metrics_evaluation import calculate_layout_metrics
+    json_dir, shot_dir = write_workload(tmp, n)
+    with open(os.path.join(json_dir, os.listdir(json_dir)[0]), "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    def run():
+        for g in (4, 8, 16):
+            calculate_layout_metrics(data, rows=g, cols=g, screenshot_dir=shot_dir)
+    return run
+
+
+def _bench_compute_step_metrics(n, tmp):
+    # Step 4's path: all pages and grid sizes in one columnar pass
+    from utils.metrics_engine import compute_step_metrics
+    json_dir, shot_dir = write_workload(tmp, n, pages=4)
+    # In-process loading, for the same reasons as step 8 below
+    return lambda: compute_step_metrics(json_dir, shot_dir, (4, 8, 16), workers=1)
+
+
+def _bench_ocr_matching(n, tmp):
+    from step3_computer_vision import annotate_components_with_ocr
+    comps = make_components(n)
+    ocr_df = make_ocr_table(comps)
+    return lambda: annotate_components_with_ocr([dict(c) for c in comps], ocr_df)
+
+
+def _bench_convert_json_to_yolo(n, tmp):
+    from step3_computer_vision import convert_json_to_yolo
+    json_dir, shot_dir = write_workload(tmp, n)
+    json_file = os.path.join(json_dir, os.listdir(json_dir)[0])
+    with open(json_file, "r", encoding="utf-8") as f:
+        shot = os.path.join(shot_dir, json.load(f)["Screenshot"])
+    out_dir = os.path.join(tmp, "yolo")
+    os.makedirs(out_dir, exist_ok=True)
+    return lambda: convert_json_to_yolo(json_file, out_dir, shot)
+
+
+def _bench_step8_final_evaluation(n, tmp):
+    import step8_final_analysis
+    from utils.result_store import write_results
+    results_dir = os.path.join(tmp, "results")
+    n_domains = max(10, n // 1000)
+    for step, seed in (("step1", 1), ("step5", 5), ("step7", 7)):
+        write_results(make_evaluation_table(n_domains, seed), "evaluation",
+                      os.path.join(results_dir, f"evaluation_results_{step}.parquet"))
+    plots_dir = os.path.join(tmp, "plots")
+    os.makedirs(plots_dir, exist_ok=True)
+    step8_final_analysis.RESULTS_DIR = results_dir
+    step8_final_analysis.UI_DATA_DIR = tmp
+    step8_final_analysis.PLOTS_DIR = plots_dir
+    # In-process rendering: tracemalloc does not see figure worker processes, and serial timings
+    # do not depend on the core count of the machine the baselines were recorded on
+    return lambda: step8_final_analysis.step8_final_evaluation(workers=1)
+
+
+# name -> (setup, largest size run by default; the OCR loop is quadratic)
+BENCHMARKS = {
+    "map_ui_to_grid": (_bench_map_ui_to_grid, None),
+    "evaluate_grid_variants": (_bench_evaluate_grid_variants, None),
+    "calculate_layout_metrics": (_bench_calculate_layout_metrics, None),
+    "compute_step_metrics": (_bench_compute_step_metrics, None),
+    "ocr_matching": (_bench_ocr_matching, 20_000),
+    "convert_json_to_yolo": (_bench_convert_json_to_yolo, None),
+    "step8_final_evaluation": (_bench_step8_final_evaluation, None),
+}
+
+
+# ----------------------
+# Measurement
+# ----------------------
+def measure(fn, repeat=3):
+    """Best wall time over `repeat` runs and peak traced Python/NumPy memory (MB) of one run."""
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"seconds": round(min(times), 6), "peak_mb": round(peak / 2 ** 20, 3)}
+
+
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baselines(results, path=BASELINE_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "machine": f"{platform.node()} / {platform.processor() or platform.machine()} / py{platform.python_version()}",
+            "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results,
+        }, f, indent=4)
+        f.write("\n")
+
+
+def compare(key, result, baseline, threshold):
+    """Return a list of regression messages for one benchmark result."""
+    problems = []
+    for metric in ("seconds", "peak_mb"):
+        base = baseline.get(metric)
+        if base and result[metric] > base * threshold:
+            problems.append(f"{key}: {metric} {result[metric]} > {threshold:.2f} x baseline {base}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grid parser hot-path benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="component counts per synthetic page (1k..1M)")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run a subset")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--baselines", default=BASELINE_FILE)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--no-caps", action="store_true", help="also run capped benchmarks at large sizes")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baselines)
+    results, regressions = {}, []
+
+    for name in args.only or BENCHMARKS:
+        setup, cap = BENCHMARKS[name]
+        for n in args.sizes:
+            key = f"{name}@{n}"
+            if cap and n > cap and not args.no_caps:
+                print(f"{key:<36} skipped (cap {cap}, use --no-caps)")
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        fn = setup(n, tmp)
+                except ImportError as e:
+                    print(f"{key:<36} skipped (missing dependency: {e.name})")
+                    continue
+                res = measure(fn, args.repeat)
+            results[key] = res
+
+            base = baselines.get(key, {})
+            delta = f" ({res['seconds'] / base['seconds']:.2f}x baseline)" if base.get("seconds") else ""
+            print(f"{key:<36} {res['seconds']:>10.4f} s  {res['peak_mb']:>10.2f} MB{delta}")
+            regressions += compare(key, res, base, args.threshold)
+
+    if args.update_baselines:
+        merged = dict(baselines)
+        merged.update(results)
+        save_baselines(merged, args.baselines)
+        print(f"Baselines updated: {args.baselines}")
+        return 0
+
+    if regressions:
+        print("\nPerformance regressions:")
+        for r in regressions:
+            print(f"  - {r}")
+        return 1
+    print("\nNo regressions against stored baselines." if baselines else "\nNo baselines stored yet (run with --update-baselines).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
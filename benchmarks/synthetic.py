@@ -0,0 +1,109 @@
+# File: grid_parser_project/benchmarks/synthetic.py
+# Purpose: Synthetic workloads (UI JSONs, screenshots, OCR tables, evaluation tables) for benchmarks
+
+import os, json
+import cv2
+import numpy as np
+import pandas as pd
+
+TAGS = ["div", "a", "img", "button", "input"]
+TAG_WEIGHTS = [0.55, 0.25, 0.1, 0.06, 0.04]
+SCREEN_W, SCREEN_H = 1920, 1080
+
+
+def make_components(n, seed=0, page_h=None):
+    """n UI components in the same shape as step 1 output (already mapped to the 8x8 grid)."""
+    rng = np.random.default_rng(seed)
+    page_h = page_h or max(SCREEN_H, int(n ** 0.5 * 60))
+    tags = rng.choice(TAGS, size=n, p=TAG_WEIGHTS)
+    xs = rng.integers(0, SCREEN_W - 10, n)
+    ys = rng.integers(0, page_h - 10, n)
+    ws = rng.integers(10, 400, n)
+    hs = rng.integers(10, 120, n)
+    cell_w, cell_h = SCREEN_W // 8, SCREEN_H // 8
+    return [
+        {
+            "Tag": str(t), "Text": "N/A", "Role": "", "AriaLabel": "",
+            "Class": "btn primary" if t == "button" else "", "InnerHTML": "",
+            "X": int(x), "Y": int(y), "Width": int(w), "Height": int(h),
+            "Grid_Row": int(y) // cell_h, "Grid_Col": int(x) // cell_w,
+        }
+        for t, x, y, w, h in zip(tags.tolist(), xs.tolist(), ys.tolist(), ws.tolist(), hs.tolist())
+    ]
+
+
+def make_ui_json(n, seed=0, domain=None):
+    domain = domain or f"synthetic{n}_com"
+    return {
+        "URL": f"https://www.{domain.replace('_', '.')}",
+        "Step": "step1",
+        "Viewport": "Desktop",
+        "Screenshot": f"{domain}_desktop.png",
+        "Resolution": f"{SCREEN_W}x{SCREEN_H}",
+        "Category": "General E-Commerce",
+        "UI Components": make_components(n, seed),
+    }
+
+
+def make_screenshot(path, comps=(), w=SCREEN_W, h=SCREEN_H, seed=0, max_boxes=20_000):
+    """A screenshot-like PNG: noise background with filled boxes for (up to max_boxes) components."""
+    rng = np.random.default_rng(seed)
+    img = np.full((h, w, 3), 245, dtype=np.uint8)
+    img += rng.integers(0, 8, (h, w, 1), dtype=np.uint8)
+    for c in list(comps)[:max_boxes]:
+        if c["Y"] < h:
+            color = tuple(int(v) for v in rng.integers(0, 255, 3))
+            cv2.rectangle(img, (c["X"], c["Y"]), (c["X"] + c["Width"], c["Y"] + c["Height"]), color, 2)
+    cv2.imwrite(path, img)
+    return path
+
+
+def make_ocr_table(comps, words_per_comp=0.5, seed=0):
+    """Tesseract-like image_to_data frame with words placed inside a share of the components."""
+    rng = np.random.default_rng(seed)
+    n_words = max(1, int(len(comps) * words_per_comp))
+    idx = rng.integers(0, len(comps), n_words) if comps else np.zeros(0, dtype=int)
+    rows = []
+    for i in idx.tolist():
+        c = comps[i]
+        rows.append({
+            "left": c["X"] + 2, "top": c["Y"] + 2,
+            "width": max(1, min(60, c["Width"] - 4)), "height": max(1, min(14, c["Height"] - 4)),
+            "conf": 90.0, "text": f"word{i}",
+        })
+    return pd.DataFrame(rows, columns=["left", "top", "width", "height", "conf", "text"])
+
+
+def write_workload(root, n, pages=1, seed=0):
+    """Write `pages` JSONs of n components plus their screenshots; returns (json_dir, screenshot_dir)."""
+    json_dir = os.path.join(root, "json")
+    shot_dir = os.path.join(root, "screenshots")
+    os.makedirs(json_dir, exist_ok=True)
+    os.makedirs(shot_dir, exist_ok=True)
+    for p in range(pages):
+        data = make_ui_json(n, seed + p, domain=f"synthetic{n}_{p}_com")
+        make_screenshot(os.path.join(shot_dir, data["Screenshot"]), data["UI Components"], seed=seed + p)
+        with open(os.path.join(json_dir, f"synthetic{n}_{p}_com.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    return json_dir, shot_dir
+
+
+def make_evaluation_table(n_domains, seed=0, grid_sizes=(4, 8, 16)):
+    """Step 4 style evaluation rows (typed) for n_domains domains."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for d in range(n_domains):
+        density = float(rng.uniform(1e-5, 1e-3))
+        entropy = float(rng.uniform(0.5, 2.2))
+        cr_file = float(rng.uniform(0.3, 0.9))
+        for g in grid_sizes:
+            rows.append({
+                "JSON_File": f"domain{d}.json", "Domain": f"domain{d}_{seed}", "Grid_Size": f"{g}x{g}",
+                "Grid_Consistency(%)": float(rng.uniform(0, 100)), "Hit_Rate(%)": float(rng.uniform(0, 100)),
+                "Density": density, "Variability": entropy, "Compression_Ratio": float(rng.uniform(0, 5)),
+                "Entropy": entropy, "CR_File": cr_file,
+                "Screenshot_Size(Bytes)": int(rng.integers(1e5, 5e6)),
+                "Compressed_JPG_Size(Bytes)": int(rng.integers(5e4, 1e6)),
+                "P_Score": float(rng.uniform(0, 1)),
+            })
+    return pd.DataFrame(rows)
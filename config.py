@@ -29,6 +29,8 @@ SCREENSHOT_DIR_STEP5 = os.path.join(SCREENSHOT_DIR, "step5")
 SCREENSHOT_DIR_STEP7 = os.path.join(SCREENSHOT_DIR, "step7")
 
 UI_DATA_DIR = os.path.join(PROJECT_ROOT, "ui_data")
+RESULTS_DIR = os.path.join(UI_DATA_DIR, "results")  # typed Parquet metric tables (CSV = export only)
+HISTORY_DIR = os.path.join(RESULTS_DIR, "history")  # every run's tables: step=<step>/run_id=<run>/part-0.parquet
 GRID_OUTPUT_DIR = os.path.join(PROJECT_ROOT, "screenshots_with_grid")
 
 # ✅ Step-specific grid overlay folders
@@ -38,6 +40,7 @@ GRID_OUTPUT_DIR_STEP7 = os.path.join(GRID_OUTPUT_DIR, "step7")
 
 PROCESSED_IMG_DIR = os.path.join(PROJECT_ROOT, "processed_screenshots")
 YOLO_ANN_DIR = os.path.join(PROJECT_ROOT, "yolo_annotations")
+YOLO_DATASET_DIR = os.path.join(PROJECT_ROOT, "yolo_dataset")  # images/{train,val} + labels/{train,val}
 
 # ✅ Final: only step-specific JSON and CSV directories
 JSON_SUBDIR_STEP1 = os.path.join(UI_DATA_DIR, "json_data", "step1")
@@ -67,15 +70,128 @@ INTERACTION_SHOT_DIR_STEP5 = os.path.join(INTERACTION_SHOT_DIR, "step5")
 INTERACTION_SHOT_DIR_STEP6 = os.path.join(INTERACTION_SHOT_DIR, "step6")
 INTERACTION_SHOT_DIR_STEP7 = os.path.join(INTERACTION_SHOT_DIR, "step7")
 
+# "delta": one keyframe per page + changed-region patches per interaction; "full": one PNG per interaction
+INTERACTION_SHOT_MODE = "delta"
+
+# Step 6 click effects: wait until the DOM has been quiet for QUIET ms (at most TIMEOUT ms)
+CLICK_EFFECT_TIMEOUT_MS = 2000
+CLICK_EFFECT_QUIET_MS = 500
+
+# Step 6 runner: sites in parallel (one browser per worker), per-site time budget and waits
+STEP6_WORKERS = 2
+STEP6_SITE_BUDGET_S = 300
+STEP6_PAGE_LOAD_TIMEOUT_S = 30
+STEP6_HIGHLIGHT_MS = 1000      # visible runs only; headless runs never highlight
+STEP6_FOCUS_TIMEOUT_S = 1.0    # wait for an input to take focus before typing
+STEP6_RESUME = True            # an interrupted run skips components already in <domain>_interactions.jsonl
+
+# Step 6 planner: click candidates in order of expected success learned from earlier logs
+STEP6_PLANNER = True
+STEP6_CLICK_BUDGET = None      # max click candidates per site and run (None = no limit)
+STEP6_HISTORY_DIRS = [LOG_DIR_STEP5, LOG_DIR_STEP6, LOG_DIR_STEP7]
+
 PLOTS_DIR = os.path.join(PROJECT_ROOT, "plots")
 
+# Step 8: artifacts to write (None = all; e.g. ["stats"] for the CSVs only), figure processes, HTML bundle
+STEP8_ARTIFACTS = None
+STEP8_FIGURE_WORKERS = 4
+STEP8_HTML_REPORT = False
+# Run range for the history artifact (run IDs are UTC timestamps like 20261019T020000Z; None = open end)
+STEP8_RUN_FROM = None
+STEP8_RUN_TO = None
+STEP8_LAST_RUNS = None         # or only the last N runs
+
+# main.py DAG executor: recorded input hashes per step, parallel branches (step1-4, step5, step7)
+PIPELINE_STATE_FILE = os.path.join(LOG_DIR, "pipeline_state.json")
+PIPELINE_WORKERS = 3
+
+# Run instrumentation: per step/domain/stage report (JSON) + Prometheus textfile for node_exporter
+INSTRUMENTATION = True
+RUN_REPORT_DIR = os.path.join(LOG_DIR, "run_reports")
+PROMETHEUS_TEXTFILE = os.path.join(LOG_DIR, "grid_parser.prom")
+PROFILE_STEPS = []             # steps to sample with the stack profiler, e.g. ["step3"] (or --profile)
+PROFILE_DIR = os.path.join(LOG_DIR, "profiles")
+PROFILE_INTERVAL_MS = 5
+
+# Viewports captured by step 1 (and steps 5/7) from one page load; the others are switched to with
+# DevTools device-metrics emulation, e.g. ["Desktop", "Tablet", "Mobile"]
+VIEWPORT_PROFILES = {
+    "Desktop": {"width": 1920, "height": 1080, "mobile": False},
+    "Tablet": {"width": 768, "height": 1024, "mobile": True},
+    "Mobile": {"width": 390, "height": 844, "mobile": True},
+}
+CAPTURE_VIEWPORTS = ["Desktop"]
+VIEWPORT_SETTLE_S = 1.5        # reflow / lazy-load wait after switching viewport
+
+# Page archive for steps 1 and 6: "record" stores every response of each captured page,
+# "replay" serves pages from the archive through a local proxy (no network), None = live
+PAGE_ARCHIVE_MODE = os.environ.get("GRID_PARSER_ARCHIVE") or None
+PAGE_ARCHIVE_DIR = os.path.join(PROJECT_ROOT, "page_archive")
+
+# crawl_worker.py work queue (SQLite = single host / testing) and shared results (<run>/<kind>/<domain>.json)
+WORK_QUEUE_DB = os.path.join(LOG_DIR, "work_queue.sqlite")
+SHARED_RESULTS_DIR = os.path.join(UI_DATA_DIR, "shared_results")
+QUEUE_LEASE_S = 900            # extended while a batch runs; expiry = worker presumed dead
+QUEUE_MAX_ATTEMPTS = 3         # then the task is dead-lettered
+QUEUE_BACKOFF_S = 60           # retry delay doubles per attempt (with jitter) ...
+QUEUE_BACKOFF_MAX_S = 1800     # ... up to this
+QUEUE_BATCH = 4                # tasks per lease (one browser per batch)
+QUEUE_POLL_S = 5
+
 # --------------------
 # YOLO CONFIG
 # --------------------
 YOLO_PRETRAINED_WEIGHTS = "yolov8s.pt"
 YOLO_DATA_PATH = "ui_dataset.yaml"
+YOLO_VAL_FRACTION = 0.2  # share of unique screenshots (by content hash) in the val split
 YOLO_TRAIN_PROJECT = "yolo_training"
 YOLO_TRAIN_NAME = "ui_element_detection"
+YOLO_TRAINED_WEIGHTS = os.path.join(YOLO_TRAIN_PROJECT, YOLO_TRAIN_NAME, "weights", "best.pt")
+YOLO_CLASS_NAMES = ["button", "input", "a", "img", "other"]  # index = YOLO class id
+
+# CPU inference (exported model)
+YOLO_EXPORT_FORMAT = "onnx"  # or "openvino"
+YOLO_INFERENCE_IMGSZ = 640
+YOLO_INFERENCE_BATCH = 8
+YOLO_CONF_THRESHOLD = 0.25
+
+# --------------------
+# ONLINE METRICS
+# --------------------
+# Compute Step 4 metrics while Step 1 extracts components (the batch Step 4 pass is then skipped)
+ONLINE_METRICS = False
+
+# --------------------
+# APPROXIMATE METRICS
+# --------------------
+# Pages with at least APPROX_MIN_COMPONENTS components get entropy, tag variety and hit rates
+# from a sample sized so that each confidence interval is within APPROX_TOLERANCE (rates, absolute)
+# or APPROX_ENTROPY_TOLERANCE (entropy, relative); flagged in output. Pages that would need more
+# than a quarter of their components sampled are evaluated exactly.
+APPROX_METRICS = False
+APPROX_MIN_COMPONENTS = 200_000
+APPROX_TOLERANCE = 0.01
+APPROX_ENTROPY_TOLERANCE = 0.01
+APPROX_CONFIDENCE = 0.95
+
+# --------------------
+# EVALUATION METRICS
+# --------------------
+# Extra registered metrics (utils.metric_registry) added to the Step 4 evaluation tables, one column
+# each named after the metric. P_Score uses whatever weighting is registered under "P_Score".
+EVALUATION_METRICS = []
+
+# Expensive screenshot metrics (CR_File's JPEG encode) shared by steps 2 and 4
+# and kept across runs: one file per screenshot directory, entries keyed by screenshot path and mtime
+METRIC_CACHE_DIR = os.path.join(LOG_DIR, "metric_cache")
+
+# --------------------
+# CV PREPROCESSING CONFIG
+# --------------------
+# Stages whose intermediate images are written to PROCESSED_IMG_DIR (opt-in, off in production).
+# Available: "gray", "blur", "thresh", "contours", "boxes" ("boxes" = final contour overlay)
+CV_DEBUG_STAGES = []
+CV_PRINT_TIMINGS = True
 
 # --------------------
 # TESSERACT CONFIG
@@ -87,13 +203,13 @@ pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tess
 # --------------------
 for directory in [
     SCREENSHOT_DIR, SCREENSHOT_DIR_STEP1, SCREENSHOT_DIR_STEP7, SCREENSHOT_DIR_STEP5,
-    UI_DATA_DIR,
+    UI_DATA_DIR, RESULTS_DIR, HISTORY_DIR,
     JSON_SUBDIR_STEP1, JSON_SUBDIR_STEP7, JSON_SUBDIR_STEP5,
-    CSV_SUBDIR_STEP1, CSV_SUBDIR_STEP7, CSV_SUBDIR_STEP5,
+    CSV_SUBDIR_STEP1, CSV_SUBDIR_STEP7, CSV_SUBDIR_STEP5, BEST_GRID_JSON_DIR_STEP5,
     GRID_OUTPUT_DIR, GRID_OUTPUT_DIR_STEP1, GRID_OUTPUT_DIR_STEP7, GRID_OUTPUT_DIR_STEP5,
     PROCESSED_IMG_DIR, YOLO_ANN_DIR,
-    LOG_DIR, LOG_DIR_STEP1, LOG_DIR_STEP6, LOG_DIR_STEP7, LOG_DIR_STEP5,
+    LOG_DIR, LOG_DIR_STEP1, LOG_DIR_STEP6, LOG_DIR_STEP7, LOG_DIR_STEP5, RUN_REPORT_DIR, PROFILE_DIR, METRIC_CACHE_DIR,
     INTERACTION_SHOT_DIR, INTERACTION_SHOT_DIR_STEP1, INTERACTION_SHOT_DIR_STEP6, INTERACTION_SHOT_DIR_STEP7,
-    PLOTS_DIR
+    PLOTS_DIR, PAGE_ARCHIVE_DIR
 ]:
     os.makedirs(directory, exist_ok=True)
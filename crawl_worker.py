@@ -0,0 +1,157 @@
+# File: grid_parser_project/crawl_worker.py
+# Purpose: Queue-driven capture / step 6 workers, so several crawler hosts can share one crawl
+
+import os, time, socket, argparse
+from urllib.parse import urlparse
+from step1_data_collection import capture_ui_screenshots
+from step6_ai_integration import step6_ai_integration
+from utils.work_queue import SQLiteWorkQueue, FileResultStore, LeaseKeeper
+from utils.run_history import current_run_id
+from utils.metric_registry import viewport_suffix
+from config import (
+    E_COMMERCE_WEBSITES, TEST_URLS_STEP5, BLOG_MEDIA_URLS, ONLINE_METRICS,
+    SCREENSHOT_DIR_STEP1, SCREENSHOT_DIR_STEP5, SCREENSHOT_DIR_STEP7,
+    JSON_SUBDIR_STEP1, JSON_SUBDIR_STEP5, JSON_SUBDIR_STEP7,
+    LOG_DIR_STEP6, LOG_DIR_STEP5, LOG_DIR_STEP7,
+    INTERACTION_SHOT_DIR_STEP6, INTERACTION_SHOT_DIR_STEP5, INTERACTION_SHOT_DIR_STEP7,
+    WORK_QUEUE_DB, SHARED_RESULTS_DIR, QUEUE_LEASE_S, QUEUE_MAX_ATTEMPTS,
+    QUEUE_BACKOFF_S, QUEUE_BACKOFF_MAX_S, QUEUE_BATCH, QUEUE_POLL_S, CAPTURE_VIEWPORTS
+)
+
+# Per pipeline step: default URLs and where captures / interaction logs go
+STEP_DIRS = {
+    "step1": {"urls": E_COMMERCE_WEBSITES, "screenshots": SCREENSHOT_DIR_STEP1, "json": JSON_SUBDIR_STEP1,
+              "logs": LOG_DIR_STEP6, "shots": INTERACTION_SHOT_DIR_STEP6},
+    "step5": {"urls": TEST_URLS_STEP5, "screenshots": SCREENSHOT_DIR_STEP5, "json": JSON_SUBDIR_STEP5,
+              "logs": LOG_DIR_STEP5, "shots": INTERACTION_SHOT_DIR_STEP5},
+    "step7": {"urls": BLOG_MEDIA_URLS, "screenshots": SCREENSHOT_DIR_STEP7, "json": JSON_SUBDIR_STEP7,
+              "logs": LOG_DIR_STEP7, "shots": INTERACTION_SHOT_DIR_STEP7},
+}
+
+
+def domain_of(url):
+    return urlparse(url).netloc.replace("www.", "").replace(".", "_")
+
+
+# ----------------------
+# Handlers: one call per leased batch of the same kind and step; {task.id: (ok, record or error)}
+# ----------------------
+def handle_capture(tasks, step, headless):
+    dirs = STEP_DIRS[step]
+    started = time.time()
+    capture_ui_screenshots([t.key for t in tasks], headless=headless, screenshot_dir=dirs["screenshots"],
+                           online_metrics=ONLINE_METRICS)
+    out = {}
+    for t in tasks:
+        # capture_ui_screenshots logs and skips failing URLs; a fresh JSON is the success signal
+        json_path = os.path.join(dirs["json"], f"{domain_of(t.key)}{viewport_suffix(CAPTURE_VIEWPORTS[0])}.json")
+        if os.path.isfile(json_path) and os.path.getmtime(json_path) >= started:
+            out[t.id] = (True, {"url": t.key, "json": json_path, "screenshot_dir": dirs["screenshots"]})
+        else:
+            out[t.id] = (False, "no capture written (blocked page or capture error)")
+    return out
+
+
+def handle_step6(tasks, step, headless):
+    dirs = STEP_DIRS[step]
+    summaries = step6_ai_integration([t.key for t in tasks], headless=headless, json_dir=dirs["json"],
+                                     log_dir=dirs["logs"], screenshot_dir=dirs["shots"])
+    out = {}
+    for t in tasks:
+        summary = summaries.get(t.key)
+        out[t.id] = (True, summary) if summary else (False, "site skipped or failed (see step 6 output)")
+    return out
+
+
+HANDLERS = {"capture": handle_capture, "step6": handle_step6}
+
+
+# ----------------------
+# Worker loop
+# ----------------------
+def run_worker(queue, store, kinds, worker_id=None, headless=True, batch=QUEUE_BATCH,
+               lease_s=QUEUE_LEASE_S, poll_s=QUEUE_POLL_S, exit_when_idle=True):
+    """
+    Lease up to `batch` tasks at a time, run them (one browser per batch), then mark each task
+    done (result stored under its run and domain) or failed (retried with backoff, dead-lettered
+    after the queue's max attempts). Leases are extended while a batch runs.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    print(f"[WORKER] {worker_id} serving {', '.join(kinds)}")
+    while True:
+        tasks = queue.lease(worker_id, kinds, lease_s, limit=batch)
+        if not tasks:
+            pending = sum(n for per_kind in queue.stats().values() for state, n in per_kind.items()
+                          if state in ("queued", "leased"))
+            if exit_when_idle and not pending:
+                print(f"[WORKER] {worker_id}: queue drained.")
+                return
+            time.sleep(poll_s)
+            continue
+
+        groups = {}
+        for t in tasks:
+            groups.setdefault((t.kind, t.payload.get("step", "step1")), []).append(t)
+        for (kind, step), group in groups.items():
+            print(f"[WORKER] {worker_id}: {kind}/{step} x{len(group)}: {', '.join(t.key for t in group)}")
+            with LeaseKeeper(queue, group, lease_s):
+                try:
+                    outcome = HANDLERS[kind](group, step, headless)
+                except Exception as e:
+                    outcome = {t.id: (False, f"{type(e).__name__}: {e}") for t in group}
+            for t in group:
+                ok, detail = outcome[t.id]
+                if ok:
+                    # The result is stored either way: a worker that took over the task writes the same key
+                    store.put(t.run_id, kind, domain_of(t.key), dict(detail or {}, worker=worker_id, attempts=t.attempts))
+                    if not queue.complete(t):
+                        print(f"[WORKER] {t.key} ({kind}): lease lost before completion; left to its new holder")
+                else:
+                    state = queue.fail(t, detail)
+                    print(f"[WORKER] {t.key} ({kind}) failed on attempt {t.attempts}: {detail} -> {state}")
+
+
+def open_queue(path=WORK_QUEUE_DB):
+    return SQLiteWorkQueue(path, max_attempts=QUEUE_MAX_ATTEMPTS, backoff_s=QUEUE_BACKOFF_S,
+                           backoff_max_s=QUEUE_BACKOFF_MAX_S)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl work queue: enqueue URLs, run workers, inspect status")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    enq = sub.add_parser("enqueue", help="queue URLs for capture or step 6")
+    enq.add_argument("kind", choices=sorted(HANDLERS))
+    enq.add_argument("--step", choices=sorted(STEP_DIRS), default="step1")
+    enq.add_argument("--urls", nargs="+", help="defaults to the step's URL list from config")
+    enq.add_argument("--run-id", default=None)
+
+    work = sub.add_parser("work", help="serve the queue until it is drained (or forever with --follow)")
+    work.add_argument("--kinds", nargs="+", choices=sorted(HANDLERS), default=sorted(HANDLERS))
+    work.add_argument("--batch", type=int, default=QUEUE_BATCH)
+    work.add_argument("--visible", action="store_true", help="show the browser")
+    work.add_argument("--follow", action="store_true", help="keep polling when the queue is empty")
+
+    status = sub.add_parser("status", help="task counts and dead letters")
+    status.add_argument("--run-id", default=None)
+
+    retry = sub.add_parser("requeue-dead", help="give dead-lettered tasks new attempts")
+    retry.add_argument("--run-id", default=None)
+
+    args = parser.parse_args()
+    queue = open_queue()
+
+    if args.cmd == "enqueue":
+        run_id = args.run_id or current_run_id()
+        added = queue.enqueue(run_id, args.kind, args.urls or STEP_DIRS[args.step]["urls"], {"step": args.step})
+        print(f"Queued {added} {args.kind} tasks for run {run_id}.")
+    elif args.cmd == "work":
+        run_worker(queue, FileResultStore(SHARED_RESULTS_DIR), args.kinds, headless=not args.visible,
+                   batch=args.batch, exit_when_idle=not args.follow)
+    elif args.cmd == "status":
+        for kind, states in queue.stats(args.run_id).items():
+            print(f"{kind}: " + ", ".join(f"{s}={n}" for s, n in sorted(states.items())))
+        for d in queue.dead_letters(args.run_id):
+            print(f"DEAD {d['run_id']} {d['kind']} {d['key']} after {d['attempts']} attempts: {d['last_error']}")
+    elif args.cmd == "requeue-dead":
+        print(f"Re-queued {queue.requeue_dead(args.run_id)} tasks.")
@@ -1,7 +1,7 @@
 # File: grid_parser_project/main.py
 # Purpose: Main script to run the full pipeline
 
-import time  # 👈 Add this
+import os, time, argparse
 from step1_data_collection import capture_ui_screenshots
 from step2_grid_parsing import process_ui_data_step2
 from step3_computer_vision import process_step3
@@ -10,38 +10,103 @@ from step5_prototype import step5_prototype_development
 from step6_ai_integration import step6_ai_integration
 from step7_generalization import step7_generalization_and_adaptability
 from step8_final_analysis import step8_final_evaluation
-from config import E_COMMERCE_WEBSITES, TEST_URLS_STEP5, BLOG_MEDIA_URLS
+from utils.pipeline_dag import Node, Pipeline
+from utils import instrumentation
+from utils.run_history import current_run_id
+from config import (
+    E_COMMERCE_WEBSITES, TEST_URLS_STEP5, BLOG_MEDIA_URLS, ONLINE_METRICS,
+    SCREENSHOT_DIR_STEP1, SCREENSHOT_DIR_STEP5, SCREENSHOT_DIR_STEP7,
+    JSON_SUBDIR_STEP1, JSON_SUBDIR_STEP5, JSON_SUBDIR_STEP7, BEST_GRID_JSON_DIR_STEP5,
+    GRID_OUTPUT_DIR_STEP1, PROCESSED_IMG_DIR, YOLO_ANN_DIR,
+    LOG_DIR_STEP5, LOG_DIR_STEP6, LOG_DIR_STEP7,
+    UI_DATA_DIR, RESULTS_DIR, PLOTS_DIR,
+    PIPELINE_STATE_FILE, PIPELINE_WORKERS,
+    INSTRUMENTATION, RUN_REPORT_DIR, PROMETHEUS_TEXTFILE, PROFILE_STEPS, PROFILE_DIR, PROFILE_INTERVAL_MS,
+    PAGE_ARCHIVE_MODE, PAGE_ARCHIVE_DIR, CAPTURE_VIEWPORTS, EVALUATION_METRICS
+)
 
 
-if __name__ == "__main__":
-    start_time = time.time()  # Start tracking
+def _results(step):
+    return os.path.join(RESULTS_DIR, f"evaluation_results_{step}.parquet")
+
+
+def _capture_params(params):
+    """
+    Steps that crawl live sites have no input files to hash: key them on the run ID so every
+    run recaptures. Under page archive replay the archive is hashed instead (see _capture_inputs).
+    """
+    params = dict(params, viewports=CAPTURE_VIEWPORTS, archive_mode=PAGE_ARCHIVE_MODE)
+    return params if PAGE_ARCHIVE_MODE == "replay" else dict(params, run_id=current_run_id())
 
-    print("\n=== STEP 1: Data Collection & Annotation ===")
-    capture_ui_screenshots(E_COMMERCE_WEBSITES)
 
-    print("\n=== STEP 2: Grid-Based Parsing ===")
-    process_ui_data_step2()
+_capture_inputs = [PAGE_ARCHIVE_DIR] if PAGE_ARCHIVE_MODE == "replay" else []
 
-    print("\n=== STEP 3: Computer Vision Techniques ===")
-    process_step3()
 
-    print("\n=== STEP 4: Metric Definition & Evaluation ===")
-    step4_evaluation()
+def build_pipeline(workers=PIPELINE_WORKERS, profile=PROFILE_STEPS):
+    """
+    Steps 1-4 form one chain; steps 5 and 7 repeat the chain on their own URL lists and
+    write to their own directories, so the three branches run side by side. Step 8 joins them.
+    """
+    nodes = [
+        Node("step1", capture_ui_screenshots,
+             {"urls": E_COMMERCE_WEBSITES, "online_metrics": ONLINE_METRICS},
+             params=_capture_params({"urls": E_COMMERCE_WEBSITES, "online_metrics": ONLINE_METRICS}),
+             inputs=_capture_inputs, outputs=[SCREENSHOT_DIR_STEP1, JSON_SUBDIR_STEP1]),
+        Node("step2", process_ui_data_step2, deps=["step1"],
+             inputs=[JSON_SUBDIR_STEP1, SCREENSHOT_DIR_STEP1],
+             outputs=[GRID_OUTPUT_DIR_STEP1, os.path.join(RESULTS_DIR, "grid_parsing_metrics_step1.parquet")]),
+        Node("step3", process_step3, deps=["step2"],
+             inputs=[JSON_SUBDIR_STEP1, SCREENSHOT_DIR_STEP1],
+             outputs=[PROCESSED_IMG_DIR, YOLO_ANN_DIR]),
+        # With online metrics, step 1 already wrote the evaluation table
+        Node("step4", step4_evaluation, deps=["step3"], params={"metrics": EVALUATION_METRICS},
+             inputs=[JSON_SUBDIR_STEP1, SCREENSHOT_DIR_STEP1],
+             outputs=[_results("step1")], enabled=not ONLINE_METRICS),
+        Node("step5", step5_prototype_development, {"test_urls": TEST_URLS_STEP5},
+             params=_capture_params({"test_urls": TEST_URLS_STEP5, "online_metrics": ONLINE_METRICS}),
+             inputs=_capture_inputs,
+             outputs=[SCREENSHOT_DIR_STEP5, JSON_SUBDIR_STEP5, BEST_GRID_JSON_DIR_STEP5, _results("step5")]),
+        # Opt-in only (python main.py --only step6)
+        Node("step6", step6_ai_integration, {"test_urls": TEST_URLS_STEP5}, deps=["step3"],
+             inputs=[JSON_SUBDIR_STEP1], outputs=[LOG_DIR_STEP6], enabled=False),
+        Node("step7", step7_generalization_and_adaptability, {"test_urls": BLOG_MEDIA_URLS},
+             params=_capture_params({"test_urls": BLOG_MEDIA_URLS, "online_metrics": ONLINE_METRICS}),
+             inputs=_capture_inputs,
+             outputs=[SCREENSHOT_DIR_STEP7, JSON_SUBDIR_STEP7, LOG_DIR_STEP7, _results("step7")]),
+        Node("step8", step8_final_evaluation, deps=["step4", "step5", "step7"],
+             inputs=[_results("step1"), _results("step5"), _results("step7")],
+             outputs=[PLOTS_DIR, os.path.join(UI_DATA_DIR, "final_evaluation_stats.csv")]),
+    ]
+    return Pipeline(nodes, PIPELINE_STATE_FILE, workers=workers, profile=profile,
+                    profile_dir=PROFILE_DIR, profile_interval_ms=PROFILE_INTERVAL_MS)
 
-    print("\n=== STEP 5: Prototype Development ===")
-    step5_prototype_development(TEST_URLS_STEP5)
 
-    # print("\n=== STEP 6: AI Integration ===")
-    # step6_ai_integration(TEST_URLS_STEP5)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid parser pipeline (steps 1-8)")
+    parser.add_argument("--only", nargs="+", metavar="STEP", help="re-run just these steps, e.g. --only step5")
+    parser.add_argument("--from", dest="start", metavar="STEP", help="re-run this step and everything after it")
+    parser.add_argument("--force", action="store_true", help="ignore recorded input hashes")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS, help="steps running at once")
+    parser.add_argument("--profile", nargs="+", metavar="STEP", default=PROFILE_STEPS,
+                        help="sample these steps with the stack profiler (folded stacks in logs/profiles)")
+    args = parser.parse_args()
+
+    start_time = time.time()  # Start tracking
+    instrumentation.enabled = INSTRUMENTATION
 
-    print("\n=== STEP 7: Generalization & Adaptability ===")
-    step7_generalization_and_adaptability(BLOG_MEDIA_URLS)
+    status = build_pipeline(args.workers, args.profile).run(only=args.only, start=args.start, force=args.force)
 
-    print("\n=== STEP 8: Final Evaluation & Analysis ===")
-    step8_final_evaluation()
+    if INSTRUMENTATION:
+        report_path = instrumentation.write_report(RUN_REPORT_DIR, PROMETHEUS_TEXTFILE)
+        instrumentation.print_top()
+        print(f"Run report: {report_path} (Prometheus: {PROMETHEUS_TEXTFILE})")
 
     end_time = time.time()  # ⏱️ End tracking
     elapsed = end_time - start_time
     mins, secs = divmod(elapsed, 60)
 
-    print(f"\n✅ All Steps (1–8) completed in {int(mins)} min {int(secs)} sec!")
+    failed = [name for name, st in status.items() if st in ("failed", "blocked")]
+    if failed:
+        print(f"\n⚠️ Pipeline finished with problems in {', '.join(failed)} after {int(mins)} min {int(secs)} sec.")
+    else:
+        print(f"\n✅ All Steps (1–8) completed in {int(mins)} min {int(secs)} sec!")
@@ -8,20 +8,39 @@ import time, os, json
 import pandas as pd
 
 # Custom helper functions and configuration constants
-from utils.driver_setup import setup_selenium_driver
+from utils.driver_setup import setup_selenium_driver, emulate_viewport, clear_viewport_emulation
 from utils.helpers import dismiss_cookies, categorize_ui_type
+from utils.streaming_metrics import StreamingMetricsConsumer
+from utils.metric_registry import viewport_suffix
+from utils.instrumentation import span
+from utils.page_archive import start_recording, save_recording, replay_proxy, replay_url
 from config import (
     SCREENSHOT_DIR_STEP1,
     JSON_SUBDIR_STEP1, JSON_SUBDIR_STEP7,JSON_SUBDIR_STEP5,
     CSV_SUBDIR_STEP1, CSV_SUBDIR_STEP7, CSV_SUBDIR_STEP5,
-    UI_DATA_DIR
+    UI_DATA_DIR, RESULTS_DIR, HISTORY_DIR,
+    PAGE_ARCHIVE_MODE, PAGE_ARCHIVE_DIR,
+    VIEWPORT_PROFILES, CAPTURE_VIEWPORTS, VIEWPORT_SETTLE_S
 )
 
 
-def capture_ui_screenshots(urls, headless=False, screenshot_dir=SCREENSHOT_DIR_STEP1):
+def capture_ui_screenshots(urls, headless=False, screenshot_dir=SCREENSHOT_DIR_STEP1, online_metrics=False,
+                           archive_mode=PAGE_ARCHIVE_MODE, archive_dir=PAGE_ARCHIVE_DIR,
+                           viewports=CAPTURE_VIEWPORTS):
     """
     Launch browser, visit each URL, capture screenshot, extract UI components,
     and save annotations in JSON and CSV formats. Also records the step for downstream processing.
+
+    With online_metrics=True every extracted component is published to a streaming consumer,
+    which writes evaluation_results_<step> (same table as Step 4) while the crawl runs.
+
+    archive_mode="record" stores every response of each page (after cookie dismissal) under
+    `archive_dir`; "replay" loads the pages from there through a local proxy instead of the network.
+
+    `viewports` (names in VIEWPORT_PROFILES) are all captured from a single page load: the
+    one matching the browser window (1920x1080) is captured as is, the others under device-metrics
+    emulation. Desktop outputs keep their names (<domain>.json); others get the viewport as a
+    suffix (<domain>_mobile.json), and every JSON records its "Viewport" and "Resolution".
     """
 
     # Local step detection helper
@@ -34,10 +53,11 @@ def capture_ui_screenshots(urls, headless=False, screenshot_dir=SCREENSHOT_DIR_S
         return "step1"
 
     # Setup Selenium WebDriver
-    driver = setup_selenium_driver(headless=headless)
-    device_label = "Desktop"
-    w, h = 1920, 1080
-    driver.set_window_size(w, h)
+    proxy = replay_proxy(archive_dir) if archive_mode == "replay" else None
+    driver = setup_selenium_driver(headless=headless, record_network=archive_mode == "record",
+                                   proxy_server=proxy.address if proxy else None)
+    window_w, window_h = 1920, 1080
+    driver.set_window_size(window_w, window_h)
 
     screenshot_count = 0
     os.makedirs(screenshot_dir, exist_ok=True)
@@ -61,75 +81,130 @@ def capture_ui_screenshots(urls, headless=False, screenshot_dir=SCREENSHOT_DIR_S
     os.makedirs(json_subdir, exist_ok=True)
     os.makedirs(csv_subdir, exist_ok=True)
 
+    metrics_stream = None
+    if online_metrics:
+        metrics_stream = StreamingMetricsConsumer(f"evaluation_results_{step}.csv", RESULTS_DIR, UI_DATA_DIR,
+                                                  history_dir=HISTORY_DIR, json_dir=json_subdir)
+
     for url in urls:
-        try:
-            driver.get(url)
-            time.sleep(3)
-
-            # Detect and skip Cloudflare protection pages
-            if "unusual traffic" in driver.page_source.lower():
-                print(f"Cloudflare block detected for {url}. Skipping.")
-                continue
-
-            # Attempt to dismiss cookie banners
-            for _ in range(2):
-                dismiss_cookies(driver)
-                time.sleep(3)
-
-            # Generate screenshot filename and path
-            domain = urlparse(url).netloc.replace("www.", "").replace(".", "_")
-            shot_name = f"{domain}_{device_label.lower()}.png"
-            shot_path = os.path.join(screenshot_dir, shot_name)
-            driver.save_screenshot(shot_path)
-
-            # Initialize metadata and UI component list
-            ui_data = {
-                "URL": url,
-                "Step": step,
-                "Viewport": device_label,
-                "Screenshot": os.path.basename(shot_path),
-                "Resolution": f"{w}x{h}",
-                "CaptureTime": datetime.utcnow().isoformat(),
-                "Category": categorize_ui_type(url),
-                "UI Components": []
-            }
-
-            # Extract UI components via XPath
-            elements = driver.find_elements(By.XPATH, "//button | //input | //a | //img | //div")
-            for elem in elements:
-                try:
-                    loc = elem.location
-                    sz = elem.size
-                    ui_data["UI Components"].append({
-                        "Tag": elem.tag_name,
-                        "Text": (elem.text or "N/A").strip(),
-                        "Role": elem.get_attribute("role") or "",
-                        "AriaLabel": elem.get_attribute("aria-label") or "",
-                        "Class": elem.get_attribute("class") or "",
-                        "InnerHTML": elem.get_attribute("innerHTML") or "",
-                        "X": loc["x"],
-                        "Y": loc["y"],
-                        "Width": sz["width"],
-                        "Height": sz["height"],
-                        "Timestamp": datetime.utcnow().isoformat()
-                    })
-                except:
-                    continue  # Skip elements that cause issues
-
-            # Save JSON
-            json_path = os.path.join(json_subdir, f"{domain}.json")
-            with open(json_path, "w", encoding="utf-8") as jf:
-                json.dump(ui_data, jf, indent=4)
-
-            # Save CSV
-            csv_path = os.path.join(csv_subdir, f"{domain}.csv")
-            pd.DataFrame(ui_data["UI Components"]).to_csv(csv_path, index=False)
-
-            screenshot_count += 1
-            print(f"Captured {url} -> {shot_path}")
-
-        except Exception as ex:
-            print(f"Failed to capture {url}: {ex}")
+        domain = urlparse(url).netloc.replace("www.", "").replace(".", "_")
+        with span(domain=domain):
+            emulated = False
+            open_page = None  # begun on the metrics stream but not ended yet
+            try:
+                with span(stage="capture"):
+                    if archive_mode == "record":
+                        start_recording(driver)
+                    driver.get(replay_url(url) if proxy else url)
+                    time.sleep(3)
+
+                # Detect and skip Cloudflare protection pages
+                if "unusual traffic" in driver.page_source.lower():
+                    print(f"Cloudflare block detected for {url}. Skipping.")
+                    continue
+
+                # Attempt to dismiss cookie banners
+                with span(stage="cookie_dismissal"):
+                    for _ in range(2):
+                        dismiss_cookies(driver)
+                        time.sleep(3)
+
+                if archive_mode == "record":
+                    saved = save_recording(driver, archive_dir, domain, url)
+                    print(f"[RECORD] {url}: {saved} responses archived")
+
+                # One page load, one capture per viewport: the page is re-laid out under DevTools
+                # device-metrics emulation, then screenshot and components are taken again
+                for device_label in viewports:
+                    profile = VIEWPORT_PROFILES[device_label]
+                    w, h = profile["width"], profile["height"]
+                    if profile["mobile"] or (w, h) != (window_w, window_h):
+                        with span(stage="emulation"):
+                            emulate_viewport(driver, w, h, profile["mobile"])
+                            time.sleep(VIEWPORT_SETTLE_S)
+                        emulated = True
+                    elif emulated:
+                        clear_viewport_emulation(driver)
+                        time.sleep(VIEWPORT_SETTLE_S)
+                        emulated = False
+                    page_name = f"{domain}{viewport_suffix(device_label)}"
+                    page_id = f"{url}#{device_label}"
+
+                    # Generate screenshot filename and path
+                    shot_name = f"{domain}_{device_label.lower()}.png"
+                    shot_path = os.path.join(screenshot_dir, shot_name)
+                    with span(stage="capture"):
+                        driver.save_screenshot(shot_path)
+                    if metrics_stream:
+                        metrics_stream.begin_page(page_id, f"{page_name}.json", domain, shot_path,
+                                                  viewport=device_label, screen_w=w, screen_h=h)
+                        open_page = page_id
+
+                    # Initialize metadata and UI component list
+                    ui_data = {
+                        "URL": url,
+                        "Step": step,
+                        "Viewport": device_label,
+                        "Screenshot": os.path.basename(shot_path),
+                        "Resolution": f"{w}x{h}",
+                        "CaptureTime": datetime.utcnow().isoformat(),
+                        "Category": categorize_ui_type(url),
+                        "UI Components": []
+                    }
+
+                    # Extract UI components via XPath
+                    with span(stage="extraction"):
+                        elements = driver.find_elements(By.XPATH, "//button | //input | //a | //img | //div")
+                        for elem in elements:
+                            try:
+                                loc = elem.location
+                                sz = elem.size
+                                comp = {
+                                    "Tag": elem.tag_name,
+                                    "Text": (elem.text or "N/A").strip(),
+                                    "Role": elem.get_attribute("role") or "",
+                                    "AriaLabel": elem.get_attribute("aria-label") or "",
+                                    "Class": elem.get_attribute("class") or "",
+                                    "InnerHTML": elem.get_attribute("innerHTML") or "",
+                                    "X": loc["x"],
+                                    "Y": loc["y"],
+                                    "Width": sz["width"],
+                                    "Height": sz["height"],
+                                    "Timestamp": datetime.utcnow().isoformat()
+                                }
+                                ui_data["UI Components"].append(comp)
+                                if metrics_stream:
+                                    metrics_stream.publish(page_id, comp)
+                            except:
+                                continue  # Skip elements that cause issues
+
+                        # Save JSON
+                        json_path = os.path.join(json_subdir, f"{page_name}.json")
+                        with open(json_path, "w", encoding="utf-8") as jf:
+                            json.dump(ui_data, jf, indent=4)
+
+                        # Save CSV
+                        csv_path = os.path.join(csv_subdir, f"{page_name}.csv")
+                        pd.DataFrame(ui_data["UI Components"]).to_csv(csv_path, index=False)
+
+                    if metrics_stream:
+                        with span(stage="metrics"):
+                            metrics_stream.end_page(page_id)
+                        open_page = None
+
+                    screenshot_count += 1
+                    print(f"Captured {url} ({device_label} {w}x{h}) -> {shot_path}")
+
+            except Exception as ex:
+                print(f"Failed to capture {url}: {ex}")
+            finally:
+                if open_page:  # failed mid-page: drop its partial metrics
+                    metrics_stream.discard_page(open_page)
+                if emulated:  # the next URL loads at the window size
+                    try:
+                        clear_viewport_emulation(driver)
+                    except Exception:
+                        pass
 
     # Merge all CSVs into one file for convenience
     merged_csv_path = os.path.join(UI_DATA_DIR, "merged_ui_data.csv")
@@ -142,5 +217,10 @@ def capture_ui_screenshots(urls, headless=False, screenshot_dir=SCREENSHOT_DIR_S
     else:
         print("No CSV files found to merge.")
 
+    if metrics_stream:
+        metrics_stream.close()
+
     driver.quit()
+    if proxy:
+        print(f"[REPLAY] Archive hits: {proxy.stats['hits']}, misses: {proxy.stats['misses']}")
     print(f"Step {step}: Data Collection & Annotation - COMPLETED! ({screenshot_count} screenshots captured)")
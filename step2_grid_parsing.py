@@ -1,15 +1,20 @@
 # File: grid_parser_project/step2_grid_parsing.py
 # Purpose: Step 2 - Grid-Based Parsing & Metric Evaluation (multi-resolution + compression)
 
-import os, json, math, cv2
+import os, json, cv2
 import pandas as pd
 from urllib.parse import urlparse
 from config import (
     JSON_SUBDIR_STEP1,
     GRID_OUTPUT_DIR_STEP1, GRID_OUTPUT_DIR_STEP5, GRID_OUTPUT_DIR_STEP7,
     SCREENSHOT_DIR_STEP1, SCREENSHOT_DIR_STEP5, SCREENSHOT_DIR_STEP7,
-    UI_DATA_DIR
+    UI_DATA_DIR, RESULTS_DIR, METRIC_CACHE_DIR
 )
+from utils.metric_registry import (
+    PageMetrics, page_viewport, viewport_suffix, load_metric_cache, save_metric_cache, metric_cache_path
+)
+from utils.result_store import apply_schema, write_results, export_csv
+from utils.instrumentation import span, count
 
 # ----------------------
 # Utility: Detect which step we're processing based on file path
@@ -58,6 +63,7 @@ def overlay_grid_on_screenshot(input_path, output_path, screenshot_dir, rows=8,
     correct_input_path = os.path.join(screenshot_dir, filename_only)
 
     img = cv2.imread(correct_input_path)
+    count("image_decodes")
     if img is None:
         print(f"Could not load for overlay: {correct_input_path}")
         return
@@ -76,41 +82,11 @@ def overlay_grid_on_screenshot(input_path, output_path, screenshot_dir, rows=8,
     print(f"Grid overlay: {output_path}")
 
 
-# ----------------------
-# Additional evaluation metrics
-# ----------------------
-def compute_entropy(ui_components):
-    if not ui_components:
-        return 0.0
-    tag_freq = {}
-    for comp in ui_components:
-        tag = comp["Tag"].lower()
-        tag_freq[tag] = tag_freq.get(tag, 0) + 1
-    total = sum(tag_freq.values())
-    entropy = -sum((freq / total) * math.log2(freq / total) for freq in tag_freq.values())
-    return entropy
-
-
-# --- File-based Compression Ratio (CR_file) ---
-def compute_compression_ratios(png_path):
-    jpg_path = png_path.replace(".png", ".jpg")
-    try:
-        img = cv2.imread(png_path)
-        if img is None:
-            return None, None, None
-        cv2.imwrite(jpg_path, img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-        png_size = os.path.getsize(png_path)
-        jpg_size = os.path.getsize(jpg_path)
-        cr_file = 1 - (jpg_size / png_size) if png_size else 0
-        os.remove(jpg_path)
-        return cr_file, png_size, jpg_size
-    except:
-        return None, None, None
-
 # ----------------------
 # Evaluate grid parsing variants
 # ----------------------
-def evaluate_grid_variants(grid_sizes=[4, 8, 16], screen_w=1920, screen_h=1080, json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_DIR_STEP1):
+def evaluate_grid_variants(grid_sizes=[4, 8, 16], screen_w=1920, screen_h=1080, json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_DIR_STEP1,
+                           cache=None):
     results = []
     jfiles = [f for f in os.listdir(json_dir) if f.endswith(".json")]
 
@@ -123,32 +99,42 @@ def evaluate_grid_variants(grid_sizes=[4, 8, 16], screen_w=1920, screen_h=1080,
         shot_path = os.path.join(screenshot_dir, screenshot_filename)
 
         domain = urlparse(data["URL"]).netloc.replace("www.", "").replace(".", "_")
+        # Pages captured under viewport emulation are gridded over their own resolution
+        viewport, page_w, page_h = page_viewport(data, screen_w, screen_h)
+
+        # Grid-independent metrics are memoized per page, so the screenshot is encoded once
+        # (and not at all if `cache` already has it from an earlier step or run)
+        page = PageMetrics(data, shot_path, page_w, page_h, cache=cache)
+        shared = page.compute(["density", "entropy", "compression_ratio", "cr_file", "png_size", "jpg_size"])
 
         for size in grid_sizes:
-            comps_grid = map_ui_to_grid(comps.copy(), size, size, screen_w, screen_h)
-            accuracy = validate_grid_assignments(comps_grid, size, size, screen_w, screen_h)
-            density = len(comps_grid) / (screen_w * screen_h)
-            entropy = compute_entropy(comps_grid)
-            cr_bbox = sum(c["Width"] * c["Height"] for c in comps_grid) / (screen_w * screen_h)
-            cr_file, png_size, jpg_size = compute_compression_ratios(shot_path)
+            comps_grid = map_ui_to_grid(comps.copy(), size, size, page_w, page_h)
+            accuracy = validate_grid_assignments(comps_grid, size, size, page_w, page_h)
+            density = shared["density"]
+            entropy = shared["entropy"]
+            cr_bbox = shared["compression_ratio"]
+            cr_file, png_size, jpg_size = shared["cr_file"], shared["png_size"], shared["jpg_size"]
 
             results.append({
                 "Domain": domain,
+                "Viewport": viewport,
                 "Grid_Size": f"{size}x{size}",
                 "Num_Components": len(comps_grid),
                 "Hit_Rate": round(accuracy * 100, 2),
                 "Density": round(density, 6),
                 "Entropy": round(entropy, 4),
                 "CR_BBox": round(cr_bbox, 4),
-                "CR_File": round(cr_file, 4) if cr_file is not None else "N/A",
+                "CR_File": round(cr_file, 4) if cr_file is not None else None,
                 "Screenshot_Size(Bytes)": png_size,
                 "Compressed_JPG_Size(Bytes)": jpg_size
             })
 
-    df = pd.DataFrame(results)
-    out_csv = os.path.join(UI_DATA_DIR, "grid_parsing_metrics.csv")
-    df.to_csv(out_csv, index=False)
-    print(f"Grid parsing metrics saved to: {out_csv}")
+    df = apply_schema(pd.DataFrame(results), "grid_metrics")
+    # One table per step: steps 1, 5 and 7 run as parallel pipeline branches
+    name = f"grid_parsing_metrics_{detect_step(screenshot_dir)}"
+    stored = write_results(df, "grid_metrics", os.path.join(RESULTS_DIR, f"{name}.parquet"))
+    out_csv = export_csv(df, os.path.join(UI_DATA_DIR, f"{name}.csv"))
+    print(f"Grid parsing metrics saved to: {stored} (CSV export: {out_csv})")
 
 
 # ----------------------
@@ -166,8 +152,9 @@ def process_ui_data_step2(json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_
         with open(fp, "r", encoding="utf-8") as f:
             data = json.load(f)
 
-        data["UI Components"] = map_ui_to_grid(data["UI Components"], rows=8, cols=8)
-        frac = validate_grid_assignments(data["UI Components"], rows=8, cols=8)
+        viewport, page_w, page_h = page_viewport(data)
+        data["UI Components"] = map_ui_to_grid(data["UI Components"], rows=8, cols=8, screen_w=page_w, screen_h=page_h)
+        frac = validate_grid_assignments(data["UI Components"], rows=8, cols=8, screen_w=page_w, screen_h=page_h)
         print(f"Grid Consistency for {jf}: {frac*100:.2f}%")
 
         with open(fp, "w", encoding="utf-8") as outf:
@@ -189,9 +176,14 @@ def process_ui_data_step2(json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_
             "step7": GRID_OUTPUT_DIR_STEP7
         }
         grid_dir = grid_dir_map.get(step_prefix, GRID_OUTPUT_DIR_STEP1)
-        grid_out = os.path.join(grid_dir, f"{step_prefix}_{domain}_grid.png")
+        grid_out = os.path.join(grid_dir, f"{step_prefix}_{domain}{viewport_suffix(viewport)}_grid.png")
 
-        overlay_grid_on_screenshot(input_path, grid_out, screenshot_dir)
+        with span(domain=domain, stage="grid_overlay"):
+            overlay_grid_on_screenshot(input_path, grid_out, screenshot_dir)
 
-    evaluate_grid_variants(grid_sizes=[4, 8, 16], json_dir=json_dir, screenshot_dir=screenshot_dir)
+    with span(stage="metrics"):
+        cache_path = metric_cache_path(METRIC_CACHE_DIR, screenshot_dir)
+        cache = load_metric_cache(cache_path)
+        evaluate_grid_variants(grid_sizes=[4, 8, 16], json_dir=json_dir, screenshot_dir=screenshot_dir, cache=cache)
+        save_metric_cache(cache, cache_path)
     print("Step 2: Grid-Based Parsing - COMPLETED!")
@@ -1,57 +1,65 @@
 # File: grid_parser_project/step3_computer_vision.py
 # Purpose: Step 3 - Computer Vision Integration (OpenCV preprocessing, OCR, YOLO conversion)
 
-import os, json
+import os, json, time
 import cv2
 import pandas as pd
 import numpy as np
 import pytesseract
 from urllib.parse import urlparse
-from ultralytics import YOLO
 # Ensure you have the correct paths in your config file
 from config import (
-    JSON_SUBDIR_STEP1, PROCESSED_IMG_DIR, YOLO_ANN_DIR,
-    SCREENSHOT_DIR_STEP1, SCREENSHOT_DIR_STEP7,
+    JSON_SUBDIR_STEP1, JSON_SUBDIR_STEP5, JSON_SUBDIR_STEP7,
+    PROCESSED_IMG_DIR, YOLO_ANN_DIR, YOLO_DATASET_DIR, YOLO_VAL_FRACTION,
+    SCREENSHOT_DIR_STEP1, SCREENSHOT_DIR_STEP5, SCREENSHOT_DIR_STEP7,
     YOLO_PRETRAINED_WEIGHTS, YOLO_DATA_PATH,
-    YOLO_TRAIN_NAME, YOLO_TRAIN_PROJECT
+    YOLO_TRAIN_NAME, YOLO_TRAIN_PROJECT,
+    CV_DEBUG_STAGES, CV_PRINT_TIMINGS,
+    YOLO_TRAINED_WEIGHTS, YOLO_CLASS_NAMES, YOLO_EXPORT_FORMAT,
+    YOLO_INFERENCE_IMGSZ, YOLO_INFERENCE_BATCH, YOLO_CONF_THRESHOLD,
+    UI_DATA_DIR
 )
+from utils.cv_pipeline import run_cv_pipeline, boxes_to_components
+from utils.instrumentation import span, count
+from utils.yolo_dataset import read_image_size, yolo_label_lines, build_yolo_dataset
+from utils.yolo_inference import (
+    export_yolo_model, load_cpu_model, run_batched_inference, benchmark_inference
+)
+from step2_grid_parsing import map_ui_to_grid
+from utils.metric_registry import page_viewport
 
-# function to preprocess images using OpenCV    
-def preprocess_image_cv(input_path, output_path):
+# function to preprocess images using OpenCV (in memory; debug PNGs only for CV_DEBUG_STAGES)
+def preprocess_image_cv(input_path, output_path, debug_stages=None):
     img = cv2.imread(input_path)
+    count("image_decodes")
     if img is None:
         print(f"Could not load: {input_path}")
-        return
-
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray_path = os.path.join(PROCESSED_IMG_DIR, "gray_" + os.path.basename(input_path))
-    cv2.imwrite(gray_path, gray)
-
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    blur_path = os.path.join(PROCESSED_IMG_DIR, "blur_" + os.path.basename(input_path))
-    cv2.imwrite(blur_path, blur)
-
-    thresh = cv2.adaptiveThreshold(blur, 255,
-                                   cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                   cv2.THRESH_BINARY_INV, 11, 2)
-    thresh_path = os.path.join(PROCESSED_IMG_DIR, "thresh_" + os.path.basename(input_path))
-    cv2.imwrite(thresh_path, thresh)
-
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE) 
-    for c in contours:
-        x, y, w, h = cv2.boundingRect(c)
-        cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        return None
+
+    if debug_stages is None:
+        debug_stages = CV_DEBUG_STAGES
+
+    state = run_cv_pipeline(
+        img,
+        debug_stages=debug_stages,
+        debug_dir=PROCESSED_IMG_DIR,
+        debug_name=os.path.basename(input_path),
+        debug_paths={"boxes": output_path},
+        print_timings=CV_PRINT_TIMINGS
+    )
 
-    cv2.imwrite(output_path, img)
-    print(f"Final processed image saved: {output_path}")
+    if "boxes" in state["artifacts"]:
+        print(f"Final processed image saved: {output_path}")
+    return state
 
 # function to convert JSON annotations to YOLO format
 def convert_json_to_yolo(json_file, output_dir, image_path):
-    img = cv2.imread(image_path)
-    if img is None:
+    # Size comes from the file header, the pixels are never decoded
+    size = read_image_size(image_path) if os.path.isfile(image_path) else None
+    if size is None:
         print(f"Could not read image for YOLO size: {image_path}")
         return
-    img_h, img_w = img.shape[:2]
+    img_w, img_h = size
 
     with open(json_file, "r") as f:
         data = json.load(f)
@@ -64,33 +72,25 @@ def convert_json_to_yolo(json_file, output_dir, image_path):
     txt_name = shot_name.replace(".png", ".txt")
     out_txt = os.path.join(output_dir, txt_name)
 
-    label_map = {"button": 0, "input": 1, "a": 2, "img": 3}
+    label_map = {name: i for i, name in enumerate(YOLO_CLASS_NAMES)}
 
     with open(out_txt, "w") as tf:
-        for c in comps:
-            tag_l = c["Tag"].lower()
-            lid = label_map.get(tag_l, 4)
-            x, y = c["X"], c["Y"]
-            w, h = c["Width"], c["Height"]
-
-            x_c = (x + w / 2) / img_w
-            y_c = (y + h / 2) / img_h
-            norm_w = w / img_w
-            norm_h = h / img_h
-
-            tf.write(f"{lid} {x_c} {y_c} {norm_w} {norm_h}\n")
+        tf.writelines(yolo_label_lines(comps, img_w, img_h, label_map, len(YOLO_CLASS_NAMES) - 1))
 
     print(f"YOLO annotation saved: {out_txt}")
 
 def extract_ocr_data(image_path):
     img = cv2.imread(image_path)
+    count("image_decodes")
     if img is None:
         return pd.DataFrame()
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    count("ocr_calls")
     return pytesseract.image_to_data(gray, output_type=pytesseract.Output.DATAFRAME).dropna(subset=["text"])
 
 def draw_ocr_matches(image_path, components, output_path):
     img = cv2.imread(image_path)
+    count("image_decodes")
     for comp in components:
         if comp.get("OCR_Text"):
             x, y = comp["X"], comp["Y"]
@@ -101,6 +101,31 @@ def draw_ocr_matches(image_path, components, output_path):
     cv2.imwrite(output_path, img)
     print(f"OCR overlay saved to: {output_path}")
 
+# function to tag components (YOLO class, container/element) and attach the OCR words inside them
+def annotate_components_with_ocr(components, ocr_df, padding=5):
+    label_map = {"button": 0, "input": 1, "a": 2, "img": 3}
+
+    for comp in components:
+        tag_l = comp["Tag"].lower()
+        comp["YOLO_Class"] = label_map.get(tag_l, 4)
+
+        if comp["Width"] > 1000 and comp["Height"] > 800:
+            comp["Component_Type"] = "Container"
+        else:
+            comp["Component_Type"] = "Element"
+
+        x1, y1 = comp["X"] - padding, comp["Y"] - padding
+        x2 = comp["X"] + comp["Width"] + padding
+        y2 = comp["Y"] + comp["Height"] + padding
+
+        matched_texts = ocr_df[
+            (ocr_df["left"] >= x1) & (ocr_df["left"] + ocr_df["width"] <= x2) &
+            (ocr_df["top"] >= y1) & (ocr_df["top"] + ocr_df["height"] <= y2)
+        ]["text"].tolist()
+
+        comp["OCR_Text"] = " ".join(matched_texts).strip() if matched_texts else ""
+    return components
+
 # Main function to process Step 3 
 def process_step3(json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_DIR_STEP1):
     jfiles = [f for f in os.listdir(json_dir) if f.endswith(".json")]
@@ -110,60 +135,68 @@ def process_step3(json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_DIR_STEP
 
     for jf in jfiles:
         fp = os.path.join(json_dir, jf)
-        with open(fp, "r") as f:
-            data = json.load(f)
-
-        base_shot = os.path.basename(data.get("Screenshot", ""))
-        correct_shot_path = os.path.join(screenshot_dir, base_shot)
-        if not os.path.isfile(correct_shot_path):
-            print(f"Missing screenshot: {correct_shot_path}")
-            continue
-
-        out_processed = os.path.join(PROCESSED_IMG_DIR, f"processed_{base_shot}")
-        preprocess_image_cv(correct_shot_path, out_processed)
-
-        convert_json_to_yolo(fp, YOLO_ANN_DIR, correct_shot_path)
-
-        ocr_df = extract_ocr_data(correct_shot_path)
-        components = data.get("UI Components", [])
-        PADDING = 5
-
-        label_map = {"button": 0, "input": 1, "a": 2, "img": 3}
-
-        for comp in components:
-            tag_l = comp["Tag"].lower()
-            comp["YOLO_Class"] = label_map.get(tag_l, 4)
-
-            if comp["Width"] > 1000 and comp["Height"] > 800:
-                comp["Component_Type"] = "Container"
-            else:
-                comp["Component_Type"] = "Element"
-
-            x1, y1 = comp["X"] - PADDING, comp["Y"] - PADDING
-            x2 = comp["X"] + comp["Width"] + PADDING
-            y2 = comp["Y"] + comp["Height"] + PADDING
-
-            matched_texts = ocr_df[
-                (ocr_df["left"] >= x1) & (ocr_df["left"] + ocr_df["width"] <= x2) &
-                (ocr_df["top"] >= y1) & (ocr_df["top"] + ocr_df["height"] <= y2)
-            ]["text"].tolist()
-
-            comp["OCR_Text"] = " ".join(matched_texts).strip() if matched_texts else ""
-
-        with open(fp, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
-
-        ocr_overlay_path = os.path.join(PROCESSED_IMG_DIR, f"ocr_overlay_{base_shot}")
-        draw_ocr_matches(correct_shot_path, components, ocr_overlay_path)
+        with span(domain=jf[:-len(".json")]):
+            with open(fp, "r") as f:
+                data = json.load(f)
+
+            base_shot = os.path.basename(data.get("Screenshot", ""))
+            correct_shot_path = os.path.join(screenshot_dir, base_shot)
+            if not os.path.isfile(correct_shot_path):
+                print(f"Missing screenshot: {correct_shot_path}")
+                continue
+
+            out_processed = os.path.join(PROCESSED_IMG_DIR, f"processed_{base_shot}")
+            with span(stage="cv"):
+                cv_state = preprocess_image_cv(correct_shot_path, out_processed)
+
+            # OpenCV candidate boxes as a second component list, comparable with the DOM components
+            # (gridded over the page's own resolution, like the DOM components in step 2)
+            if cv_state is not None:
+                _, page_w, page_h = page_viewport(data)
+                cv_comps = map_ui_to_grid(boxes_to_components(cv_state["candidates"]), rows=8, cols=8,
+                                          screen_w=page_w, screen_h=page_h)
+                data["CV Components"] = cv_comps
+                print(f"CV candidates for {jf}: {len(cv_comps)} boxes "
+                      f"(from {len(cv_state['boxes'])} contours, {len(data.get('UI Components', []))} DOM components)")
+
+            with span(stage="annotation"):
+                convert_json_to_yolo(fp, YOLO_ANN_DIR, correct_shot_path)
+
+            with span(stage="ocr"):
+                ocr_df = extract_ocr_data(correct_shot_path)
+                components = data.get("UI Components", [])
+                annotate_components_with_ocr(components, ocr_df)
+
+            with open(fp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4)
+
+            ocr_overlay_path = os.path.join(PROCESSED_IMG_DIR, f"ocr_overlay_{base_shot}")
+            with span(stage="ocr"):
+                draw_ocr_matches(correct_shot_path, components, ocr_overlay_path)
 
     print("Step 3: Computer Vision Techniques (with OCR-to-component mapping) - COMPLETED!")
 
+def build_ui_dataset(sources=None, val_fraction=YOLO_VAL_FRACTION, workers=None):
+    """Build the YOLO dataset and YOLO_DATA_PATH from the JSONs/screenshots of steps 1, 5 and 7."""
+    if sources is None:
+        sources = [
+            (JSON_SUBDIR_STEP1, SCREENSHOT_DIR_STEP1),
+            (JSON_SUBDIR_STEP5, SCREENSHOT_DIR_STEP5),
+            (JSON_SUBDIR_STEP7, SCREENSHOT_DIR_STEP7),
+        ]
+    return build_yolo_dataset(sources, YOLO_DATASET_DIR, YOLO_DATA_PATH, YOLO_CLASS_NAMES,
+                              val_fraction=val_fraction, workers=workers)
+
 def train_yolo_model():
+    if not os.path.isfile(YOLO_DATA_PATH):
+        print(f"YOLO dataset config not found: {YOLO_DATA_PATH}. Building it from step JSONs...")
+        build_ui_dataset()
     if not os.path.isfile(YOLO_DATA_PATH):
         print(f"YOLO dataset config not found: {YOLO_DATA_PATH}")
         return
 
     print("Starting YOLO training...")
+    from ultralytics import YOLO  # training only; the rest of step 3 runs without it
     model = YOLO(YOLO_PRETRAINED_WEIGHTS)
 
     results = model.train(
@@ -177,3 +210,70 @@ def train_yolo_model():
 
     val_m = model.val()
     print("YOLO training completed. Validation metrics:", val_m)
+
+
+# ----------------------
+# YOLO inference on CPU (exported model)
+# ----------------------
+def _step_screenshots(json_dir, screenshot_dir):
+    """(json_path, screenshot_path) pairs for every step JSON whose screenshot exists."""
+    pairs = []
+    for jf in sorted(f for f in os.listdir(json_dir) if f.endswith(".json")):
+        fp = os.path.join(json_dir, jf)
+        with open(fp, "r", encoding="utf-8") as f:
+            shot = os.path.basename(json.load(f).get("Screenshot", ""))
+        shot_path = os.path.join(screenshot_dir, shot)
+        if os.path.isfile(shot_path):
+            pairs.append((fp, shot_path))
+        else:
+            print(f"Missing screenshot: {shot_path}")
+    return pairs
+
+def run_yolo_inference(json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_DIR_STEP1,
+                       weights=YOLO_TRAINED_WEIGHTS, export_format=YOLO_EXPORT_FORMAT,
+                       batch_size=YOLO_INFERENCE_BATCH, imgsz=YOLO_INFERENCE_IMGSZ):
+    """
+    Detect UI elements on every screenshot of a step with the exported (ONNX/OpenVINO) model.
+    Detections are stored as "YOLO Components" in each JSON, in the same schema as the DOM components.
+    """
+    if not os.path.isfile(weights):
+        print(f"Trained YOLO weights not found: {weights}")
+        return
+
+    pairs = _step_screenshots(json_dir, screenshot_dir)
+    if not pairs:
+        print("No screenshots for YOLO inference.")
+        return
+
+    model_fn = load_cpu_model(export_yolo_model(weights, export_format, imgsz))
+    t0 = time.perf_counter()
+    detections = run_batched_inference(model_fn, [shot for _, shot in pairs], YOLO_CLASS_NAMES,
+                                       imgsz=imgsz, batch_size=batch_size, conf_thresh=YOLO_CONF_THRESHOLD)
+    elapsed = time.perf_counter() - t0
+
+    for fp, shot_path in pairs:
+        with open(fp, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        _, page_w, page_h = page_viewport(data)
+        data["YOLO Components"] = map_ui_to_grid(detections.get(shot_path, []), rows=8, cols=8,
+                                                 screen_w=page_w, screen_h=page_h)
+        with open(fp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        print(f"YOLO detections for {os.path.basename(fp)}: {len(data['YOLO Components'])}")
+
+    print(f"YOLO inference on {len(pairs)} screenshots in {elapsed:.2f}s "
+          f"({len(pairs) / elapsed if elapsed else 0:.2f} images/s)")
+
+def benchmark_yolo_inference(json_dir=JSON_SUBDIR_STEP1, screenshot_dir=SCREENSHOT_DIR_STEP1,
+                             weights=YOLO_TRAINED_WEIGHTS, export_format=YOLO_EXPORT_FORMAT,
+                             batch_sizes=(1, 4, 8, 16), imgsz=YOLO_INFERENCE_IMGSZ):
+    if not os.path.isfile(weights):
+        print(f"Trained YOLO weights not found: {weights}")
+        return
+    shots = [shot for _, shot in _step_screenshots(json_dir, screenshot_dir)]
+    model_fn = load_cpu_model(export_yolo_model(weights, export_format, imgsz))
+    rows = benchmark_inference(model_fn, shots, YOLO_CLASS_NAMES, batch_sizes=batch_sizes, imgsz=imgsz)
+
+    out_csv = os.path.join(UI_DATA_DIR, f"yolo_inference_benchmark_{export_format}.csv")
+    pd.DataFrame(rows).to_csv(out_csv, index=False)
+    print(f"YOLO inference benchmark saved to: {out_csv}")
@@ -1,47 +1,28 @@
 # File: grid_parser_project/step4_metrics_evaluation.py
 # Purpose: Step 4 - Evaluate layout parsing using multi-resolution grid metrics
 
-import os, json, math, cv2
+import os, json
 import pandas as pd
 from urllib.parse import urlparse
 from config import (
     JSON_SUBDIR_STEP1,
-    UI_DATA_DIR,
+    UI_DATA_DIR, RESULTS_DIR, HISTORY_DIR,
     SCREENSHOT_DIR_STEP1,
     SCREENSHOT_DIR_STEP5,
-    SCREENSHOT_DIR_STEP7
+    SCREENSHOT_DIR_STEP7,
+    APPROX_METRICS, APPROX_MIN_COMPONENTS, APPROX_TOLERANCE, APPROX_ENTROPY_TOLERANCE, APPROX_CONFIDENCE,
+    METRIC_CACHE_DIR, EVALUATION_METRICS
 )
-
-# --- Entropy (Shannon) Calculation ---
-def compute_entropy(ui_components):
-    if not ui_components:
-        return 0.0
-    tag_freq = {}
-    for comp in ui_components:
-        tag = comp["Tag"].lower()
-        tag_freq[tag] = tag_freq.get(tag, 0) + 1
-    total = sum(tag_freq.values())
-    entropy = -sum((freq / total) * math.log2(freq / total) for freq in tag_freq.values())
-    return entropy
-
-# --- File-based Compression Ratio (CR_file) ---
-def compute_compression_ratios(png_path):
-    jpg_path = png_path.replace(".png", ".jpg")
-    try:
-        img = cv2.imread(png_path)
-        if img is None:
-            return None, None, None
-        cv2.imwrite(jpg_path, img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-        png_size = os.path.getsize(png_path)
-        jpg_size = os.path.getsize(jpg_path)
-        cr_file = 1 - (jpg_size / png_size) if png_size else 0
-        os.remove(jpg_path)
-        return cr_file, png_size, jpg_size
-    except:
-        return None, None, None
+from utils.metrics_engine import compute_step_metrics
+from utils.metric_registry import PageMetrics, LAYOUT_METRICS, load_metric_cache, save_metric_cache, metric_cache_path
+from utils.approx_metrics import approximate_page_metrics, pin_estimates, approx_summary
+from utils.result_store import apply_schema, write_results, export_csv
+from utils.run_history import append_run_results
+from utils.instrumentation import span
 
 # --- Main Metrics Computation Per Grid Size ---
-def calculate_layout_metrics(data, rows=8, cols=8, screenshot_dir=SCREENSHOT_DIR_STEP1):
+def calculate_layout_metrics(data, rows=8, cols=8, screenshot_dir=SCREENSHOT_DIR_STEP1, page=None,
+                             approximate=None, tolerance=APPROX_TOLERANCE):
     comps = data.get("UI Components", [])
     if not comps:
         return {
@@ -58,69 +39,35 @@ def calculate_layout_metrics(data, rows=8, cols=8, screenshot_dir=SCREENSHOT_DIR
             "P_Score": 0
         }
 
-    total = len(comps)
-    scr_w, scr_h = 1920, 1080
-    cell_w = scr_w // cols
-    cell_h = scr_h // rows
-
-    exact_hits, fuzzy_hits = 0, 0
-
-    for c in comps:
-        assigned_r = c.get("Grid_Row", 0)
-        assigned_c = c.get("Grid_Col", 0)
-        real_r = c["Y"] // cell_h
-        real_c = c["X"] // cell_w
-        if assigned_r == real_r and assigned_c == real_c:
-            exact_hits += 1
-        if abs(assigned_r - real_r) <= 1 and abs(assigned_c - real_c) <= 1:
-            fuzzy_hits += 1
-
-    grid_consistency = exact_hits / total
-    hit_rate = fuzzy_hits / total
-    screen_area = scr_w * scr_h
-    density = total / screen_area if screen_area else 0
-    entropy_val = compute_entropy(comps)
-    distinct_tags = set(c["Tag"] for c in comps)
-    tag_variety = len(distinct_tags) / total if total else 0
-    sum_area = sum(c["Width"] * c["Height"] for c in comps)
-    comp_ratio = sum_area / screen_area if screen_area else 0
-
     # Get file compression ratio (CR_file)
     shot_file = os.path.basename(data["Screenshot"])
     correct_shot_path = os.path.join(screenshot_dir, shot_file)
     print(f"Using screenshot: {correct_shot_path}")
 
-    cr_file, png_size, jpg_size = compute_compression_ratios(correct_shot_path)
-
-    # Define the weights
-    alpha = 0.3
-    beta = 0.2
-    gamma = 0.2
-    delta = 0.15
-    epsilon = 0.15
-
-    # Apply the formula for P_Score
-    P_Score = (alpha * hit_rate) + (beta * (1 - density)) + (gamma * entropy_val) + (delta * comp_ratio) + (epsilon * (cr_file if cr_file else 0))
-
-    return {
-        "grid_consistency": grid_consistency,
-        "hit_rate": hit_rate,
-        "density": density,
-        "variability": entropy_val,
-        "tag_variety": tag_variety,
-        "compression_ratio": comp_ratio,
-        "entropy": entropy_val,
-        "cr_file": cr_file,
-        "png_size": png_size,
-        "jpg_size": jpg_size,
-        "P_Score": P_Score
-    }
+    # Metrics (and P_Score weights) come from the registry, like in step4_evaluation; pass a
+    # PageMetrics in `page` to reuse grid-independent values (entropy, CR_File, ...) across grid sizes.
+    if page is None:
+        page = PageMetrics(data, correct_shot_path)
+
+    # Approximate mode (default: APPROX_METRICS for pages above APPROX_MIN_COMPONENTS) pins
+    # sampled estimates before evaluation and adds "approximate", "sample_size" and "ci" keys.
+    if approximate is None:
+        approximate = APPROX_METRICS and len(comps) >= APPROX_MIN_COMPONENTS
+    if not approximate:
+        return page.compute(LAYOUT_METRICS, rows=rows, cols=cols)
+    approx = approximate_page_metrics(comps, [(rows, cols)], tolerance=tolerance,
+                                      entropy_tolerance=APPROX_ENTROPY_TOLERANCE, confidence=APPROX_CONFIDENCE,
+                                      screen_w=page.screen_w, screen_h=page.screen_h)
+    pin_estimates(page, approx)
+    result = page.compute(LAYOUT_METRICS, rows=rows, cols=cols)
+    result.update(approx_summary(approx, rows, cols))
+    return result
 
 # --- Main Step 4 Pipeline ---
 def step4_evaluation(json_dir=JSON_SUBDIR_STEP1, csv_filename="evaluation_results_step1.csv", screenshot_dir=None):
     """
     Step 4: Evaluates all JSON entries using multiple grid resolutions.
-    Computes all layout metrics and saves results to CSV for analysis.
+    Computes all layout metrics (plus the registered EVALUATION_METRICS) and saves results to CSV for analysis.
 
     Args:
         json_dir (str): Path to the directory containing JSON files.
@@ -141,38 +88,61 @@ def step4_evaluation(json_dir=JSON_SUBDIR_STEP1, csv_filename="evaluation_result
         else:
             screenshot_dir = SCREENSHOT_DIR_STEP1
 
-    results = []
     grid_sizes = [4, 8, 16]
 
-    for jf in jfiles:
-        fp = os.path.join(json_dir, jf)
-        with open(fp, "r") as f:
-            data = json.load(f)
-
-        dom = urlparse(data["URL"]).netloc.replace("www.", "").replace(".", "_")
-
-        for grid in grid_sizes:
-            mets = calculate_layout_metrics(data, rows=grid, cols=grid, screenshot_dir=screenshot_dir)
+    # Metrics (and P_Score weights) come from the registry: grid-invariant ones are computed
+    # once per domain, hit rates per grid size as array ops
+    extra = [m for m in EVALUATION_METRICS if m not in LAYOUT_METRICS]
+    approx = None
+    if APPROX_METRICS:
+        approx = {"min_components": APPROX_MIN_COMPONENTS, "tolerance": APPROX_TOLERANCE,
+                  "entropy_tolerance": APPROX_ENTROPY_TOLERANCE, "confidence": APPROX_CONFIDENCE}
+    # CR_File of screenshots already encoded by step 2 (or an earlier run) comes from the metric cache
+    cache_path = metric_cache_path(METRIC_CACHE_DIR, screenshot_dir)
+    cache = load_metric_cache(cache_path)
+    with span(stage="metrics"):
+        _, mets = compute_step_metrics(json_dir, screenshot_dir, grid_sizes, approx=approx, cache=cache,
+                                       metrics=LAYOUT_METRICS + extra)
+    save_metric_cache(cache, cache_path)
 
-            row = {
-                "JSON_File": jf,
-                "Domain": dom,
-                "Grid_Size": f"{grid}x{grid}",
-                "Grid_Consistency(%)": f"{mets['grid_consistency']*100}",
-                "Hit_Rate(%)": f"{mets['hit_rate']*100}",
-                "Density": f"{mets['density']}",
-                "Variability": f"{mets['variability']}",
-                "Compression_Ratio": f"{mets['compression_ratio']}",
-                "Entropy": f"{mets['entropy']}",
-                "CR_File": f"{mets['cr_file']}" if mets['cr_file'] is not None else "N/A",
-                "Screenshot_Size(Bytes)": mets["png_size"],
-                "Compressed_JPG_Size(Bytes)": mets["jpg_size"],
-                "P_Score": f"{mets['P_Score']}"
-            }
-
-            results.append(row)
-
-    df = pd.DataFrame(results)
-    out_csv = os.path.join(UI_DATA_DIR, csv_filename)
-    df.to_csv(out_csv, index=False)
+    results = []
+    for m in mets.to_dict("records"):
+        row = {
+            "JSON_File": m["JSON_File"],
+            "Domain": m["Domain"],
+            "Viewport": m["Viewport"],
+            "Grid_Size": f"{m['grid']}x{m['grid']}",
+            "Grid_Consistency(%)": m["grid_consistency"] * 100,
+            "Hit_Rate(%)": m["hit_rate"] * 100,
+            "Density": m["density"],
+            "Variability": m["variability"],
+            "Compression_Ratio": m["compression_ratio"],
+            "Entropy": m["entropy"],
+            "CR_File": m["cr_file"],
+            "Screenshot_Size(Bytes)": m["png_size"],
+            "Compressed_JPG_Size(Bytes)": m["jpg_size"],
+            "P_Score": m["P_Score"]
+        }
+        row.update({name: m[name] for name in extra})
+        # Sampled pages are flagged, with their intervals (only when approximate mode is on)
+        if approx is not None:
+            row.update({
+                "Approximate": m["approximate"],
+                "Sample_Size": m["sample_size"],
+                "Hit_Rate_CI_Low(%)": m["hit_rate_ci_low"] * 100,
+                "Hit_Rate_CI_High(%)": m["hit_rate_ci_high"] * 100,
+                "Entropy_CI_Low": m["entropy_ci_low"],
+                "Entropy_CI_High": m["entropy_ci_high"],
+            })
+        results.append(row)
+
+    # Typed store is the source of truth; the CSV is kept as an export
+    df = apply_schema(pd.DataFrame(results), "evaluation")
+    name = os.path.splitext(csv_filename)[0]
+    stored = write_results(df, "evaluation", os.path.join(RESULTS_DIR, f"{name}.parquet"))
+    out_csv = export_csv(df, os.path.join(UI_DATA_DIR, csv_filename))
+    # Per-run copy for trend analysis in step 8 (the files above are overwritten every run)
+    history = append_run_results(df, name.replace("evaluation_results_", ""), HISTORY_DIR)
+    print(f"Step 4 typed results saved to {stored}")
     print(f"Step 4 results saved to {out_csv}")
+    print(f"Step 4 run history saved to {history}")
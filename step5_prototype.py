@@ -7,15 +7,17 @@ from step2_grid_parsing import process_ui_data_step2
 from step3_computer_vision import process_step3
 from step4_metrics_evaluation import step4_evaluation
 from step6_ai_integration import step6_ai_integration
+from utils.grid_optimizer import optimize_grids
 
 # Config paths for proper output routing
 from config import (
-    
     TEST_URLS_STEP5,
     JSON_SUBDIR_STEP5,
     LOG_DIR_STEP5,
     INTERACTION_SHOT_DIR_STEP5,
-    SCREENSHOT_DIR_STEP5
+    SCREENSHOT_DIR_STEP5,
+    BEST_GRID_JSON_DIR_STEP5,
+    ONLINE_METRICS
 )
 
 def step5_prototype_development(test_urls=TEST_URLS_STEP5, headless=True):
@@ -31,7 +33,8 @@ def step5_prototype_development(test_urls=TEST_URLS_STEP5, headless=True):
     print("\n=== STEP 5: Prototype Development ===")
 
     # Step 1: Capture screenshots and extract UI element metadata
-    capture_ui_screenshots(test_urls, headless=False, screenshot_dir=SCREENSHOT_DIR_STEP5)
+    capture_ui_screenshots(test_urls, headless=False, screenshot_dir=SCREENSHOT_DIR_STEP5,
+                           online_metrics=ONLINE_METRICS)
 
 
     # Step 2: Apply grid parsing and assign components to spatial cells
@@ -41,11 +44,18 @@ def step5_prototype_development(test_urls=TEST_URLS_STEP5, headless=True):
     process_step3(json_dir=JSON_SUBDIR_STEP5, screenshot_dir=SCREENSHOT_DIR_STEP5)
 
     # Step 4: Compute parsing metrics (Hit rate, Density, Entropy, CRs)
-    step4_evaluation(
-        json_dir=JSON_SUBDIR_STEP5,
-        csv_filename="evaluation_results_step5.csv",
-        screenshot_dir=SCREENSHOT_DIR_STEP5
-    )
+    if not ONLINE_METRICS:
+        step4_evaluation(
+            json_dir=JSON_SUBDIR_STEP5,
+            csv_filename="evaluation_results_step5.csv",
+            screenshot_dir=SCREENSHOT_DIR_STEP5
+        )
+
+    # Step 4b: Search the grid shape that best fits each domain's layout (rows x cols, uniform or non-uniform)
+    for result in optimize_grids(JSON_SUBDIR_STEP5, BEST_GRID_JSON_DIR_STEP5):
+        best = result["Best_Grid"]
+        print(f"[GRID] {result['Domain']} ({result['Viewport']}): best {best['Type']} {best['Grid_Size']} "
+              f"alignment {best['Alignment']:.4f} (8x8: {result['Baseline_8x8_Alignment']:.4f})")
 
     # Step 6: Simulate interaction (clicks & inputs) and log output
     step6_ai_integration(
@@ -1,17 +1,30 @@
-import os, time, json
+import os, time, json, threading
 from datetime import datetime
 from urllib.parse import urlparse
-from selenium.webdriver.common.by import By
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from selenium.webdriver import ActionChains
+from selenium.webdriver.support.ui import WebDriverWait
 from utils.driver_setup import setup_selenium_driver
 from utils.helpers import dismiss_cookies
+from utils.interaction_store import InteractionShotStore
+from utils.change_tracker import ChangeTracker
+from utils.element_resolver import resolve_components
+from utils.page_reset import PageStateReset
+from utils.interaction_log import InteractionLog, interaction_key
+from utils.interaction_planner import InteractionPlanner, coverage_report
+from utils.instrumentation import span, run_in_context
+from utils.page_archive import replay_proxy, replay_url
 from config import (
     JSON_SUBDIR_STEP1, LOG_DIR_STEP6, LOG_DIR_STEP7,
-    INTERACTION_SHOT_DIR_STEP6, INTERACTION_SHOT_DIR_STEP7
+    INTERACTION_SHOT_DIR_STEP6, INTERACTION_SHOT_DIR_STEP7,
+    INTERACTION_SHOT_MODE, CLICK_EFFECT_TIMEOUT_MS, CLICK_EFFECT_QUIET_MS,
+    STEP6_WORKERS, STEP6_SITE_BUDGET_S, STEP6_PAGE_LOAD_TIMEOUT_S,
+    STEP6_HIGHLIGHT_MS, STEP6_FOCUS_TIMEOUT_S, STEP6_RESUME,
+    STEP6_PLANNER, STEP6_CLICK_BUDGET, STEP6_HISTORY_DIRS,
+    PAGE_ARCHIVE_MODE, PAGE_ARCHIVE_DIR
 )
-import pandas as pd
 
-def log_interaction(comp, interaction_type, method, coords, success, error=None):
+def log_interaction(comp, interaction_type, method, coords, success, error=None, effect=None, reset=None):
     return {
         "interaction_type": interaction_type,
         "target_text": comp.get("Text", ""),
@@ -25,206 +38,348 @@ def log_interaction(comp, interaction_type, method, coords, success, error=None)
         "height": comp.get("Height", 0),
         "success": success,
         "error": error,
+        "effect": effect,
+        "reset": reset,
         "timestamp": datetime.utcnow().isoformat()
     }
 
-def step6_ai_integration(
-    test_urls,
-    headless=True,
-    fallback_to_coordinates=True,
-    json_dir=JSON_SUBDIR_STEP1,
-    log_dir=None,
-    screenshot_dir=None
-):
-    print("\n=== STEP 6: AI Integration (Smart Clicking + Logging + Screenshots) ===")
+# ----------------------
+# Waits and highlighting
+# ----------------------
+def wait_for_page_load(driver, timeout=STEP6_PAGE_LOAD_TIMEOUT_S):
+    """Wait for document.readyState == 'complete' instead of a fixed sleep."""
+    WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+        lambda d: d.execute_script("return document.readyState") == "complete")
 
-    if log_dir is None:
-        log_dir = LOG_DIR_STEP6 if json_dir == JSON_SUBDIR_STEP1 else LOG_DIR_STEP7
-    if screenshot_dir is None:
-        screenshot_dir = INTERACTION_SHOT_DIR_STEP6 if json_dir == JSON_SUBDIR_STEP1 else INTERACTION_SHOT_DIR_STEP7
+def wait_for_focus(driver, timeout=STEP6_FOCUS_TIMEOUT_S):
+    """Wait until an editable element has focus (after clicking an input); False on timeout."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.05).until(lambda d: d.execute_script(
+            "var e = document.activeElement;"
+            "return !!e && (e.isContentEditable || /^(INPUT|TEXTAREA|SELECT)$/.test(e.tagName));"))
+        return True
+    except Exception:
+        return False
 
-    os.makedirs(log_dir, exist_ok=True)
-    os.makedirs(screenshot_dir, exist_ok=True)
+def highlight(driver, x_center, y_center, width, height, highlight_ms):
+    """Draw a temporary outline box at page coordinates (skipped when highlight_ms is 0)."""
+    if not highlight_ms:
+        return
+    driver.execute_script(f"""
+        var div = document.createElement('div');
+        div.setAttribute('data-gp-overlay', '1');
+        div.style.position = 'absolute';
+        div.style.left = '{x_center - width / 2}px';
+        div.style.top = '{y_center - height / 2}px';
+        div.style.width = '{width}px';
+        div.style.height = '{height}px';
+        div.style.border = '3px solid red';
+        div.style.zIndex = '9999';
+        div.style.pointerEvents = 'none';
+        document.body.appendChild(div);
+        setTimeout(() => div.remove(), {highlight_ms + 500});
+    """)
+    time.sleep(highlight_ms / 1000)
 
-    driver = setup_selenium_driver(headless=headless)
-    driver.set_window_size(1920, 1080)
+def _unique_by_center(comps, keep):
+    seen, out = set(), []
+    for comp in comps:
+        if keep(comp):
+            center = (round(comp["X"] + comp["Width"] / 2), round(comp["Y"] + comp["Height"] / 2))
+            if center not in seen:
+                seen.add(center)
+                out.append(comp)
+    return out
 
-    for url in test_urls:
-        print(f"\n[AI TEST] Visiting {url}")
-        driver.get(url)
-        time.sleep(3)
+def _is_button_like(comp):
+    class_attr = comp.get("Class", "").lower()
+    role_attr = comp.get("Role", "").lower()
+    return "button" in (class_attr + role_attr) or "btn" in class_attr
+
+# ----------------------
+# One site
+# ----------------------
+def simulate_site(driver, url, json_dir, log_dir, screenshot_dir, fallback_to_coordinates=True,
+                  highlight_ms=0, budget_s=STEP6_SITE_BUDGET_S, resume=STEP6_RESUME,
+                  planner=None, max_clicks=STEP6_CLICK_BUDGET, replay=False):
+    """
+    Click button-like components and fill input fields of one site, within `budget_s` seconds.
+    With a `planner`, candidates are clicked in order of expected success and at most
+    `max_clicks` of them are attempted. Interactions are streamed to `<domain>_interactions.jsonl`
+    / `<domain>_summary.csv`; with `resume`, a run that was interrupted continues and skips the
+    components it already logged (a finished run's log is started afresh).
+    With `replay`, the page is loaded from the page archive proxy the driver was started with.
+    Returns a short summary including click coverage.
+    """
+    domain_name = urlparse(url).netloc.replace("www.", "").replace(".", "_")
+    json_path = os.path.join(json_dir, f"{domain_name}.json")
+    if not os.path.isfile(json_path):
+        print(f"No JSON for {domain_name}. Skipping.")
+        return None
+
+    deadline = time.monotonic() + budget_s
+    print(f"\n[AI TEST] Visiting {url}")
+    with span(stage="capture"):
+        driver.get(replay_url(url) if replay else url)
+        wait_for_page_load(driver)
+    with span(stage="cookie_dismissal"):
         dismiss_cookies(driver)
-        time.sleep(1)
 
-        domain_name = urlparse(url).netloc.replace("www.", "").replace(".", "_")
-        json_path = os.path.join(json_dir, f"{domain_name}.json")
-        interaction_log = []
+    # Injected once per page load; replaces before/after page_source comparisons
+    tracker = ChangeTracker(driver, timeout_ms=CLICK_EFFECT_TIMEOUT_MS, quiet_ms=CLICK_EFFECT_QUIET_MS)
+    tracker.install()
 
-        if not os.path.isfile(json_path):
-            print(f"No JSON for {domain_name}. Skipping.")
-            continue
+    with open(json_path, "r") as jf:
+        data = json.load(jf)
+    ui_comps = data.get("UI Components", [])
 
-        with open(json_path, "r") as jf:
-            data = json.load(jf)
-        ui_comps = data.get("UI Components", [])
-
-        seen_coords = set()
-
-        button_like = []
-        for comp in ui_comps:
-            class_attr = comp.get("Class", "").lower()
-            role_attr = comp.get("Role", "").lower()
-            if "button" in (class_attr + role_attr) or "btn" in class_attr:
-                center = (round(comp["X"] + comp["Width"] / 2), round(comp["Y"] + comp["Height"] / 2))
-                if center not in seen_coords:
-                    seen_coords.add(center)
-                    button_like.append(comp)
-
-        print(f"  Found {len(button_like)} unique button-like elements in JSON for {url}")
-        clicked_count = 0
-        initial_url = driver.current_url
-
-        for i, comp in enumerate(button_like):
-            success = False
-            class_attr = comp.get("Class", "").lower()
-            text_attr = comp.get("Text", "N/A").lower()
-            interaction_type = "click"
-
-            if class_attr:
-                class_tokens = class_attr.split()
-                if class_tokens:
-                    first_class = class_tokens[0]
-                    xpath_str = f"//*[@class='{first_class}']"
-                    try:
-                        found_elems = driver.find_elements(By.XPATH, xpath_str)
-                        for elem in found_elems:
-                            if elem.is_displayed() and elem.is_enabled():
-                                before_html = driver.page_source
-                                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", elem)
-                                driver.execute_script("arguments[0].style.outline='3px solid red'", elem)
-                                time.sleep(1)
-                                elem.click()
-                                time.sleep(2)
-                                after_html = driver.page_source
-                                success = before_html != after_html
-                                if success:
-                                    screenshot_path = os.path.join(screenshot_dir, f"{domain_name}_after_click_{i}.png")
-                                    driver.save_screenshot(screenshot_path)
-                                    clicked_count += 1
-                                interaction_log.append(
-                                    log_interaction(comp, interaction_type, "class",
-                                                    [comp["X"] + comp["Width"] / 2, comp["Y"] + comp["Height"] / 2],
-                                                    success)
-                                )
-                                break
-                    except Exception as e:
-                        interaction_log.append(
-                            log_interaction(comp, interaction_type, "class",
-                                            [comp["X"] + comp["Width"] / 2, comp["Y"] + comp["Height"] / 2],
-                                            False, str(e))
-                        )
-
-            if fallback_to_coordinates and not success:
-                x_center = comp["X"] + comp["Width"] / 2
-                y_center = comp["Y"] + comp["Height"] / 2
-                scroll_js = f"window.scrollTo({max(0, x_center-200)}, {max(0, y_center-200)});"
-                driver.execute_script(scroll_js)
-                highlight_js = f"""
-                    var div = document.createElement('div');
-                    div.style.position = 'absolute';
-                    div.style.left = '{x_center - 50}px';
-                    div.style.top = '{y_center - 25}px';
-                    div.style.width = '100px';
-                    div.style.height = '50px';
-                    div.style.border = '3px solid red';
-                    div.style.zIndex = '9999';
-                    div.style.pointerEvents = 'none';
-                    document.body.appendChild(div);
-                    setTimeout(() => div.remove(), 1500);
-                """
-                driver.execute_script(highlight_js)
-                time.sleep(1)
-                try:
-                    before_html = driver.page_source
-                    ActionChains(driver).move_by_offset(x_center, y_center).click().perform()
-                    ActionChains(driver).move_by_offset(-x_center, -y_center).perform()
-                    time.sleep(1)
-                    after_html = driver.page_source
-
-                    success = before_html != after_html
-                    if success:
-                        screenshot_path = os.path.join(screenshot_dir, f"{domain_name}_after_coord_click_{i}.png")
-                        driver.save_screenshot(screenshot_path)
-                        clicked_count += 1
-
-                    interaction_log.append(
-                        log_interaction(comp, interaction_type, "coordinates", [x_center, y_center], success)
-                    )
+    # Base state of the page; later screenshots are stored as changed-region patches
+    # (a resumed run keeps the stored keyframe so earlier patches stay valid). Only an
+    # interrupted run is resumed; a finished log is replaced by this run's.
+    resume = resume and InteractionLog.resumable(log_dir, domain_name)
+    shots = InteractionShotStore(screenshot_dir, domain_name, mode=INTERACTION_SHOT_MODE)
+    if not (resume and shots.reopen()):
+        shots.set_keyframe(driver.get_screenshot_as_png())
+    interaction_log = InteractionLog(log_dir, domain_name, resume=resume, on_flush=shots.close)
+    if interaction_log.resumed:
+        print(f"  [{domain_name}] Resuming after {interaction_log.resumed} logged interactions")
 
-                except Exception as e:
-                    interaction_log.append(
-                        log_interaction(comp, interaction_type, "coordinates", [x_center, y_center], False, str(e))
-                    )
+    # Every interaction must start from this state, or the JSON coordinates no longer apply
+    resetter = PageStateReset(driver, load_timeout=STEP6_PAGE_LOAD_TIMEOUT_S, on_restore=tracker.install)
+    resetter.capture()
+
+    button_like = _unique_by_center(ui_comps, _is_button_like)
+    print(f"  [{domain_name}] Found {len(button_like)} unique button-like elements in JSON for {url}")
+    n_candidates = len(button_like)
+    if planner is not None:
+        # Highest expected yield first; resumed components are skipped below, so they do not use the budget
+        button_like = [comp for _, comp in planner.plan(button_like)]
+    clicked_count = 0
+    outcomes = []  # per attempted candidate in click order: did any attempt have an effect
+    out_of_budget = False
+
+    # One script call maps every candidate to a live element (class tokens, point, text)
+    resolved = resolve_components(driver, button_like)
 
-        print(f"  [AI TEST] Clicked {clicked_count}/{len(button_like)} recognized 'button-like' elements.")
+    def restore(effect=None, next_index=None):
+        """Reset the page; element handles of the remaining candidates go stale if the DOM was replaced."""
+        strategy = resetter.reset(effect)
+        if strategy not in (None, "failed") and next_index is not None and next_index < len(button_like):
+            resolved[next_index:] = resolve_components(driver, button_like[next_index:])
+        return strategy
 
-        # Deduplicate input fields the same way
-        input_fields = []
-        seen_input_coords = set()
-        for field in ui_comps:
-            if field["Tag"].lower() in ["input", "textarea"]:
-                center = (round(field["X"] + field["Width"] / 2), round(field["Y"] + field["Height"] / 2))
-                if center not in seen_input_coords:
-                    seen_input_coords.add(center)
-                    input_fields.append(field)
+    for i, comp in enumerate(button_like):
+        key = interaction_key("click", comp)
+        if interaction_log.done(key):
+            continue
+        match = resolved[i]
+        if time.monotonic() > deadline:
+            out_of_budget = True
+            break
+        if max_clicks is not None and len(outcomes) >= max_clicks:
+            break
+        success = False
+        interaction_type = "click"
+        entries = []
 
-        print(f"  Found {len(input_fields)} unique input fields to simulate.")
+        if match is not None:
+            elem = match["element"]
+            try:
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", elem)
+                if highlight_ms:
+                    driver.execute_script("arguments[0].style.outline='3px solid red'", elem)
+                    time.sleep(highlight_ms / 1000)
+                tracker.begin(elem)
+                elem.click()
+                effect = tracker.end()
+                success = effect["effect"] is not None
+                if success:
+                    shots.add_frame(f"after_click_{i}", driver.get_screenshot_as_png())
+                    clicked_count += 1
+                entries.append(
+                    log_interaction(comp, interaction_type, match["method"],
+                                    [comp["X"] + comp["Width"] / 2, comp["Y"] + comp["Height"] / 2],
+                                    success, effect=effect, reset=restore(effect, i + 1))
+                )
+            except Exception as e:
+                entries.append(
+                    log_interaction(comp, interaction_type, match["method"],
+                                    [comp["X"] + comp["Width"] / 2, comp["Y"] + comp["Height"] / 2],
+                                    False, str(e), reset=restore(None, i + 1))
+                )
 
-        for j, field in enumerate(input_fields):
+        if fallback_to_coordinates and not success:
+            x_center = comp["X"] + comp["Width"] / 2
+            y_center = comp["Y"] + comp["Height"] / 2
+            scroll_js = f"window.scrollTo({max(0, x_center-200)}, {max(0, y_center-200)});"
+            driver.execute_script(scroll_js)
+            highlight(driver, x_center, y_center, 100, 50, highlight_ms)
             try:
-                x_center = field["X"] + field["Width"] / 2
-                y_center = field["Y"] + field["Height"] / 2
-                scroll_js = f"window.scrollTo({max(0, x_center-200)}, {max(0, y_center-200)});"
-                driver.execute_script(scroll_js)
-                highlight_js = f"""
-                    var div = document.createElement('div');
-                    div.style.position = 'absolute';
-                    div.style.left = '{x_center - 50}px';
-                    div.style.top = '{y_center - 15}px';
-                    div.style.width = '100px';
-                    div.style.height = '30px';
-                    div.style.border = '3px solid red';
-                    div.style.zIndex = '9999';
-                    div.style.pointerEvents = 'none';
-                    document.body.appendChild(div);
-                    setTimeout(() => div.remove(), 1500);
-                """
-                driver.execute_script(highlight_js)
-                time.sleep(1)
+                tracker.begin()
                 ActionChains(driver).move_by_offset(x_center, y_center).click().perform()
                 ActionChains(driver).move_by_offset(-x_center, -y_center).perform()
-                time.sleep(0.5)
-                driver.switch_to.active_element.send_keys("test input")
+                effect = tracker.end()
 
-                screenshot_path = os.path.join(screenshot_dir, f"{domain_name}_after_input_{j}.png")
-                driver.save_screenshot(screenshot_path)
+                success = effect["effect"] is not None
+                if success:
+                    shots.add_frame(f"after_coord_click_{i}", driver.get_screenshot_as_png())
+                    clicked_count += 1
 
-                interaction_log.append(
-                    log_interaction(field, "input", "coordinates", [x_center, y_center], True)
+                entries.append(
+                    log_interaction(comp, interaction_type, "coordinates", [x_center, y_center], success,
+                                    effect=effect, reset=restore(effect, i + 1))
                 )
-                print(f"Input field filled at (X={x_center:.1f}, Y={y_center:.1f})")
 
             except Exception as e:
-                interaction_log.append(
-                    log_interaction(field, "input", "coordinates", [x_center, y_center], False, str(e))
+                entries.append(
+                    log_interaction(comp, interaction_type, "coordinates", [x_center, y_center], False, str(e),
+                                    reset=restore(None, i + 1))
                 )
 
-        # Save interaction logs
-        with open(os.path.join(log_dir, f"{domain_name}_interactions.json"), "w", encoding="utf-8") as logf:
-            json.dump(interaction_log, logf, indent=4, ensure_ascii=False)
+        interaction_log.extend(key, entries)
+        outcomes.append(success)
+
+    coverage = coverage_report(outcomes, n_candidates)
+    print(f"  [{domain_name}] Clicked {clicked_count}/{n_candidates} recognized 'button-like' elements "
+          f"({coverage['attempts']} attempted, {coverage['coverage']:.0%} coverage, "
+          f"{coverage['yield']:.0%} yield; successes at "
+          + ", ".join(f"{k}: {v}" for k, v in coverage["successes_by_attempt_share"].items())
+          + " of attempts).")
+
+    # Deduplicate input fields the same way
+    input_fields = _unique_by_center(ui_comps, lambda c: c["Tag"].lower() in ["input", "textarea"])
+    print(f"  [{domain_name}] Found {len(input_fields)} unique input fields to simulate.")
 
-        summary_csv = os.path.join(log_dir, f"{domain_name}_summary.csv")
-        pd.DataFrame(interaction_log).to_csv(summary_csv, index=False)
+    for j, field in enumerate(input_fields):
+        key = interaction_key("input", field)
+        if interaction_log.done(key):
+            continue
+        if out_of_budget or time.monotonic() > deadline:
+            out_of_budget = True
+            break
+        try:
+            x_center = field["X"] + field["Width"] / 2
+            y_center = field["Y"] + field["Height"] / 2
+            scroll_js = f"window.scrollTo({max(0, x_center-200)}, {max(0, y_center-200)});"
+            driver.execute_script(scroll_js)
+            highlight(driver, x_center, y_center, 100, 30, highlight_ms)
+            ActionChains(driver).move_by_offset(x_center, y_center).click().perform()
+            ActionChains(driver).move_by_offset(-x_center, -y_center).perform()
+            wait_for_focus(driver)
+            driver.switch_to.active_element.send_keys("test input")
+
+            shots.add_frame(f"after_input_{j}", driver.get_screenshot_as_png())
+
+            interaction_log.extend(key, [
+                log_interaction(field, "input", "coordinates", [x_center, y_center], True, reset=restore())
+            ])
+            print(f"  [{domain_name}] Input field filled at (X={x_center:.1f}, Y={y_center:.1f})")
+
+        except Exception as e:
+            interaction_log.extend(key, [
+                log_interaction(field, "input", "coordinates", [x_center, y_center], False, str(e),
+                                reset=restore())
+            ])
+
+    reset_stats = resetter.summary()
+    print(f"  [{domain_name}] Page resets: " + ", ".join(
+        f"{name} {st['successes']}/{st['attempts']} in {st['seconds']}s" for name, st in reset_stats.items()))
+    if out_of_budget:
+        print(f"  [{domain_name}] Time budget of {budget_s}s used up; remaining interactions skipped.")
+    # Final flush also writes the shot manifest and the legacy <domain>_interactions.json
+    interaction_log.close()
+    return {"domain": domain_name, "interactions": interaction_log.count, "clicked": clicked_count,
+            "out_of_budget": out_of_budget, "resets": reset_stats, "coverage": coverage}
+
+# ----------------------
+# Runner: one isolated browser per worker
+# ----------------------
+def _new_driver(headless, proxy_server=None):
+    driver = setup_selenium_driver(headless=headless, proxy_server=proxy_server)  # start-up is serialized in driver_setup
+    driver.set_window_size(1920, 1080)
+    driver.set_page_load_timeout(STEP6_PAGE_LOAD_TIMEOUT_S)
+    return driver
+
+def _reset_browser_state(driver):
+    """Drop cookies, cache and the previous site's storage so every site starts from a clean context."""
+    try:
+        parts = urlparse(driver.current_url)
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        if parts.scheme in ("http", "https"):
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin",
+                                   {"origin": f"{parts.scheme}://{parts.netloc}", "storageTypes": "all"})
+    except Exception:
+        pass
 
-    driver.quit()
-    print("Step 6 complete.")
\ No newline at end of file
+def step6_ai_integration(
+    test_urls,
+    headless=True,
+    fallback_to_coordinates=True,
+    json_dir=JSON_SUBDIR_STEP1,
+    log_dir=None,
+    screenshot_dir=None,
+    workers=STEP6_WORKERS,
+    site_budget_s=STEP6_SITE_BUDGET_S,
+    use_planner=STEP6_PLANNER,
+    max_clicks=STEP6_CLICK_BUDGET,
+    archive_mode=PAGE_ARCHIVE_MODE,
+    archive_dir=PAGE_ARCHIVE_DIR
+):
+    """
+    Runs the interaction simulation for `test_urls`, up to `workers` sites at a time. Every
+    worker owns a separate browser (own profile), cleared between sites; each site gets at
+    most `site_budget_s` seconds and `max_clicks` click candidates. With `use_planner`,
+    candidates are ranked by a model fitted once on all earlier interaction logs.
+    Highlighting is only drawn when the browser is visible. With archive_mode="replay" the
+    sites are served from the pages step 1 recorded in `archive_dir`. Returns {url: site summary, or
+    None if the site was skipped or failed}.
+    """
+    print("\n=== STEP 6: AI Integration (Smart Clicking + Logging + Screenshots) ===")
+
+    if log_dir is None:
+        log_dir = LOG_DIR_STEP6 if json_dir == JSON_SUBDIR_STEP1 else LOG_DIR_STEP7
+    if screenshot_dir is None:
+        screenshot_dir = INTERACTION_SHOT_DIR_STEP6 if json_dir == JSON_SUBDIR_STEP1 else INTERACTION_SHOT_DIR_STEP7
+
+    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(screenshot_dir, exist_ok=True)
+
+    highlight_ms = 0 if headless else STEP6_HIGHLIGHT_MS
+    planner = None
+    if use_planner:
+        planner = InteractionPlanner.from_logs(STEP6_HISTORY_DIRS)
+        print(f"[PLANNER] Fitted on {planner.n} logged clicks (base success rate {planner.p0:.1%})")
+    proxy = replay_proxy(archive_dir) if archive_mode == "replay" else None
+    local = threading.local()
+    drivers = []
+    summaries = {}
+
+    def run(url):
+        if not hasattr(local, "driver"):
+            local.driver = _new_driver(headless, proxy.address if proxy else None)
+            drivers.append(local.driver)
+        else:
+            _reset_browser_state(local.driver)
+        with span(domain=urlparse(url).netloc.replace("www.", "").replace(".", "_")):
+            return simulate_site(local.driver, url, json_dir, log_dir, screenshot_dir,
+                                 fallback_to_coordinates, highlight_ms, site_budget_s,
+                                 planner=planner, max_clicks=max_clicks, replay=proxy is not None)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(test_urls)))) as pool:
+            # Workers keep the caller's step label for the run report
+            futures = {pool.submit(run_in_context(run), url): url for url in test_urls}
+            for fut in as_completed(futures):
+                try:
+                    summaries[futures[fut]] = fut.result()
+                except Exception as e:
+                    summaries[futures[fut]] = None
+                    print(f"[AI TEST] {futures[fut]} failed: {e}")
+    finally:
+        for driver in drivers:
+            driver.quit()
+    if proxy:
+        print(f"[REPLAY] Archive hits: {proxy.stats['hits']}, misses: {proxy.stats['misses']}")
+    print("Step 6 complete.")
+    return summaries
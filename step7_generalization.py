@@ -10,6 +10,7 @@ from step6_ai_integration import step6_ai_integration
 
 # Import correct directories for Step 7
 from config import (
+    ONLINE_METRICS,
     SCREENSHOT_DIR_STEP7, JSON_SUBDIR_STEP7,
     LOG_DIR_STEP7, INTERACTION_SHOT_DIR_STEP7
 )
@@ -26,7 +27,8 @@ def step7_generalization_and_adaptability(test_urls, headless=True):
     print("\n=== STEP 7: Generalization & Adaptability ===")
 
     # Step 1 (repurposed): Capture screenshots + UI JSONs
-    capture_ui_screenshots(test_urls, headless=False, screenshot_dir=SCREENSHOT_DIR_STEP7)
+    capture_ui_screenshots(test_urls, headless=False, screenshot_dir=SCREENSHOT_DIR_STEP7,
+                           online_metrics=ONLINE_METRICS)
 
     # Step 2: Grid-based parsing with overlays and metrics
     process_ui_data_step2(json_dir=JSON_SUBDIR_STEP7, screenshot_dir=SCREENSHOT_DIR_STEP7)
@@ -35,7 +37,8 @@ def step7_generalization_and_adaptability(test_urls, headless=True):
     process_step3(json_dir=JSON_SUBDIR_STEP7, screenshot_dir=SCREENSHOT_DIR_STEP7)
 
     # Step 4: Evaluate layout metrics from parsed JSONs
-    step4_evaluation(json_dir=JSON_SUBDIR_STEP7, csv_filename="evaluation_results_step7.csv")
+    if not ONLINE_METRICS:
+        step4_evaluation(json_dir=JSON_SUBDIR_STEP7, csv_filename="evaluation_results_step7.csv")
 
     # Step 6: Interaction simulation (clicks/inputs) — uses JSONs from Step 7
     step6_ai_integration(
@@ -2,27 +2,77 @@
 
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.linear_model import LinearRegression
-from config import UI_DATA_DIR, PLOTS_DIR
-
-def step8_final_evaluation():
+from config import (
+    UI_DATA_DIR, RESULTS_DIR, HISTORY_DIR, PLOTS_DIR,
+    STEP8_ARTIFACTS, STEP8_HTML_REPORT, STEP8_FIGURE_WORKERS,
+    STEP8_RUN_FROM, STEP8_RUN_TO, STEP8_LAST_RUNS
+)
+from utils.result_store import load_step_results
+from utils.report_figures import FIGURES, render_figures, write_html_report
+from utils.run_history import analyze_runs
+
+# Table artifacts; figure artifacts are the keys of utils.report_figures.FIGURES
+TABLES = ["stats", "hypothesis", "history"]
+
+def step8_history_analysis(run_from=STEP8_RUN_FROM, run_to=STEP8_RUN_TO, last=STEP8_LAST_RUNS):
+    """
+    Grouped stats, best grid per domain, CR_File ~ Entropy x Density regression and per-run
+    trends over the stored runs in [run_from, run_to] (or the last `last` runs), one run at a time.
+    Returns (written paths, analysis dict).
+    """
+    result = analyze_runs(HISTORY_DIR, run_from=run_from, run_to=run_to, last=last)
+    if not result["runs"]:
+        print("No stored runs in range; run history analysis skipped.")
+        return [], result
+
+    reg = result["regression"]
+    print(f"\n--- Run history: {len(result['runs'])} runs ({result['runs'][0]} .. {result['runs'][-1]}) ---")
+    print(f"CR_File ~ Entropy×Density over {reg['n']} best grids: slope {reg['slope']:.4f}, "
+          f"intercept {reg['intercept']:.4f}, R² {reg['r2']:.4f}")
+    print(result["stats"])
+
+    written = []
+    for key, filename in (("stats", "history_evaluation_stats.csv"), ("best_grids", "history_best_grids.csv"),
+                          ("trend", "history_run_trend.csv")):
+        path = os.path.join(UI_DATA_DIR, filename)
+        result[key].to_csv(path, index=(key == "stats"))
+        written.append(path)
+    print(f"Run history analysis took {result['seconds']:.2f}s")
+    return written, result
+
+def step8_final_evaluation(artifacts=STEP8_ARTIFACTS, html=STEP8_HTML_REPORT, workers=STEP8_FIGURE_WORKERS):
+    """
+    Final analysis over the step 1/5/7 evaluation tables.
+
+    Args:
+        artifacts (list or None): which outputs to write: "stats", "hypothesis", "history"
+            (trend analysis over stored runs, see step8_history_analysis) and/or figure names
+            from FIGURES. None writes everything.
+        html (bool): also bundle the tables and selected figures into plots/step8_report.html.
+        workers (int): processes used to render figures.
+    """
     print("\n=== STEP 8: Final Evaluation & Analysis ===")
-
-    # Load precomputed evaluation CSVs (with P_Score already computed)
-    step1_csv = os.path.join(UI_DATA_DIR, "evaluation_results_step1.csv")  # Training dataset
-    step7_csv = os.path.join(UI_DATA_DIR, "evaluation_results_step7.csv")  # Media/Blog-style dataset
-    step5_csv = os.path.join(UI_DATA_DIR, "evaluation_results_step5.csv")  # Test dataset (prototype)
-
-    if not os.path.isfile(step1_csv) or not os.path.isfile(step7_csv) or not os.path.isfile(step5_csv):
+    selected = set(TABLES) | set(FIGURES) if artifacts is None else set(artifacts)
+    unknown = selected - set(TABLES) - set(FIGURES)
+    if unknown:
+        raise ValueError(f"Unknown step 8 artifacts {sorted(unknown)} (known: {TABLES + list(FIGURES)})")
+    written = []
+
+    history = None
+    if "history" in selected:
+        paths, history = step8_history_analysis()
+        written += paths
+
+    # Load precomputed evaluation results (typed store, falling back to the CSV exports)
+    df1 = load_step_results("evaluation_results_step1", RESULTS_DIR, UI_DATA_DIR)  # Training dataset
+    df2 = load_step_results("evaluation_results_step7", RESULTS_DIR, UI_DATA_DIR)  # Media/Blog-style dataset
+    df_test = load_step_results("evaluation_results_step5", RESULTS_DIR, UI_DATA_DIR)  # Test dataset (prototype)
+
+    if df1 is None or df2 is None or df_test is None:
         print("Missing evaluation result files.")
         return
 
-    df1 = pd.read_csv(step1_csv)  # Training dataset
-    df2 = pd.read_csv(step7_csv)  # Media/Blog-style dataset
-    df_test = pd.read_csv(step5_csv)  # Test dataset (prototype)
-
     # Label the dataset types
     df1["Dataset_Type"] = "Training"
     df2["Dataset_Type"] = "General"  # Media/Blog-style dataset
@@ -49,11 +99,8 @@ def step8_final_evaluation():
         "CR_File", "Entropy", "P_Score"
     ]
 
-    # Ensure all numeric columns are properly converted to numeric type
-    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
-
-    # Best grid per domain (assuming pre-identified best grid)
-    best_grids = df.loc[df.groupby("Domain")["P_Score"].idxmax()][['Domain', 'Dataset_Type', 'Site_Type', 'Grid_Size'] + numeric_cols + ["Grid_Consistency(%)"]]
+    # Best grid per domain and viewport (a page captured at several viewports counts once per layout)
+    best_grids = df.loc[df.groupby(["Domain", "Viewport"])["P_Score"].idxmax()][['Domain', 'Viewport', 'Dataset_Type', 'Site_Type', 'Grid_Size'] + numeric_cols + ["Grid_Consistency(%)"]]
 
     # Make sure that the 'Grid_Size' column exists in best_grids
     if 'Grid_Size' not in best_grids.columns:
@@ -77,7 +124,9 @@ def step8_final_evaluation():
     # Grouped stats by dataset type and site type - only using numeric columns for aggregation
     best_grids_numeric = best_grids[numeric_cols + ['Dataset_Type', 'Site_Type']]  # Filter out non-numeric columns
     grouped = best_grids_numeric.groupby(["Dataset_Type", "Site_Type"]).agg(['mean', 'std', 'count'])
-    grouped.to_csv(os.path.join(UI_DATA_DIR, "final_evaluation_stats.csv"))
+    if "stats" in selected:
+        grouped.to_csv(os.path.join(UI_DATA_DIR, "final_evaluation_stats.csv"))
+        written.append(os.path.join(UI_DATA_DIR, "final_evaluation_stats.csv"))
 
     # Hypothesis testing: CR_File ≈ 1 / (Entropy × Density)
     print("\n--- Hypothesis: CR_File ≈ 1 / (Entropy × Density) ---")
@@ -92,75 +141,28 @@ def step8_final_evaluation():
     r2 = model.score(best_grids[["Entropy*Density"]], best_grids["CR_File"])
     print(f"🔍 R² score: {r2:.4f}")
 
-    best_grids.to_csv(os.path.join(UI_DATA_DIR, "cr_hypothesis_analysis.csv"), index=False)
-
-    # Plot 1: CR_File vs Entropy × Density
-    plt.figure(figsize=(8, 6))
-    sns.scatterplot(data=best_grids, x="Entropy*Density", y="CR_File", hue="Dataset_Type")
-    plt.plot(best_grids["Entropy*Density"], model.predict(best_grids[["Entropy*Density"]]),
-             color='black', linestyle='--', label="Regression Line")
-    plt.title("CR_File vs Entropy × Density")
-    plt.xlabel("Entropy × Density")
-    plt.ylabel("CR_File")
-    plt.grid(True)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "scatter_cr_file_vs_entropy_density.png"))
-
-    # Plot 2: Correlation Heatmap (without Grid_Consistency(%) in correlation)
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5)
-    plt.title("Correlation Heatmap of Metrics")
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "correlation_heatmap.png"))
-
-    # Plot 3: Grid Consistency by Dataset Type (with corrected hue parameter)
-    plt.figure(figsize=(8, 6))
-    sns.boxplot(data=best_grids, x="Dataset_Type", y="Grid_Consistency(%)", hue="Dataset_Type", palette="Set2", legend=False)
-    plt.title("Grid Consistency (%) by Dataset Type")
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "grid_consistency_by_type.png"))
-
-    # Plot 4: P_Score vs Metrics
-    plt.figure(figsize=(8, 5))
-    score_corr.drop("P_Score").plot(kind='barh', color='teal')
-    plt.title("Correlation of P_Score with Metrics")
-    plt.xlabel("Pearson Correlation")
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "p_score_metric_correlation.png"))
-
-    # --- New Plots: ---
-    # Plot 5: Parsing Score across Grid Sizes
-    grid_size_comparison = best_grids.groupby("Grid_Size")["P_Score"].mean()
-    plt.figure(figsize=(8, 6))
-    grid_size_comparison.plot(kind='bar', color='royalblue')
-    plt.title("Parsing Score Across Grid Sizes")
-    plt.xlabel("Grid Size")
-    plt.ylabel("Mean P_Score")
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "parsing_score_across_grid_sizes.png"))
-
-    # Plot 6: Best Grid Size per Domain
-    best_grid_per_domain = best_grids.groupby("Domain")["Grid_Size"].agg(lambda x: x.mode()[0])  # most frequent grid size
-    plt.figure(figsize=(8, 6))
-    best_grid_per_domain.value_counts().plot(kind='bar', color='forestgreen')
-    plt.title("Best Grid Size per Domain")
-    plt.xlabel("Grid Size")
-    plt.ylabel("Frequency")
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "best_grid_size_per_domain.png"))
-
-    # Plot 7: Train (E-Commerce) vs Test (Media) Comparison for P_Score and Density
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x="Dataset_Type", y="P_Score", data=best_grids, hue="Dataset_Type", palette="Set2", legend=False)
-    plt.title("Train vs Test: P_Score Comparison")
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "train_vs_test_p_score_comparison.png"))
-
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x="Dataset_Type", y="Density", data=best_grids, hue="Dataset_Type", palette="Set2", legend=False)
-    plt.title("Train vs Test: Density Comparison")
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOTS_DIR, "train_vs_test_density_comparison.png"))
-
-    print("\nStep 8 completed. All results exported.")
+    if "hypothesis" in selected:
+        best_grids.to_csv(os.path.join(UI_DATA_DIR, "cr_hypothesis_analysis.csv"), index=False)
+        written.append(os.path.join(UI_DATA_DIR, "cr_hypothesis_analysis.csv"))
+
+    # Figures render in worker processes on their own Agg figures (released after saving)
+    figures = [name for name in FIGURES if name in selected]
+    if figures:
+        ctx = {"best_grids": best_grids, "corr_matrix": corr_matrix, "score_corr": score_corr,
+               "cr_pred": model.predict(best_grids[["Entropy*Density"]])}
+        written += render_figures(figures, ctx, PLOTS_DIR, workers=workers)
+
+    if html:
+        tables = {"Overall stats (best grid per domain)": best_grids[numeric_cols + ["Grid_Consistency(%)"]].describe(),
+                  "Correlation of P_Score with input metrics": score_corr.to_frame(),
+                  "Stats by dataset and site type": grouped}
+        if history and history["runs"]:
+            tables["Run history: stats by dataset and site type"] = history["stats"]
+            tables["Run history: mean metrics per run"] = history["trend"]
+        report = write_html_report(os.path.join(PLOTS_DIR, "step8_report.html"), "Step 8: Final Evaluation",
+                                   tables, [p for p in written if p.endswith(".png")])
+        written.append(report)
+        print(f"HTML report saved to {report}")
+
+    print(f"\nStep 8 completed. {len(written)} artifacts exported.")
+    return written
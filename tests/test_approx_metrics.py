@@ -0,0 +1,66 @@
+# File: grid_parser_project/tests/test_approx_metrics.py
+# Purpose: Sampled layout metrics - sample growth, exact fallback and interval coverage
+
+import pytest
+from benchmarks.synthetic import make_components
+from utils.approx_metrics import approximate_page_metrics
+from utils.metric_registry import PageMetrics
+
+GRIDS = [(8, 8), (16, 16)]
+SEEDS = range(20)
+
+
+@pytest.fixture(scope="module")
+def page():
+    comps = make_components(80_000, seed=3)
+    return comps, PageMetrics({"UI Components": comps})
+
+
+def _exact_value(page, key):
+    if isinstance(key, tuple):
+        return page.get(key[0], key[1], key[2])
+    return page.get(key)
+
+
+def test_sample_grows_until_every_interval_meets_the_tolerance(page):
+    comps, _ = page
+    loose = approximate_page_metrics(comps, GRIDS, tolerance=0.05, entropy_tolerance=0.05, seed=0)
+    tight = approximate_page_metrics(comps, GRIDS, tolerance=0.01, entropy_tolerance=0.01, seed=0)
+    assert loose["approximate"] and tight["approximate"]
+    assert loose["sample_size"] == 2000  # min_sample already meets the loose tolerance
+    assert 2000 < tight["sample_size"] <= 0.25 * len(comps)
+    assert len(tight["sample"]) == tight["sample_size"]
+
+    for key, (low, high) in tight["ci"].items():
+        name = key[0] if isinstance(key, tuple) else key
+        if name in ("grid_consistency", "hit_rate", "tag_variety"):
+            assert (high - low) / 2 <= 0.01 + 1e-12, key
+        elif name == "entropy":
+            assert (high - low) / 2 <= 0.01 * tight["metrics"][key] + 1e-12
+
+
+def test_intervals_cover_the_exact_values(page):
+    comps, exact_page = page
+    covered, total = {}, 0
+    for seed in SEEDS:
+        approx = approximate_page_metrics(comps, GRIDS, tolerance=0.01, entropy_tolerance=0.02, seed=seed)
+        assert approx["approximate"]
+        for key, (low, high) in approx["ci"].items():
+            covered[key] = covered.get(key, 0) + (low - 1e-12 <= _exact_value(exact_page, key) <= high + 1e-12)
+    # 95% intervals: every metric is covered in at least 17 of 20 independent samples
+    assert all(hits >= 17 for hits in covered.values()), covered
+
+
+def test_small_pages_are_evaluated_exactly():
+    comps = make_components(5_000, seed=1)  # min_sample (2000) is more than a quarter of the page
+    result = approximate_page_metrics(comps, GRIDS)
+    assert not result["approximate"]
+    assert result["sample"] is comps and result["sample_size"] == len(comps)
+    assert result["metrics"] == {} and result["ci"] == {}
+
+
+def test_too_large_a_sample_falls_back_to_exact(page):
+    comps, _ = page
+    result = approximate_page_metrics(comps, GRIDS, entropy_tolerance=0.001, seed=0)
+    assert not result["approximate"]
+    assert result["sample"] is comps and result["metrics"] == {}
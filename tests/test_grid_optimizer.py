@@ -0,0 +1,63 @@
+# File: grid_parser_project/tests/test_grid_optimizer.py
+# Purpose: Layout-alignment grid search and its quantile-band shortcut
+
+import numpy as np
+import pytest
+from utils.grid_optimizer import (
+    search_best_grid, quantile_bounds, quantile_index, _containment
+)
+
+
+def card_layout(seed=0, per_cell=3):
+    """Cards on a 12-column (160px), 180px-row grid over 1920x1080, each inside its cell's gutters."""
+    rng = np.random.default_rng(seed)
+    comps = []
+    for r in range(6):
+        for c in range(12):
+            for _ in range(per_cell):
+                w, h = int(rng.integers(140, 151)), int(rng.integers(160, 171))
+                x = c * 160 + int(rng.integers(0, 161 - w))
+                y = r * 180 + int(rng.integers(0, 181 - h))
+                comps.append({"X": x, "Y": y, "Width": w, "Height": h})
+    return comps
+
+
+def test_search_finds_the_layout_grid():
+    comps = card_layout()
+    best = search_best_grid(comps)
+    assert (best["family"], best["rows"], best["cols"]) == ("uniform", 6, 12)
+    assert best["contained"] == 1.0
+    assert best["evaluated"] == 2 * 63 * 63
+
+    # 135px rows are shorter than every card: nothing fits, not even by chance
+    baseline = search_best_grid(comps, row_range=[8], col_range=[8], families=("uniform",))
+    assert baseline["alignment"] == 0.0
+    assert baseline["alignment"] < best["alignment"]
+
+
+def test_coarser_grids_score_lower():
+    # Every card also fits the coarser 6x6 and 3x12 grids, but so would randomly placed ones
+    comps = card_layout(seed=1)
+    best = search_best_grid(comps, families=("uniform",))
+    for rows, cols in ((6, 6), (3, 12), (2, 2)):
+        coarse = search_best_grid(comps, row_range=[rows], col_range=[cols], families=("uniform",))
+        assert coarse["contained"] == 1.0
+        assert coarse["alignment"] < best["alignment"]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_quantile_shortcut_matches_quantile_bounds(seed):
+    rng = np.random.default_rng(seed)
+    extent = 1080
+    # Off-screen starts, ties and zero lengths included
+    start = np.concatenate([rng.integers(-200, 3000, 400), np.full(50, 500), rng.integers(0, 40, 50)])
+    length = rng.integers(0, 300, len(start))
+    sizes = [2, 3, 5, 8, 16, 64]
+
+    inside, _, bounds = _containment(start, length, sizes, extent, "quantile")
+    end = start + np.maximum(length, 1) - 1
+    for i, n in enumerate(sizes):
+        expected = quantile_bounds(start, n, extent)
+        assert bounds[n] == pytest.approx(expected)
+        same_band = quantile_index(start, expected) == quantile_index(end, expected)
+        assert np.array_equal(inside[i].astype(bool), same_band)
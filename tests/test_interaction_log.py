@@ -0,0 +1,62 @@
+# File: grid_parser_project/tests/test_interaction_log.py
+# Purpose: Interrupt and resume of the step 6 interaction log
+
+import os, csv, json
+from utils.interaction_log import InteractionLog, read_jsonl
+
+DOMAIN = "example_com"
+
+
+def _entry(text):
+    return {"interaction_type": "click", "target_text": text, "success": True}
+
+
+def _crash(log):
+    """Stop without close(): what a killed run leaves behind, plus a torn last line."""
+    log.flush()
+    log._jsonl.close()
+    log._csv_file.close()
+    with open(log.jsonl_path, "a", encoding="utf-8") as f:
+        f.write('{"interaction_type": "cli')
+
+
+def _csv_rows(log):
+    with open(log.csv_path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_resume_skips_the_same_keys_as_the_interrupted_run(tmp_path):
+    log = InteractionLog(str(tmp_path), DOMAIN)
+    log.extend("click:10:10", [_entry("a")])
+    log.extend("click:20:20", [])  # unresolved, nothing attempted
+    log.extend("input:30:30", [_entry("b"), _entry("c")])
+    before = {k for k in ("click:10:10", "click:20:20", "input:30:30") if log.done(k)}
+    assert before == {"click:10:10", "input:30:30"}
+    _crash(log)
+
+    resumed = InteractionLog(str(tmp_path), DOMAIN)
+    assert resumed.resumed == 3
+    assert {k for k in ("click:10:10", "click:20:20", "input:30:30") if resumed.done(k)} == before
+    # Both files are rewritten from the valid entries: the torn line is gone, the CSV matches
+    assert [e["target_text"] for e in read_jsonl(resumed.jsonl_path)] == ["a", "b", "c"]
+    with open(resumed.jsonl_path, "r", encoding="utf-8") as f:
+        assert all(json.loads(line) for line in f)
+    assert [r["key"] for r in _csv_rows(resumed)] == ["click:10:10", "input:30:30", "input:30:30"]
+
+    resumed.extend("click:20:20", [_entry("d")])
+    resumed.close()
+    with open(resumed.json_path, "r", encoding="utf-8") as f:
+        assert [e["target_text"] for e in json.load(f)] == ["a", "b", "c", "d"]
+    assert os.path.isfile(resumed.marker_path)
+
+
+def test_finished_log_is_not_resumed(tmp_path):
+    log = InteractionLog(str(tmp_path), DOMAIN)
+    log.extend("click:10:10", [_entry("a")])
+    log.close()
+
+    fresh = InteractionLog(str(tmp_path), DOMAIN)
+    assert fresh.resumed == 0 and not fresh.done("click:10:10")
+    assert read_jsonl(fresh.jsonl_path) == []
+    assert not os.path.isfile(fresh.marker_path)
+    fresh.close()
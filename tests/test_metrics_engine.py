@@ -0,0 +1,101 @@
+# File: grid_parser_project/tests/test_metrics_engine.py
+# Purpose: The columnar metrics engine against the per-page registry path (calculate_layout_metrics)
+
+import os, json
+import numpy as np
+import pytest
+from benchmarks.synthetic import make_ui_json, make_screenshot
+from step4_metrics_evaluation import calculate_layout_metrics
+from utils.metric_registry import (
+    METRICS, LAYOUT_METRICS, P_SCORE_WEIGHTS, register_metric, register_weighted_score
+)
+from utils.metrics_engine import compute_step_metrics
+
+GRIDS = (4, 8, 16)
+# (components, viewport, resolution): empty, single and small desktop pages plus an emulated one
+PAGES = [(0, "Desktop", "1920x1080"), (1, "Desktop", "1920x1080"), (50, "Desktop", "1920x1080"),
+         (500, "Desktop", "1920x1080"), (500, "Mobile", "390x844")]
+
+
+@pytest.fixture(scope="module")
+def workload(tmp_path_factory):
+    root = tmp_path_factory.mktemp("pages")
+    json_dir, shot_dir = str(root / "json"), str(root / "screenshots")
+    os.makedirs(json_dir)
+    os.makedirs(shot_dir)
+    for n, viewport, resolution in PAGES:
+        data = make_ui_json(n, seed=n, domain=f"page{n}_{viewport.lower()}_com")
+        data["Viewport"], data["Resolution"] = viewport, resolution
+        w, h = (int(v) for v in resolution.split("x"))
+        make_screenshot(os.path.join(shot_dir, data["Screenshot"]), data["UI Components"], w, h, seed=n)
+        with open(os.path.join(json_dir, f"page{n}_{viewport.lower()}_com.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    return json_dir, shot_dir
+
+
+def _same(actual, expected):
+    if expected is None:
+        return actual is None
+    return actual == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+def test_engine_matches_per_page_metrics(workload):
+    json_dir, shot_dir = workload
+    _, mets = compute_step_metrics(json_dir, shot_dir, GRIDS, workers=1)
+    assert len(mets) == len(PAGES) * len(GRIDS)
+
+    for row in mets.to_dict("records"):
+        with open(os.path.join(json_dir, row["JSON_File"]), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        expected = calculate_layout_metrics(data, rows=row["grid"], cols=row["grid"],
+                                            screenshot_dir=shot_dir, approximate=False)
+        for key in LAYOUT_METRICS:
+            assert _same(row[key], expected[key]), (row["JSON_File"], row["grid"], key, row[key], expected[key])
+
+
+# ----------------------
+# Registered metrics reach the engine
+# ----------------------
+@pytest.fixture
+def registry():
+    saved = dict(METRICS)
+    yield
+    METRICS.clear()
+    METRICS.update(saved)
+
+
+def test_engine_uses_registered_weighting(workload, registry):
+    json_dir, shot_dir = workload
+    weights = dict(P_SCORE_WEIGHTS, tag_variety=0.5)
+    register_weighted_score("P_Score", weights)
+    _, mets = compute_step_metrics(json_dir, shot_dir, GRIDS, workers=1)
+
+    rows = mets[mets["Num_Components"] > 0]
+    terms = {key: rows[key].astype(float).to_numpy() for key in weights if key != "sparsity"}
+    terms["sparsity"] = 1 - rows["density"].to_numpy()
+    expected = sum(w * terms[key] for key, w in weights.items())
+    assert rows["P_Score"].to_numpy() == pytest.approx(expected)
+
+
+def test_engine_resolves_extra_metrics(workload, registry):
+    json_dir, shot_dir = workload
+
+    @register_metric("button_share", inputs=("components",), depends=("total",))
+    def _button_share(page, grid, deps):
+        buttons = sum(c["Tag"] == "button" for c in page.components)
+        return buttons / deps["total"] if deps["total"] else 0.0
+
+    @register_metric("cells_per_component", inputs=("grid",), depends=("total",), columnar=True)
+    def _cells_per_component(frame, grid, deps):
+        total = np.asarray(deps["total"], dtype=np.float64)
+        return np.where(total > 0, grid[0] * grid[1] / np.maximum(total, 1), 0.0)
+
+    metrics = LAYOUT_METRICS + ["button_share", "cells_per_component"]
+    _, mets = compute_step_metrics(json_dir, shot_dir, GRIDS, workers=1, metrics=metrics)
+
+    for row in mets.to_dict("records"):
+        with open(os.path.join(json_dir, row["JSON_File"]), "r", encoding="utf-8") as f:
+            comps = json.load(f)["UI Components"]
+        n = len(comps)
+        assert row["button_share"] == pytest.approx(sum(c["Tag"] == "button" for c in comps) / n if n else 0.0)
+        assert row["cells_per_component"] == pytest.approx(row["grid"] ** 2 / n if n else 0.0)
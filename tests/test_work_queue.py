@@ -0,0 +1,121 @@
+# File: grid_parser_project/tests/test_work_queue.py
+# Purpose: Lease, expiry, retry and dead-letter transitions of the SQLite work queue
+
+import sqlite3
+import pytest
+from utils.work_queue import SQLiteWorkQueue
+
+KINDS = ["capture"]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # No backoff, so requeued tasks can be leased again straight away
+    q = SQLiteWorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2, backoff_s=0.0, backoff_max_s=0.0)
+    q.enqueue("run1", "capture", ["https://a.example"])
+    return q
+
+
+def _row(queue, task):
+    with sqlite3.connect(queue.path) as db:
+        db.row_factory = sqlite3.Row
+        return dict(db.execute("SELECT * FROM tasks WHERE id = ?", (task.id,)).fetchone())
+
+
+# ----------------------
+# Leasing
+# ----------------------
+def test_enqueue_ignores_duplicates(queue):
+    assert queue.enqueue("run1", "capture", ["https://a.example", "https://b.example"]) == 1
+    assert queue.stats("run1") == {"capture": {"queued": 2}}
+
+
+def test_lease_hands_each_task_to_one_worker(queue):
+    queue.enqueue("run1", "capture", ["https://b.example"])
+    first = queue.lease("w1", KINDS, lease_s=60, limit=1)
+    second = queue.lease("w2", KINDS, lease_s=60, limit=5)
+    assert [t.key for t in first] == ["https://a.example"]
+    assert [t.key for t in second] == ["https://b.example"]
+    assert first[0].owner == "w1" and first[0].attempts == 1
+    assert queue.lease("w3", KINDS, lease_s=60) == []
+    assert queue.lease("w3", ["step6"], lease_s=60) == []
+
+
+def test_complete_and_extend_by_holder(queue):
+    task = queue.lease("w1", KINDS, lease_s=60)[0]
+    before = _row(queue, task)["lease_expires"]
+    assert queue.extend(task, 600)
+    assert _row(queue, task)["lease_expires"] > before
+    assert queue.complete(task)
+    row = _row(queue, task)
+    assert row["state"] == "done" and row["lease_owner"] is None
+
+
+# ----------------------
+# Expiry and lost leases
+# ----------------------
+def test_expired_lease_is_requeued_and_counts_as_an_attempt(queue):
+    stale = queue.lease("w1", KINDS, lease_s=-1)[0]
+    again = queue.lease("w2", KINDS, lease_s=60)[0]  # reaps w1's lease first
+    assert again.id == stale.id and again.owner == "w2" and again.attempts == 2
+    assert _row(queue, again)["lease_owner"] == "w2"
+
+
+def test_stale_holder_cannot_touch_a_reassigned_task(queue):
+    stale = queue.lease("w1", KINDS, lease_s=-1)[0]
+    current = queue.lease("w2", KINDS, lease_s=60)[0]
+    assert not queue.extend(stale, 60)
+    assert not queue.complete(stale)
+    assert queue.fail(stale, "boom") == "lost"
+    row = _row(queue, current)
+    assert row["state"] == "leased" and row["lease_owner"] == "w2" and row["last_error"] == "lease expired"
+    assert queue.complete(current)
+
+
+def test_holder_loses_the_lease_once_it_is_reaped(queue):
+    stale = queue.lease("w1", KINDS, lease_s=-1, limit=1)[0]
+    queue.lease("w2", ["step6"], lease_s=60)  # reaps expired capture leases only for its kinds
+    assert _row(queue, stale)["state"] == "leased"
+    queue.lease("w2", KINDS, lease_s=60, limit=0)
+    assert _row(queue, stale)["state"] == "queued"
+    assert not queue.complete(stale)
+
+
+def test_expiring_on_the_last_attempt_dead_letters(queue):
+    queue.lease("w1", KINDS, lease_s=-1, limit=1)
+    queue.lease("w2", KINDS, lease_s=-1, limit=1)  # second and last attempt of the same task
+    queue.lease("w3", KINDS, lease_s=60, limit=0)
+    dead = queue.dead_letters("run1")
+    assert [(d["key"], d["attempts"], d["last_error"]) for d in dead] == [("https://a.example", 2, "lease expired")]
+
+
+# ----------------------
+# Failures, retries and dead letters
+# ----------------------
+def test_fail_retries_then_dead_letters(queue):
+    task = queue.lease("w1", KINDS, lease_s=60)[0]
+    assert queue.fail(task, "timeout") == "retry"
+    assert _row(queue, task)["state"] == "queued"
+
+    task = queue.lease("w1", KINDS, lease_s=60)[0]
+    assert task.attempts == 2
+    assert queue.fail(task, "timeout again") == "dead"
+    assert queue.dead_letters() == [{"run_id": "run1", "kind": "capture", "key": "https://a.example",
+                                     "attempts": 2, "last_error": "timeout again"}]
+    assert queue.lease("w1", KINDS, lease_s=60) == []
+
+
+def test_failed_task_waits_for_its_backoff(tmp_path):
+    q = SQLiteWorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=3, backoff_s=3600.0)
+    q.enqueue("run1", "capture", ["https://a.example"])
+    assert q.fail(q.lease("w1", KINDS, lease_s=60)[0], "timeout") == "retry"
+    assert q.lease("w1", KINDS, lease_s=60) == []
+    assert q.stats() == {"capture": {"queued": 1}}
+
+
+def test_requeue_dead_resets_attempts(queue):
+    for _ in range(2):
+        queue.fail(queue.lease("w1", KINDS, lease_s=60)[0], "boom")
+    assert queue.requeue_dead("run1") == 1
+    task = queue.lease("w1", KINDS, lease_s=60)[0]
+    assert task.key == "https://a.example" and task.attempts == 1
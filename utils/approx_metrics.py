@@ -0,0 +1,240 @@
+# File: grid_parser_project/utils/approx_metrics.py
+# Purpose: Sampled (approximate) layout metrics with confidence intervals for very large pages
+
+import math
+from collections import Counter
+from statistics import NormalDist
+import numpy as np
+
+
+# ----------------------
+# Sampling
+# ----------------------
+def stratified_order(n_total, strata=16, seed=0):
+    """
+    Random visiting order of `n_total` component indices whose every prefix is a stratified
+    sample: the DOM order is cut into `strata` equal blocks and the order takes one component
+    from each block in turn, so header/body/footer regions are all represented and growing the
+    sample only adds components. Deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    k = max(min(strata, n_total), 1)
+    edges = np.linspace(0, n_total, k + 1).astype(np.int64)
+    sizes = np.diff(edges)
+    # One row per block, shuffled independently; shorter blocks are padded and the padding dropped
+    perm = rng.permuted(np.tile(np.arange(sizes.max(initial=0)), (k, 1)), axis=1)
+    keep = perm < sizes[:, None]
+    return (perm + edges[:-1, None]).T[keep.T]
+
+
+def _fpc(n, N):
+    """Finite population correction for sampling without replacement."""
+    return (N - n) / (N - 1) if N > 1 else 0.0
+
+
+# ----------------------
+# Estimators: each returns (estimate, (low, high), per-unit variance or None)
+# ----------------------
+def proportion_estimate(hits, n, N, z):
+    """
+    Share with a Wilson score interval over the effective sample size n / fpc. Unlike
+    p +- z*se it keeps its coverage for rare or near-certain events (a handful of exact
+    hits on a fine grid).
+    """
+    p = hits / n
+    pa = (hits + 0.5) / (n + 1)  # keeps the variance > 0 when the sample is all hits / all misses
+    var1 = pa * (1 - pa)
+    fpc = _fpc(n, N)
+    if fpc <= 0:
+        return p, (p, p), var1
+    n_eff = n / fpc
+    denom = 1 + z ** 2 / n_eff
+    center = (p + z ** 2 / (2 * n_eff)) / denom
+    hw = z * math.sqrt(p * (1 - p) / n_eff + z ** 2 / (4 * n_eff ** 2)) / denom
+    return p, (max(center - hw, 0.0), min(center + hw, 1.0)), var1
+
+
+def entropy_estimate(tag_counts, N, z):
+    """Plug-in Shannon entropy of lower-cased tags with a delta-method interval."""
+    lower = {}
+    for tag, k in tag_counts.items():
+        lower[tag.lower()] = lower.get(tag.lower(), 0) + k
+    counts = np.array(list(lower.values()), dtype=np.float64)
+    n = counts.sum()
+    p = counts / n
+    logp = np.log2(p)
+    h = float(-(p * logp).sum())
+    var1 = max(float((p * logp ** 2).sum()) - h ** 2, 0.0)
+    hw = z * math.sqrt(var1 / n * _fpc(n, N))
+    return h, (max(h - hw, 0.0), h + hw), var1
+
+
+def tag_variety_estimate(tag_counts, N, z):
+    """Distinct tags / total, with the distinct count extrapolated by bias-corrected Chao1."""
+    counts = np.array(list(tag_counts.values()), dtype=np.int64)
+    d = len(counts)
+    if counts.sum() >= N:
+        return d / N, (d / N, d / N), None
+    f1, f2 = int((counts == 1).sum()), int((counts == 2).sum())
+    est = d + f1 * (f1 - 1) / (2 * (f2 + 1))
+    if f2:
+        r = f1 / f2
+        var = f2 * (0.5 * r ** 2 + r ** 3 + 0.25 * r ** 4)
+    else:
+        var = f1 * (f1 - 1) / 2 + f1 * (2 * f1 - 1) ** 2 / 4 - f1 ** 4 / (4 * est) if est else 0.0
+    value, hw = min(est, N) / N, z * math.sqrt(max(var, 0.0)) / N
+    return value, (max(value - hw, d / N), value + hw), None  # never below the distinct tags seen
+
+
+def area_ratio_estimate(areas, N, screen_area, z):
+    """compression_ratio = N * mean(bbox area) / screen area."""
+    n = len(areas)
+    scale = N / screen_area
+    sd = float(np.std(areas, ddof=1)) if n > 1 else 0.0
+    value, hw = float(np.mean(areas)) * scale, z * sd * math.sqrt(_fpc(n, N) / n) * scale
+    return value, (max(value - hw, 0.0), value + hw), None
+
+
+class _Sample:
+    """Columns of the components sampled so far; grows in place as the sample is extended."""
+
+    def __init__(self):
+        self.comps = []
+        self.cols = {k: np.empty(0, dtype=np.int64) for k in ("X", "Y", "Row", "Col", "Area")}
+        self.tag_counts = Counter()
+
+    def extend(self, new):
+        self.comps += new
+        n = len(new)
+        fresh = {
+            "X": (c["X"] for c in new), "Y": (c["Y"] for c in new),
+            "Row": (c.get("Grid_Row", 0) for c in new), "Col": (c.get("Grid_Col", 0) for c in new),
+            "Area": (c["Width"] * c["Height"] for c in new),
+        }
+        for k, values in fresh.items():
+            self.cols[k] = np.concatenate([self.cols[k], np.fromiter(values, dtype=np.int64, count=n)])
+        self.tag_counts.update(c["Tag"] for c in new)
+
+
+def _estimate(sample, N, grids, z, screen_w, screen_h):
+    x, y, ar, ac = (sample.cols[k] for k in ("X", "Y", "Row", "Col"))
+    n = len(sample.comps)
+    est = {
+        "entropy": entropy_estimate(sample.tag_counts, N, z),
+        "tag_variety": tag_variety_estimate(sample.tag_counts, N, z),
+        "compression_ratio": area_ratio_estimate(sample.cols["Area"].astype(np.float64), N, screen_w * screen_h, z),
+    }
+    for rows, cols in grids:
+        dr = np.abs(ar - y // (screen_h // rows))
+        dc = np.abs(ac - x // (screen_w // cols))
+        est[("grid_consistency", rows, cols)] = proportion_estimate(int(((dr == 0) & (dc == 0)).sum()), n, N, z)
+        est[("hit_rate", rows, cols)] = proportion_estimate(int(((dr <= 1) & (dc <= 1)).sum()), n, N, z)
+    return est
+
+
+# Metrics whose interval must meet the tolerance (compression_ratio is unbounded, so only reported)
+TOLERANCE_METRICS = ("entropy", "tag_variety", "grid_consistency", "hit_rate")
+
+
+def _name(key):
+    return key[0] if isinstance(key, tuple) else key
+
+
+def approximate_page_metrics(components, grids=((8, 8),), tolerance=0.01, entropy_tolerance=0.01,
+                             confidence=0.95, min_sample=2000, max_fraction=0.25, strata=16, seed=0,
+                             screen_w=1920, screen_h=1080):
+    """
+    Estimate entropy, tag variety, compression ratio and per-grid consistency/hit rate from a
+    stratified sample. The sample (a prefix of stratified_order) grows until every interval
+    half-width is within `tolerance` at `confidence` (entropy, which is not a rate: within
+    `entropy_tolerance` times the estimate); the next size comes from the observed per-unit
+    variances.
+
+    Sampling only pays off when it keeps a small share of the page: if the required sample
+    exceeds `max_fraction` of it, no estimates are made and the result asks for exact values
+    ("approximate" False, empty "metrics" and "ci", "sample" is the whole page).
+
+    Returns {"approximate", "sample_size", "population", "confidence", "tolerance",
+             "metrics": {key: value}, "ci": {key: (low, high)}, "sample": [components]},
+    where grid-dependent keys are (name, rows, cols).
+    """
+    N = len(components)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    limit = int(N * max_fraction)
+    n = min(N, min_sample)
+    if tolerance <= 0 or n > limit:
+        return _exact(components, confidence, tolerance)
+
+    order = stratified_order(N, strata, seed)
+    sample = _Sample()
+    while True:
+        sample.extend([components[i] for i in order[len(sample.comps):n]])
+        est = _estimate(sample, N, grids, z, screen_w, screen_h)
+        needed = n
+        met = True
+        for key, (value, (low, high), var1) in est.items():
+            if _name(key) not in TOLERANCE_METRICS:
+                continue
+            hw = (high - low) / 2
+            tol = entropy_tolerance * value if _name(key) == "entropy" else tolerance
+            if hw <= tol:
+                continue
+            met = False
+            if var1 is not None and tol > 0:
+                n0 = z ** 2 * var1 / tol ** 2
+                needed = max(needed, math.ceil(n0 / (1 + (n0 - 1) / N)))
+        if met:
+            break
+        n = max(needed, int(n * 1.5))
+        if n > limit:
+            return _exact(components, confidence, tolerance)
+
+    return {
+        "approximate": True,
+        "sample_size": n,
+        "population": N,
+        "confidence": confidence,
+        "tolerance": tolerance,
+        "metrics": {k: v[0] for k, v in est.items()},
+        "ci": {k: v[1] for k, v in est.items()},
+        "sample": sample.comps,
+    }
+
+
+def _exact(components, confidence, tolerance):
+    """Result of approximate_page_metrics when the page should be evaluated exactly."""
+    return {
+        "approximate": False,
+        "sample_size": len(components),
+        "population": len(components),
+        "confidence": confidence,
+        "tolerance": tolerance,
+        "metrics": {},
+        "ci": {},
+        "sample": components,
+    }
+
+
+def pin_estimates(page, approx):
+    """Pin sampled estimates on a PageMetrics so dependents (variability, P_Score) use them."""
+    for key, value in approx["metrics"].items():
+        if isinstance(key, tuple):
+            page.set(key[0], value, key[1], key[2])
+        else:
+            page.set(key, value)
+
+
+def approx_summary(approx, rows=8, cols=8):
+    """Output fields marking a result as approximate, with the intervals for one grid size."""
+    ci = {}
+    for key, bounds in approx["ci"].items():
+        if not isinstance(key, tuple):
+            ci[key] = bounds
+        elif key[1:] == (rows, cols):
+            ci[key[0]] = bounds
+    return {
+        "approximate": approx["approximate"],
+        "sample_size": approx["sample_size"],
+        "confidence": approx["confidence"],
+        "ci": ci,
+    }
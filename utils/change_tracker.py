@@ -0,0 +1,184 @@
+# File: grid_parser_project/utils/change_tracker.py
+# Purpose: In-page change tracking (mutations, URL changes, dialogs) to judge whether an interaction had an effect
+
+from selenium.common.exceptions import WebDriverException
+
+# Injected once per page. Mutations on nodes that churn while the page is idle (carousels,
+# tickers) and inside ad containers / our own highlight overlays are counted as background.
+# Only small subtrees are learned as noise: never <html>, <head>, <body> or a container with
+# more than LEARN_MAX elements, since everything below a noise node counts as background.
+# Returns "existing" if this document already has the tracker, "installed" otherwise.
+_TRACKER_JS = r"""
+(function () {
+    if (window.__gpTracker) { return 'existing'; }
+    var LEARN_MAX = 50;
+    var IGNORE = 'iframe, ins.adsbygoogle, [id^="google_ads"], [id^="div-gpt-ad"], [data-google-query-id], [data-gp-overlay]';
+    var DIALOG = 'dialog[open], [role="dialog"], [role="alertdialog"], [aria-modal="true"]';
+    var t = { noise: new WeakSet(), learning: false, counts: null, startUrl: location.href,
+              start: performance.now(), lastRelevant: 0 };
+
+    function reset() {
+        t.counts = { added: 0, removed: 0, attributes: 0, text: 0, background: 0,
+                     dialogs: 0, urls: 0, popups: 0 };
+        t.startUrl = location.href;
+        t.start = performance.now();
+        t.lastRelevant = t.start;
+    }
+    function learnable(n) {
+        if (n && n.nodeType !== 1) { n = n.parentNode; }
+        if (!n || n.nodeType !== 1) { return null; }
+        if (n === document.documentElement || n === document.body || n === document.head) { return null; }
+        return n.getElementsByTagName('*').length <= LEARN_MAX ? n : null;
+    }
+    function learn(r) {
+        var n = learnable(r.target);
+        if (n) { t.noise.add(n); }
+        for (var i = 0; r.type === 'childList' && i < r.addedNodes.length; i++) {
+            n = learnable(r.addedNodes[i]);
+            if (n && r.addedNodes[i].nodeType === 1) { t.noise.add(n); }
+        }
+    }
+    function ignored(node) {
+        for (var n = node; n; n = n.parentNode) {
+            if (t.noise.has(n)) { return true; }
+            if (n.nodeType === 1 && n.matches(IGNORE)) { return true; }
+        }
+        return false;
+    }
+    function relevantNodes(list) {
+        var k = 0;
+        for (var i = 0; i < list.length; i++) {
+            var n = list[i];
+            if (n.nodeType === 1 && n.matches(IGNORE)) { continue; }
+            k++;
+            if (n.nodeType === 1 && (n.matches(DIALOG) || n.querySelector(DIALOG))) { t.counts.dialogs++; }
+        }
+        return k;
+    }
+
+    new MutationObserver(function (records) {
+        for (var i = 0; i < records.length; i++) {
+            var r = records[i];
+            if (t.learning) { learn(r); continue; }
+            if (ignored(r.target)) { t.counts.background++; continue; }
+            var before = t.counts.added + t.counts.removed + t.counts.attributes + t.counts.text;
+            if (r.type === 'childList') {
+                t.counts.added += relevantNodes(r.addedNodes);
+                t.counts.removed += relevantNodes(r.removedNodes);
+            } else if (r.type === 'attributes') {
+                t.counts.attributes++;
+                if (r.target.matches(DIALOG)) { t.counts.dialogs++; }
+            } else {
+                t.counts.text++;
+            }
+            if (t.counts.added + t.counts.removed + t.counts.attributes + t.counts.text > before) {
+                t.lastRelevant = performance.now();
+            }
+        }
+    }).observe(document.documentElement, {
+        subtree: true, childList: true, characterData: true, attributes: true,
+        attributeFilter: ['class', 'style', 'hidden', 'open', 'aria-hidden', 'aria-expanded',
+                          'aria-selected', 'src', 'href', 'value', 'checked', 'disabled']
+    });
+
+    // URL changes without a page load (SPA routing)
+    ['pushState', 'replaceState'].forEach(function (name) {
+        var orig = history[name];
+        history[name] = function () { t.counts.urls++; return orig.apply(this, arguments); };
+    });
+    window.addEventListener('popstate', function () { t.counts.urls++; });
+    window.addEventListener('hashchange', function () { t.counts.urls++; });
+
+    // Native dialogs / popups are recorded and answered without blocking the session
+    window.alert = function () { t.counts.dialogs++; };
+    window.confirm = function () { t.counts.dialogs++; return false; };
+    window.prompt = function () { t.counts.dialogs++; return null; };
+    window.open = function () { t.counts.popups++; return null; };
+
+    t.learn = function (ms) { t.learning = true; setTimeout(function () { t.learning = false; }, ms); };
+    // The element about to be clicked and its ancestors are never noise for this interaction
+    t.begin = function (target) {
+        reset();
+        for (var n = target; n; n = n.parentNode) { t.noise.delete(n); }
+    };
+    t.summary = function () {
+        var c = t.counts, dom = c.added + c.removed + c.attributes + c.text;
+        var urlChanged = location.href !== t.startUrl || c.urls > 0;
+        return {
+            effect: urlChanged ? 'url' : c.dialogs ? 'dialog' : c.popups ? 'popup' : dom ? 'dom' : null,
+            url_changed: urlChanged, url: location.href,
+            added: c.added, removed: c.removed, attributes: c.attributes, text: c.text,
+            dialogs: c.dialogs, popups: c.popups, background: c.background,
+            ms: Math.round(performance.now() - t.start)
+        };
+    };
+    reset();
+    window.__gpTracker = t;
+    return 'installed';
+})();
+"""
+
+# Resolves once no relevant mutation happened for `quiet` ms (or after `timeout` ms)
+_WAIT_JS = r"""
+var timeout = arguments[0], quiet = arguments[1], done = arguments[arguments.length - 1];
+var t = window.__gpTracker;
+if (!t) { done(null); return; }
+var start = performance.now();
+(function poll() {
+    var now = performance.now();
+    if (now - t.lastRelevant >= quiet || now - start >= timeout) { done(t.summary()); }
+    else { setTimeout(poll, 50); }
+})();
+"""
+
+
+class ChangeTracker:
+    """
+    Per-page effect tracker for step 6 interactions.
+
+    install() injects the observer once per page load and, only for a new document, learns
+    which small subtrees churn on their own while the page is idle (calling it again on the
+    same document, e.g. after a DOM snapshot restore, is cheap); begin(target) opens an
+    interaction window with `target` and its ancestors excluded from the noise; end() waits for the DOM
+    to settle and returns a compact summary:
+        {"effect": "url" | "dialog" | "popup" | "dom" | "navigation" | None, "url_changed",
+         "url", "added", "removed", "attributes", "text", "dialogs", "popups", "background", "ms"}
+    A full page load discards the injected script; end() reports it as "navigation".
+    """
+
+    def __init__(self, driver, timeout_ms=2000, quiet_ms=500, learn_ms=1000):
+        self.driver = driver
+        self.timeout_ms = timeout_ms
+        self.quiet_ms = quiet_ms
+        self.learn_ms = learn_ms
+
+    def install(self):
+        self.driver.set_script_timeout(self.timeout_ms / 1000 + 5)
+        if self.driver.execute_script("return " + _TRACKER_JS.strip()) == "installed":
+            self.driver.execute_async_script(
+                "var done = arguments[arguments.length - 1];"
+                "window.__gpTracker.learn(arguments[0]); setTimeout(done, arguments[0]);", self.learn_ms)
+        self._url = self.driver.current_url
+
+    def begin(self, target=None):
+        """Open an interaction window; `target` is the element about to be clicked (if known)."""
+        try:
+            if not self.driver.execute_script(
+                    "if (!window.__gpTracker) { return false; } window.__gpTracker.begin(arguments[0]); return true;",
+                    target):
+                self.install()
+                self.driver.execute_script("window.__gpTracker.begin(arguments[0]);", target)
+        except WebDriverException:
+            self.install()
+        self._url = self.driver.current_url
+
+    def end(self, timeout_ms=None, quiet_ms=None):
+        try:
+            summary = self.driver.execute_async_script(
+                _WAIT_JS, timeout_ms or self.timeout_ms, quiet_ms or self.quiet_ms)
+        except WebDriverException:
+            summary = None  # document unloaded while waiting
+        if summary is None:
+            url = self.driver.current_url
+            summary = {"effect": "navigation", "url_changed": url != self._url, "url": url}
+        return summary
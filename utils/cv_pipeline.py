@@ -0,0 +1,268 @@
+# File: grid_parser_project/utils/cv_pipeline.py
+# Purpose: In-memory OpenCV preprocessing pipeline (grayscale -> blur -> threshold -> contours -> boxes -> candidates)
+
+import os, time
+import cv2
+import numpy as np
+
+
+# ----------------------
+# Stage operations
+# ----------------------
+# Each op reads what it needs from the shared `state` dict and returns its own output.
+# The runner stores that output under the stage name, so later stages can refer to it.
+
+def _op_grayscale(state, src="image"):
+    return cv2.cvtColor(state[src], cv2.COLOR_BGR2GRAY)
+
+def _op_blur(state, src="gray", ksize=(5, 5), sigma=0):
+    return cv2.GaussianBlur(state[src], tuple(ksize), sigma)
+
+def _op_adaptive_threshold(state, src="blur", block_size=11, c=2):
+    return cv2.adaptiveThreshold(state[src], 255,
+                                 cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY_INV, block_size, c)
+
+def _op_contours(state, src="thresh"):
+    contours, _ = cv2.findContours(state[src], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+def _op_boxes(state, src="contours"):
+    return boxes_from_contours(state[src])
+
+def _op_candidates(state, src="boxes", min_w=8, min_h=8, max_area_frac=0.9,
+                   min_aspect=0.05, max_aspect=20.0, iou_thresh=0.5, contain_thresh=0.9, merge="union"):
+    img_h, img_w = state["image"].shape[:2]
+    boxes = filter_boxes(state[src], img_w, img_h, min_w, min_h, max_area_frac, min_aspect, max_aspect)
+    if merge == "nms":
+        return nms_boxes(boxes, iou_thresh)
+    if merge == "union":
+        return merge_overlapping_boxes(boxes, iou_thresh, contain_thresh)
+    return boxes
+
+
+# ----------------------
+# Vectorized candidate-box helpers (boxes are int arrays of shape (N, 4): x, y, w, h)
+# ----------------------
+def boxes_from_contours(contours):
+    """Bounding rects of all contours at once (same result as cv2.boundingRect per contour)."""
+    if len(contours) == 0:
+        return np.empty((0, 4), dtype=np.int32)
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.int64, count=len(contours))
+    pts = np.concatenate(contours).reshape(-1, 2)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    x1 = np.minimum.reduceat(pts[:, 0], starts)
+    y1 = np.minimum.reduceat(pts[:, 1], starts)
+    x2 = np.maximum.reduceat(pts[:, 0], starts)
+    y2 = np.maximum.reduceat(pts[:, 1], starts)
+    return np.stack([x1, y1, x2 - x1 + 1, y2 - y1 + 1], axis=1).astype(np.int32)
+
+def filter_boxes(boxes, img_w, img_h, min_w=8, min_h=8, max_area_frac=0.9, min_aspect=0.05, max_aspect=20.0):
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    w, h = boxes[:, 2], boxes[:, 3]
+    aspect = w / np.maximum(h, 1)
+    keep = ((w >= min_w) & (h >= min_h) &
+            (w * h <= max_area_frac * img_w * img_h) &
+            (aspect >= min_aspect) & (aspect <= max_aspect))
+    return boxes[keep]
+
+def _overlap_pairs(xyxy, iou_thresh, contain_thresh, chunk=1024, max_cells=4_000_000):
+    """
+    Index pairs (i, j) of boxes that overlap enough to be merged.
+    Boxes are swept along one axis and compared chunk-wise only against boxes that can still
+    intersect on that axis; chunks shrink when wide boxes extend that reach, so the pairwise
+    block never exceeds `max_cells` entries, even for tens of thousands of boxes.
+    """
+    n = len(xyxy)
+    # Sweep along the axis where boxes are most spread out (y for tall full-page shots)
+    spread_x = np.ptp(xyxy[:, 0]) / max(np.mean(xyxy[:, 2] - xyxy[:, 0]), 1)
+    spread_y = np.ptp(xyxy[:, 1]) / max(np.mean(xyxy[:, 3] - xyxy[:, 1]), 1)
+    if spread_y > spread_x:
+        xyxy = xyxy[:, [1, 0, 3, 2]]
+    order = np.argsort(xyxy[:, 0], kind="stable")
+    b = xyxy[order]
+    areas = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    pairs_a, pairs_b = [], []
+
+    start = 0
+    while start < n:
+        stop = min(start + chunk, n)
+        reach = np.searchsorted(b[:, 0], b[start:stop, 2].max(), side="left")
+        while stop - start > 1 and (stop - start) * (max(reach, stop) - start) > max_cells:
+            stop = start + (stop - start) // 2
+            reach = np.searchsorted(b[:, 0], b[start:stop, 2].max(), side="left")
+        cand = np.arange(start, max(reach, stop))
+        ci = b[start:stop, None, :]
+        cj = b[None, cand, :]
+        iw = np.minimum(ci[..., 2], cj[..., 2]) - np.maximum(ci[..., 0], cj[..., 0])
+        ih = np.minimum(ci[..., 3], cj[..., 3]) - np.maximum(ci[..., 1], cj[..., 1])
+        inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+        ai = areas[start:stop, None]
+        aj = areas[None, cand]
+        iou = inter / np.maximum(ai + aj - inter, 1e-9)
+        contain = inter / np.maximum(np.minimum(ai, aj), 1e-9)
+        hit = (inter > 0) & ((iou >= iou_thresh) | (contain >= contain_thresh))
+        hit &= cand[None, :] > np.arange(start, stop)[:, None]  # each pair once, no self-pairs
+        ii, jj = np.nonzero(hit)
+        pairs_a.append(order[ii + start])
+        pairs_b.append(order[cand[jj]])
+        start = stop
+
+    if not pairs_a:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+def _connected_labels(n, a, b):
+    """Union-find over index pairs using vectorised min-label propagation with pointer jumping."""
+    labels = np.arange(n)
+    if len(a) == 0:
+        return labels
+    while True:
+        m = np.minimum(labels[a], labels[b])
+        new = labels.copy()
+        np.minimum.at(new, a, m)
+        np.minimum.at(new, b, m)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+def merge_overlapping_boxes(boxes, iou_thresh=0.5, contain_thresh=0.9):
+    """Replace every cluster of overlapping boxes by its union rectangle."""
+    boxes = np.asarray(boxes).reshape(-1, 4).astype(np.int64)
+    if len(boxes) < 2:
+        return boxes.astype(np.int32)
+    xyxy = np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+    a, b = _overlap_pairs(xyxy, iou_thresh, contain_thresh)
+    labels = _connected_labels(len(boxes), a, b)
+
+    uniq, inv = np.unique(labels, return_inverse=True)
+    merged = np.empty((len(uniq), 4), dtype=np.int64)
+    merged[:, :2] = np.iinfo(np.int64).max
+    merged[:, 2:] = np.iinfo(np.int64).min
+    np.minimum.at(merged[:, 0], inv, xyxy[:, 0])
+    np.minimum.at(merged[:, 1], inv, xyxy[:, 1])
+    np.maximum.at(merged[:, 2], inv, xyxy[:, 2])
+    np.maximum.at(merged[:, 3], inv, xyxy[:, 3])
+    merged[:, 2:] -= merged[:, :2]
+    return merged.astype(np.int32)
+
+def nms_boxes(boxes, iou_thresh=0.5):
+    """Greedy non-maximum suppression, larger boxes first (contours carry no confidence)."""
+    boxes = np.asarray(boxes).reshape(-1, 4).astype(np.int64)
+    if len(boxes) < 2:
+        return boxes.astype(np.int32)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.argsort(-areas, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou < iou_thresh]
+    return boxes[np.sort(keep)].astype(np.int32)
+
+def boxes_to_components(boxes, source="opencv"):
+    """Emit candidate boxes in the same schema as the DOM-extracted UI components."""
+    return [
+        {
+            "Tag": "cv_box",
+            "Text": "N/A",
+            "Role": "",
+            "AriaLabel": "",
+            "Class": "",
+            "InnerHTML": "",
+            "X": int(x),
+            "Y": int(y),
+            "Width": int(w),
+            "Height": int(h),
+            "Source": source
+        }
+        for x, y, w, h in np.asarray(boxes).reshape(-1, 4).tolist()
+    ]
+
+
+STAGE_OPS = {
+    "grayscale": _op_grayscale,
+    "blur": _op_blur,
+    "adaptive_threshold": _op_adaptive_threshold,
+    "contours": _op_contours,
+    "boxes": _op_boxes,
+    "candidates": _op_candidates,
+}
+
+# Default declarative pipeline. Names are also the prefixes of the debug PNGs,
+# which keeps the old gray_/blur_/thresh_ artifacts when debugging is switched on.
+DEFAULT_CV_STAGES = [
+    {"name": "gray", "op": "grayscale"},
+    {"name": "blur", "op": "blur", "params": {"ksize": (5, 5)}},
+    {"name": "thresh", "op": "adaptive_threshold", "params": {"block_size": 11, "c": 2}},
+    {"name": "contours", "op": "contours"},
+    {"name": "boxes", "op": "boxes"},
+    {"name": "candidates", "op": "candidates",
+     "params": {"min_w": 8, "min_h": 8, "max_area_frac": 0.9, "iou_thresh": 0.5, "merge": "union"}},
+]
+
+
+# ----------------------
+# Debug artifacts
+# ----------------------
+def draw_boxes(img, boxes, color=(0, 255, 0), thickness=2):
+    out = img.copy()
+    for x, y, w, h in np.asarray(boxes, dtype=np.int64).reshape(-1, 4):
+        cv2.rectangle(out, (int(x), int(y)), (int(x + w), int(y + h)), color, thickness)
+    return out
+
+def _debug_image(name, state):
+    value = state[name]
+    if isinstance(value, np.ndarray) and value.dtype == np.uint8:
+        return value
+    # Non-image stages (contours, boxes) are visualised as rectangles on the input image
+    boxes = value if isinstance(value, np.ndarray) else _op_boxes(state, src=name)
+    return draw_boxes(state["image"], boxes)
+
+def _write_debug(name, state, debug_dir, debug_name, debug_paths):
+    out_path = debug_paths.get(name) or os.path.join(debug_dir, f"{name}_{debug_name}")
+    cv2.imwrite(out_path, _debug_image(name, state))
+    return out_path
+
+
+# ----------------------
+# Pipeline runner
+# ----------------------
+def run_cv_pipeline(img, stages=None, debug_stages=(), debug_dir=None, debug_name="image.png",
+                    debug_paths=None, print_timings=False):
+    """
+    Run the preprocessing stages on an in-memory BGR image.
+
+    Nothing is written to disk unless a stage name is listed in `debug_stages`.
+    `debug_paths` can override the output path of individual stages.
+    Returns the state dict with every stage output plus per-stage `timings` (seconds).
+    """
+    stages = DEFAULT_CV_STAGES if stages is None else stages
+    debug_stages = set(debug_stages or ())
+    debug_paths = debug_paths or {}
+    state = {"image": img, "timings": {}, "artifacts": {}}
+
+    for stage in stages:
+        name = stage["name"]
+        op = STAGE_OPS[stage.get("op", name)]
+        t0 = time.perf_counter()
+        state[name] = op(state, **stage.get("params", {}))
+        state["timings"][name] = time.perf_counter() - t0
+
+        if name in debug_stages and (debug_dir or name in debug_paths):
+            state["artifacts"][name] = _write_debug(name, state, debug_dir, debug_name, debug_paths)
+
+    if print_timings:
+        total = sum(state["timings"].values())
+        per_stage = ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in state["timings"].items())
+        print(f"[CV] {debug_name}: {per_stage} (total {total * 1000:.1f}ms)")
+
+    return state
@@ -1,12 +1,41 @@
+import threading
 import undetected_chromedriver as uc
+from utils.instrumentation import instrument_driver
 
-def setup_selenium_driver(headless=True):
+# undetected_chromedriver patches its chromedriver binary on start-up; concurrent starts
+# (step 6 workers, parallel pipeline branches) must not race on it
+_START_LOCK = threading.Lock()
+
+def setup_selenium_driver(headless=True, record_network=False, proxy_server=None):
     options = uc.ChromeOptions()
     if headless:
         options.add_argument("--headless=new")
     options.add_argument("--window-size=1920,1080")
     options.add_argument("--disable-blink-features=AutomationControlled")
+    if record_network:
+        # Network.* events in driver.get_log("performance") (page archive recording)
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if proxy_server:
+        # Page archive replay: everything goes through the local proxy over plain HTTP
+        options.add_argument(f"--proxy-server=http://{proxy_server}")
+        options.add_argument("--proxy-bypass-list=<-loopback>")
+        options.add_argument("--disable-features=HttpsUpgrades")
 
     # ✅ Pin the version to match your installed Chrome (135)
-    driver = uc.Chrome(version_main=135, options=options)
-    return driver
+    with _START_LOCK:
+        driver = uc.Chrome(version_main=135, options=options)
+    return instrument_driver(driver)
+
+
+def emulate_viewport(driver, width, height, mobile=False):
+    """Re-lay out the loaded page at width x height (CSS px, scale 1 so screenshots match component coordinates)."""
+    driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+        "width": width, "height": height, "deviceScaleFactor": 1, "mobile": mobile,
+        "screenWidth": width, "screenHeight": height})
+    driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {"enabled": mobile})
+    driver.execute_script("window.scrollTo(0, 0);")
+
+
+def clear_viewport_emulation(driver):
+    driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+    driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {"enabled": False})
@@ -0,0 +1,100 @@
+# File: grid_parser_project/utils/element_resolver.py
+# Purpose: Resolve step 1 components to live, clickable DOM elements in one script call
+
+# For every candidate (page coordinates from the JSON): elements carrying all of its class
+# tokens, nearest to the recorded centre; else the clickable element at that point (scrolling
+# there in-page), or the element there itself if it is about the component's size; else a
+# clickable element with the same text. Every match is within maxDist. Scroll is restored.
+_RESOLVE_JS = r"""
+var cands = arguments[0], maxDist = arguments[1];
+var CLICKABLE = 'button, a[href], input, select, textarea, summary, [role="button"], [role="link"], [onclick], [tabindex]';
+var sx = window.scrollX, sy = window.scrollY;
+var vw = window.innerWidth, vh = window.innerHeight;
+
+function usable(el) {
+    if (!el || el.disabled || el.closest('[data-gp-overlay]')) { return false; }
+    var r = el.getBoundingClientRect();
+    if (r.width === 0 || r.height === 0) { return false; }
+    var st = getComputedStyle(el);
+    return st.visibility !== 'hidden' && st.display !== 'none' && st.pointerEvents !== 'none';
+}
+function dist(el, cx, cy) {
+    var r = el.getBoundingClientRect();
+    return Math.hypot(r.left + r.width / 2 + window.scrollX - cx, r.top + r.height / 2 + window.scrollY - cy);
+}
+function fits(el, c) {
+    // A non-clickable element at the point stands for the component only if it is about as big
+    // (not the page container or section the component sat in)
+    var r = el.getBoundingClientRect();
+    return r.width <= 2 * c.w + 20 && r.height <= 2 * c.h + 20;
+}
+function nearest(list, cx, cy) {
+    var best = null, bestD = Infinity;
+    for (var i = 0; i < list.length; i++) {
+        if (!usable(list[i])) { continue; }
+        var d = dist(list[i], cx, cy);
+        if (d < bestD) { best = list[i]; bestD = d; }
+    }
+    return best && bestD <= maxDist ? [best, bestD] : null;
+}
+
+var byText = null;
+var out = [];
+for (var i = 0; i < cands.length; i++) {
+    var c = cands[i], hit = null, method = null;
+    if (c.cls) {
+        hit = nearest(document.getElementsByClassName(c.cls), c.cx, c.cy);
+        method = 'class';
+    }
+    if (!hit) {
+        window.scrollTo(Math.max(0, c.cx - vw / 2), Math.max(0, c.cy - vh / 2));
+        var el = document.elementFromPoint(c.cx - window.scrollX, c.cy - window.scrollY);
+        var target = el && el.closest(CLICKABLE);
+        if (!target && el && fits(el, c)) { target = el; }
+        if (usable(target)) {
+            var d = dist(target, c.cx, c.cy);
+            if (d <= maxDist) { hit = [target, d]; method = 'point'; }
+        }
+    }
+    if (!hit && c.text) {
+        if (byText === null) {
+            byText = {};
+            document.querySelectorAll(CLICKABLE).forEach(function (e) {
+                var k = (e.innerText || e.value || '').trim().toLowerCase();
+                if (k) { (byText[k] = byText[k] || []).push(e); }
+            });
+        }
+        hit = nearest(byText[c.text] || [], c.cx, c.cy);
+        method = 'text';
+    }
+    out.push(hit ? { element: hit[0], method: method, distance: Math.round(hit[1]) } : null);
+}
+window.scrollTo(sx, sy);
+return out;
+"""
+
+
+def _candidate(comp):
+    text = str(comp.get("Text", "") or "").strip().lower()
+    return {
+        "cx": comp["X"] + comp["Width"] / 2,
+        "cy": comp["Y"] + comp["Height"] / 2,
+        "w": comp["Width"],
+        "h": comp["Height"],
+        "cls": " ".join(str(comp.get("Class", "") or "").split()),
+        "text": "" if text == "n/a" else text,
+    }
+
+
+def resolve_components(driver, comps, max_distance=150, batch_size=500):
+    """
+    Map components to live elements with one execute_script per `batch_size` components.
+
+    Returns one entry per component: {"element": WebElement, "method": "class" | "point" | "text",
+    "distance": px between the element centre and the recorded centre} or None if not found.
+    """
+    results = []
+    for start in range(0, len(comps), batch_size):
+        batch = [_candidate(c) for c in comps[start:start + batch_size]]
+        results += driver.execute_script(_RESOLVE_JS, batch, max_distance)
+    return results
@@ -0,0 +1,180 @@
+# File: grid_parser_project/utils/grid_optimizer.py
+# Purpose: Per-domain search for the grid shape (rectangular / non-uniform) that best fits the layout
+
+import os, json
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+import numpy as np
+from utils.metric_registry import page_viewport
+
+SCREEN_W, SCREEN_H = 1920, 1080
+
+
+# ----------------------
+# Candidate grids
+# ----------------------
+def uniform_index(values, n, extent):
+    """Cell index on a uniform n-way split of `extent` (same as map_ui_to_grid; rows below the fold continue)."""
+    return values // (extent // n)
+
+def quantile_bounds(values, n, extent):
+    """Inner boundaries of a non-uniform n-way split with equal component counts per band."""
+    inside = np.clip(values, 0, extent)
+    return np.unique(np.quantile(inside, np.linspace(0, 1, n + 1)[1:-1]))
+
+def quantile_index(values, bounds):
+    return np.searchsorted(bounds, values, side="right")
+
+
+def _band_index(order, sorted_values, bounds):
+    """quantile_index for all values at once, from their sort order (one O(N) pass per split)."""
+    cuts = np.searchsorted(sorted_values, bounds, side="left")
+    counts = np.diff(np.concatenate([[0], cuts, [len(order)]]))
+    idx = np.empty(len(order), dtype=np.int64)
+    idx[order] = np.repeat(np.arange(len(counts)), counts)
+    return idx
+
+
+def _containment(start, length, sizes, extent, family):
+    """
+    Per split size: float32[len(sizes), N] whether each component's span [start, start + length)
+    lies in one band, the same for a span of that length placed at random (chance), and the
+    quantile bounds.
+    """
+    length = np.maximum(length, 1)
+    end = start + length - 1
+    inside = np.empty((len(sizes), len(start)), dtype=np.float32)
+    chance = np.empty_like(inside)
+    bounds = {}
+    if family != "uniform":
+        start_order, end_order = np.argsort(start, kind="stable"), np.argsort(end, kind="stable")
+        start_sorted, end_sorted = start[start_order], end[end_order]
+        clipped = np.clip(start_sorted, 0, extent)  # what quantile_bounds splits, already sorted
+    for i, n in enumerate(sizes):
+        if family == "uniform":
+            band = np.full(len(start), float(extent // n))
+            inside[i] = uniform_index(start, n, extent) == uniform_index(end, n, extent)
+        else:
+            # Same bounds as quantile_bounds (linear interpolation), without re-sorting per size
+            pos = np.linspace(0, 1, n + 1)[1:-1] * (len(clipped) - 1)
+            lo = np.floor(pos).astype(np.int64)
+            hi = np.minimum(lo + 1, len(clipped) - 1)
+            bounds[n] = np.unique(clipped[lo] + (pos - lo) * (clipped[hi] - clipped[lo]))
+            idx = _band_index(start_order, start_sorted, bounds[n])
+            edges = np.concatenate([[0], bounds[n], [np.inf]])
+            band = edges[idx + 1] - edges[idx]  # the last band runs on down the page
+            inside[i] = idx == _band_index(end_order, end_sorted, bounds[n])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fits = np.where(np.isinf(band), 1.0, (band - length + 1) / band)
+        chance[i] = np.clip(np.nan_to_num(fits), 0, 1)
+    return inside, chance, bounds
+
+
+# ----------------------
+# Search
+# ----------------------
+def search_best_grid(comps, row_range=range(2, 65), col_range=range(2, 65), families=("uniform", "quantile"),
+                     screen_w=SCREEN_W, screen_h=SCREEN_H, chunk=65_536):
+    """
+    Find (family, rows, cols) maximizing the layout alignment: the share of components lying
+    wholly inside one cell minus the share expected if components of the same sizes were placed
+    at random. A grid scores when its lines run through the gutters of the layout; coarse grids
+    (everything fits by chance) and very fine ones (nothing fits) both score about 0.
+
+    P_Score's only grid-dependent term, hit_rate, compares step 2's 8x8 Grid_Row/Grid_Col with
+    the candidate grid, so it peaks at 8x8 by construction and is not used here.
+
+    Rows and columns are independent given a component, so all (rows, cols) pairs of a family
+    come from two matrix products over the per-size row and column conditions. Ties go to the
+    grid with fewer cells.
+    """
+    x = np.array([c["X"] for c in comps], dtype=np.int64)
+    y = np.array([c["Y"] for c in comps], dtype=np.int64)
+    w = np.array([c["Width"] for c in comps], dtype=np.int64)
+    h = np.array([c["Height"] for c in comps], dtype=np.int64)
+    rows, cols = list(row_range), list(col_range)
+    cells = np.outer(rows, cols)
+    total = max(len(comps), 1)
+
+    best = None
+    for family in families:
+        row_in, row_chance, row_bounds = _containment(y, h, rows, screen_h, family)
+        col_in, col_chance, col_bounds = _containment(x, w, cols, screen_w, family)
+        contained = np.zeros((len(rows), len(cols)))
+        expected = np.zeros((len(rows), len(cols)))
+        for k in range(0, len(comps), chunk):
+            part = slice(k, k + chunk)
+            contained += row_in[:, part] @ col_in[:, part].T
+            expected += row_chance[:, part] @ col_chance[:, part].T
+        # Rounded so float noise does not decide ties (those go to fewer cells)
+        gain = np.round((contained - expected) / total, 9)
+        i, j = min(zip(*np.nonzero(gain == gain.max())), key=lambda ij: cells[ij])
+        cand = {
+            "alignment": float(gain[i, j]), "contained": float(contained[i, j] / total),
+            "cells": int(cells[i, j]), "family": family, "rows": rows[i], "cols": cols[j],
+            "row_bounds": row_bounds.get(rows[i]), "col_bounds": col_bounds.get(cols[j]),
+        }
+        if best is None or (cand["alignment"], -cand["cells"]) > (best["alignment"], -best["cells"]):
+            best = cand
+    best["evaluated"] = len(families) * len(rows) * len(cols)
+    return best
+
+
+def optimize_page(json_path, **search_kwargs):
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    comps = data.get("UI Components", [])
+    if not comps:
+        return None
+
+    viewport, screen_w, screen_h = page_viewport(data, SCREEN_W, SCREEN_H)
+    best = search_best_grid(comps, screen_w=screen_w, screen_h=screen_h, **search_kwargs)
+    baseline = search_best_grid(comps, row_range=[8], col_range=[8], families=("uniform",),
+                                screen_w=screen_w, screen_h=screen_h)
+
+    def bounds(b, n, extent):
+        if b is None:
+            return [int(k * (extent // n)) for k in range(n + 1)]
+        return [0] + [float(v) for v in b] + [extent]
+
+    return {
+        "URL": data["URL"],
+        "Domain": urlparse(data["URL"]).netloc.replace("www.", "").replace(".", "_"),
+        "JSON_File": os.path.basename(json_path),
+        "Viewport": viewport,
+        "Best_Grid": {
+            "Type": best["family"],
+            "Rows": best["rows"],
+            "Cols": best["cols"],
+            "Grid_Size": f"{best['rows']}x{best['cols']}",
+            "Row_Bounds": bounds(best["row_bounds"], best["rows"], screen_h),
+            "Col_Bounds": bounds(best["col_bounds"], best["cols"], screen_w),
+            "Alignment": best["alignment"],
+            "Contained": best["contained"],
+        },
+        "Baseline_8x8_Alignment": baseline["alignment"],
+        "Candidates_Evaluated": best["evaluated"],
+        "Num_Components": len(comps),
+    }
+
+
+def _optimize_task(args):
+    json_path, out_dir, search_kwargs = args
+    result = optimize_page(json_path, **search_kwargs)
+    if result is not None:
+        with open(os.path.join(out_dir, result["JSON_File"]), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+    return result
+
+
+def optimize_grids(json_dir, out_dir, workers=None, **search_kwargs):
+    """Search the best grid for every domain JSON in `json_dir`; one result JSON per domain in `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(os.path.join(json_dir, f), out_dir, search_kwargs)
+             for f in sorted(os.listdir(json_dir)) if f.endswith(".json")]
+    if len(tasks) > 8 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_optimize_task, tasks, chunksize=4))
+    else:
+        results = [_optimize_task(t) for t in tasks]
+    return [r for r in results if r is not None]
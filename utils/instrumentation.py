@@ -0,0 +1,224 @@
+# File: grid_parser_project/utils/instrumentation.py
+# Purpose: Per step / domain / sub-stage timing, CPU, peak RSS and hot-path counters; JSON + Prometheus export
+
+import os, sys, json, time, threading, contextvars, collections
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource  # POSIX
+except ImportError:
+    resource = None
+try:
+    import psutil  # optional; used for peak RSS where `resource` is missing (Windows)
+except ImportError:
+    psutil = None
+
+_STEP = contextvars.ContextVar("step", default="")
+_DOMAIN = contextvars.ContextVar("domain", default="")
+_STAGE = contextvars.ContextVar("stage", default="")
+
+_LOCK = threading.Lock()
+_ROWS = {}  # (step, domain, stage) -> {"calls", "wall_s", "cpu_s", "peak_rss_bytes", "counters"}
+_RUN = {"started": datetime.utcnow().isoformat(), "t0": time.perf_counter(), "cpu0": time.process_time()}
+enabled = True
+
+
+def peak_rss_bytes():
+    """Process high-water RSS so far (None if it cannot be read on this platform)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+
+def _row(key):
+    row = _ROWS.get(key)
+    if row is None:
+        row = _ROWS[key] = {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_bytes": None,
+                            "counters": collections.Counter()}
+    return row
+
+
+@contextmanager
+def span(step=None, domain=None, stage=None):
+    """
+    Time a block under (step, domain, stage). Arguments left as None are inherited from the
+    enclosing span, so `span(stage="ocr")` inside step3's per-domain span records
+    (step3, <domain>, ocr). Times are inclusive; CPU time is that of the calling thread
+    (child processes such as tesseract are only in the run totals).
+    """
+    tokens = [(var, var.set(value)) for var, value in ((_STEP, step), (_DOMAIN, domain), (_STAGE, stage))
+              if value is not None]
+    key = (_STEP.get(), _DOMAIN.get(), _STAGE.get())
+    t0, c0 = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - t0, time.thread_time() - c0
+        for var, token in reversed(tokens):
+            var.reset(token)
+        if enabled:
+            rss = peak_rss_bytes()
+            with _LOCK:
+                row = _row(key)
+                row["calls"] += 1
+                row["wall_s"] += wall
+                row["cpu_s"] += cpu
+                if rss is not None:
+                    row["peak_rss_bytes"] = max(row["peak_rss_bytes"] or 0, rss)
+
+
+def count(name, n=1):
+    """Add to a hot-path counter (webdriver_commands, ocr_calls, image_decodes) of the current span."""
+    if not enabled:
+        return
+    key = (_STEP.get(), _DOMAIN.get(), _STAGE.get())
+    with _LOCK:
+        _row(key)["counters"][name] += n
+
+
+def instrument_driver(driver):
+    """Count every WebDriver command (find, click, execute_script, CDP, ...) sent by `driver`."""
+    execute = driver.execute
+
+    def counted(driver_command, params=None):
+        count("webdriver_commands")
+        return execute(driver_command, params)
+
+    driver.execute = counted
+    return driver
+
+
+def run_in_context(fn):
+    """Bind `fn` to a copy of the current step/domain context (for thread pools)."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# ----------------------
+# Opt-in sampling profiler
+# ----------------------
+@contextmanager
+def sampling_profiler(name, out_dir, interval_ms=5):
+    """
+    Sample the calling thread's stack every `interval_ms` and write `<name>.folded`
+    (collapsed stacks, one "frame;frame;... count" per line) for flame graph tools.
+    """
+    target = threading.get_ident()
+    stacks = collections.Counter()
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(interval_ms / 1000):
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                stacks[";".join(reversed(stack))] += 1
+
+    sampler = threading.Thread(target=sample, name=f"sampler-{name}", daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        sampler.join()
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"{name}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        print(f"[PROFILE] {name}: {sum(stacks.values())} samples -> {path}")
+
+
+# ----------------------
+# Export
+# ----------------------
+def snapshot():
+    """Rows sorted by wall time plus process-level run totals."""
+    with _LOCK:
+        rows = [{"step": k[0], "domain": k[1], "stage": k[2], "calls": r["calls"],
+                 "wall_s": round(r["wall_s"], 4), "cpu_s": round(r["cpu_s"], 4),
+                 "peak_rss_bytes": r["peak_rss_bytes"], "counters": dict(r["counters"])}
+                for k, r in _ROWS.items()]
+    rows.sort(key=lambda r: -r["wall_s"])
+    children_cpu = 0.0
+    if resource is not None:
+        ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+        children_cpu = ru.ru_utime + ru.ru_stime
+    return {
+        "started": _RUN["started"],
+        "finished": datetime.utcnow().isoformat(),
+        "wall_s": round(time.perf_counter() - _RUN["t0"], 4),
+        "cpu_s": round(time.process_time() - _RUN["cpu0"], 4),
+        "children_cpu_s": round(children_cpu, 4),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "rows": rows,
+    }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _prometheus(report):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP grid_parser_{name} {help_text}")
+        lines.append(f"# TYPE grid_parser_{name} {kind}")
+        for labels, value in samples:
+            text = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            lines.append(f"grid_parser_{name}{{{text}}} {value}")
+
+    def labels(r):
+        return {"step": r["step"], "domain": r["domain"], "stage": r["stage"]}
+
+    rows = report["rows"]
+    metric("stage_wall_seconds", "gauge", "Wall time per step, domain and sub-stage (inclusive).",
+           [(labels(r), r["wall_s"]) for r in rows])
+    metric("stage_cpu_seconds", "gauge", "Thread CPU time per step, domain and sub-stage.",
+           [(labels(r), r["cpu_s"]) for r in rows])
+    metric("stage_calls", "gauge", "Times the span was entered.",
+           [(labels(r), r["calls"]) for r in rows])
+    metric("stage_peak_rss_bytes", "gauge", "Process peak RSS when the span last ended.",
+           [(labels(r), r["peak_rss_bytes"]) for r in rows if r["peak_rss_bytes"] is not None])
+    for name in sorted({c for r in rows for c in r["counters"]}):
+        metric(f"{name}_total", "counter", f"{name.replace('_', ' ').capitalize()} per span.",
+               [(labels(r), r["counters"][name]) for r in rows if name in r["counters"]])
+    metric("run_wall_seconds", "gauge", "Wall time of the whole run.", [({}, report["wall_s"])])
+    metric("run_cpu_seconds", "gauge", "Process CPU time of the whole run (children separate).",
+           [({"scope": "self"}, report["cpu_s"]), ({"scope": "children"}, report["children_cpu_s"])])
+    return "\n".join(lines) + "\n"
+
+
+def write_report(report_dir, textfile=None):
+    """Write `run_<timestamp>.json` to `report_dir` and, if given, a Prometheus textfile (atomically)."""
+    report = snapshot()
+    os.makedirs(report_dir, exist_ok=True)
+    json_path = os.path.join(report_dir, f"run_{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if textfile:
+        os.makedirs(os.path.dirname(textfile) or ".", exist_ok=True)
+        with open(textfile + ".tmp", "w", encoding="utf-8") as f:
+            f.write(_prometheus(report))
+        os.replace(textfile + ".tmp", textfile)  # node_exporter must never read a partial file
+    return json_path
+
+
+def print_top(report=None, n=10):
+    """Print the `n` most expensive (step, domain, stage) rows."""
+    report = report or snapshot()
+    print(f"\n[PERF] Top {n} spans by wall time (run {report['wall_s']:.1f}s, CPU {report['cpu_s']:.1f}s)")
+    for r in report["rows"][:n]:
+        where = "/".join(p for p in (r["step"], r["domain"], r["stage"]) if p) or "(unlabelled)"
+        extra = ", ".join(f"{k}={v}" for k, v in r["counters"].items())
+        print(f"  {where:<50} {r['wall_s']:9.2f}s wall {r['cpu_s']:8.2f}s cpu" + (f"  {extra}" if extra else ""))
@@ -0,0 +1,141 @@
+# File: grid_parser_project/utils/interaction_log.py
+# Purpose: Append-only, crash-resumable step 6 interaction log (JSON Lines + incremental summary CSV)
+
+import os, csv, json, time
+from datetime import datetime
+
+# Columns of <domain>_summary.csv, in log_interaction order
+SUMMARY_FIELDS = [
+    "interaction_type", "target_text", "ocr_text", "method", "coordinates", "class", "role", "tag",
+    "width", "height", "success", "error", "effect", "reset", "timestamp", "key",
+]
+
+
+def interaction_key(kind, comp):
+    """Resume cursor key of a component: interaction kind + rounded centre (step 6 dedups by centre)."""
+    return f"{kind}:{round(comp['X'] + comp['Width'] / 2)}:{round(comp['Y'] + comp['Height'] / 2)}"
+
+
+def _csv_row(entry):
+    return {k: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+            for k, v in entry.items() if k in SUMMARY_FIELDS}
+
+
+def read_jsonl(path):
+    """Entries of a JSONL log; a torn last line (crash mid-write) is ignored."""
+    entries = []
+    if not os.path.isfile(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return entries
+
+
+class InteractionLog:
+    """
+    Per-domain interaction log written as it happens.
+
+    Entries are appended to `<domain>_interactions.jsonl` (and `<domain>_summary.csv`) and
+    flushed every `flush_every` entries or `flush_interval_s` seconds. All entries of one
+    component are written together under its key, so after a crash `done(key)` tells a
+    restarted run which components to skip. close() writes `<domain>_interactions.complete`;
+    a log with that marker belongs to a finished run and is started afresh, so only an
+    interrupted log is resumed. close() also writes the legacy `<domain>_interactions.json`
+    array for downstream readers.
+    """
+
+    def __init__(self, log_dir, domain, resume=True, flush_every=10, flush_interval_s=5.0, on_flush=None):
+        self.jsonl_path = os.path.join(log_dir, f"{domain}_interactions.jsonl")
+        self.json_path = os.path.join(log_dir, f"{domain}_interactions.json")
+        self.csv_path = os.path.join(log_dir, f"{domain}_summary.csv")
+        self.marker_path = self.completion_marker(log_dir, domain)
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self.on_flush = on_flush
+
+        previous = read_jsonl(self.jsonl_path) if resume and self.resumable(log_dir, domain) else []
+        if os.path.isfile(self.marker_path):
+            os.remove(self.marker_path)  # this run is in progress until close()
+        self.done_keys = {e.get("key") for e in previous}
+        self.count = len(previous)
+        self.resumed = len(previous)
+
+        # Rewrite both files from the valid entries (drops a torn tail; CSV always matches JSONL),
+        # via temp files so a crash here cannot lose the previous log
+        for path, fill in ((self.jsonl_path, self._fill_jsonl), (self.csv_path, self._fill_csv)):
+            with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+                fill(f, previous)
+            os.replace(path + ".tmp", path)
+        self._jsonl = open(self.jsonl_path, "a", encoding="utf-8")
+        self._csv_file = open(self.csv_path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=SUMMARY_FIELDS)
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def completion_marker(log_dir, domain):
+        return os.path.join(log_dir, f"{domain}_interactions.complete")
+
+    @classmethod
+    def resumable(cls, log_dir, domain):
+        """True if an earlier run of `domain` was interrupted (log present, no completion marker)."""
+        return (os.path.isfile(os.path.join(log_dir, f"{domain}_interactions.jsonl"))
+                and not os.path.isfile(cls.completion_marker(log_dir, domain)))
+
+    @staticmethod
+    def _fill_jsonl(f, entries):
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def _fill_csv(f, entries):
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for entry in entries:
+            writer.writerow(_csv_row(entry))
+
+    def done(self, key):
+        return key in self.done_keys
+
+    def _write(self, entry):
+        self._jsonl.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._csv.writerow(_csv_row(entry))
+
+    def extend(self, key, entries):
+        """
+        Append all entries for one component and mark it done. A component without entries
+        (nothing was attempted) is not marked: a restarted run only knows the written entries,
+        so done() must give the same answer before and after a restart.
+        """
+        if not entries:
+            return
+        for entry in entries:
+            entry["key"] = key
+            self._write(entry)
+        self.done_keys.add(key)
+        self.count += len(entries)
+        self._pending += len(entries)
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval_s:
+            self.flush()
+
+    def flush(self):
+        self._jsonl.flush()
+        self._csv_file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        if self.on_flush:
+            self.on_flush()
+
+    def close(self):
+        self.flush()
+        for f in (self._jsonl, self._csv_file):
+            os.fsync(f.fileno())
+            f.close()
+        with open(self.json_path, "w", encoding="utf-8") as logf:
+            json.dump(read_jsonl(self.jsonl_path), logf, indent=4, ensure_ascii=False)
+        with open(self.marker_path, "w", encoding="utf-8") as f:
+            f.write(datetime.utcnow().isoformat())
@@ -0,0 +1,138 @@
+# File: grid_parser_project/utils/interaction_planner.py
+# Purpose: Rank step 6 click candidates by expected success, learned from earlier interaction logs
+
+import os, json, math, glob
+from utils.interaction_log import read_jsonl
+
+SCREEN_W, SCREEN_H = 1920, 1080
+GRID = 8
+
+
+# ----------------------
+# Features (same for JSON components and logged interactions)
+# ----------------------
+def _size_bucket(w, h):
+    area = max(float(w) * float(h), 1.0)
+    return str(min(int(math.log2(area)) // 2, 12))  # powers of 4 px^2
+
+def features(tag, role, cls, w, h, cx, cy):
+    # Grid cell: the 1920x1080 viewport split 8x8, continued down the page (capped at 4 screens)
+    cell = f"{min(int(cy // (SCREEN_H // GRID)), 4 * GRID)}:{min(int(cx // (SCREEN_W // GRID)), GRID - 1)}"
+    return {
+        "tag": (tag or "").lower(),
+        "role": (role or "").lower(),
+        "size": _size_bucket(w, h),
+        "cell": cell,
+        "class": sorted(set((cls or "").lower().split()))[:20],
+    }
+
+def component_features(comp):
+    return features(comp.get("Tag"), comp.get("Role"), comp.get("Class"), comp.get("Width", 0),
+                    comp.get("Height", 0), comp["X"] + comp["Width"] / 2, comp["Y"] + comp["Height"] / 2)
+
+def entry_features(entry):
+    cx, cy = (entry.get("coordinates") or [0, 0])[:2]
+    return features(entry.get("tag"), entry.get("role"), entry.get("class"), entry.get("width", 0),
+                    entry.get("height", 0), cx, cy)
+
+
+def load_history(log_dirs):
+    """All logged click attempts from `*_interactions.json` (or the .jsonl stream if that is all there is)."""
+    entries = []
+    for log_dir in log_dirs:
+        if not os.path.isdir(log_dir):
+            continue
+        for path in glob.glob(os.path.join(log_dir, "*_interactions.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries += json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+        for path in glob.glob(os.path.join(log_dir, "*_interactions.jsonl")):
+            if not os.path.isfile(path[:-1]):
+                entries += read_jsonl(path)
+    return [e for e in entries if e.get("interaction_type") == "click"]
+
+
+# ----------------------
+# Model
+# ----------------------
+def _logit(p):
+    return math.log(p / (1 - p))
+
+
+class InteractionPlanner:
+    """
+    Smoothed success rates per feature value (tag, role, size bucket, grid cell, class
+    token), combined naive-Bayes style: score = sigmoid(logit(p0) + sum_f (logit(rate_f) - logit(p0))).
+    Class tokens share one term (their mean). Unseen values fall back to the global rate p0,
+    so with no history every candidate scores p0 and document order is kept.
+    """
+
+    def __init__(self, prior_strength=5.0):
+        self.prior_strength = prior_strength
+        self.p0 = 0.5
+        self.stats = {}  # (feature, value) -> [successes, attempts]
+        self.n = 0
+
+    def fit(self, entries):
+        succ = 0
+        for e in entries:
+            ok = bool(e.get("success"))
+            succ += ok
+            for name, value in entry_features(e).items():
+                for v in (value if isinstance(value, list) else [value]):
+                    s = self.stats.setdefault((name, v), [0, 0])
+                    s[0] += ok
+                    s[1] += 1
+        self.n = len(entries)
+        self.p0 = (succ + 1) / (self.n + 2)
+        return self
+
+    @classmethod
+    def from_logs(cls, log_dirs, **kwargs):
+        return cls(**kwargs).fit(load_history(log_dirs))
+
+    def _rate(self, name, value):
+        s, n = self.stats.get((name, value), (0, 0))
+        a = self.prior_strength
+        return (s + a * self.p0) / (n + a)
+
+    def score(self, comp):
+        base = _logit(self.p0)
+        z = base
+        for name, value in component_features(comp).items():
+            if isinstance(value, list):
+                if value:
+                    z += sum(_logit(self._rate(name, v)) - base for v in value) / len(value)
+            else:
+                z += _logit(self._rate(name, value)) - base
+        return 1 / (1 + math.exp(-max(-50.0, min(50.0, z))))
+
+    def plan(self, comps, max_clicks=None):
+        """Candidates in descending score order (stable for ties), cut to `max_clicks`."""
+        ranked = sorted(((self.score(c), k, c) for k, c in enumerate(comps)), key=lambda t: (-t[0], t[1]))
+        ranked = ranked[:max_clicks] if max_clicks else ranked
+        return [(score, comp) for score, _, comp in ranked]
+
+
+def coverage_report(outcomes, n_candidates):
+    """
+    outcomes: per attempt in plan order, True if the click had an effect.
+    Returns attempts, successes, candidate coverage and the cumulative yield at 10/25/50/100%
+    of the attempts made.
+    """
+    attempts = len(outcomes)
+    successes = sum(outcomes)
+    curve = {}
+    for frac in (0.1, 0.25, 0.5, 1.0):
+        k = max(1, round(attempts * frac)) if attempts else 0
+        curve[f"{int(frac * 100)}%"] = sum(outcomes[:k])
+    return {
+        "candidates": n_candidates,
+        "attempts": attempts,
+        "successes": successes,
+        "coverage": attempts / n_candidates if n_candidates else 0.0,
+        "yield": successes / attempts if attempts else 0.0,
+        "successes_by_attempt_share": curve,
+    }
@@ -0,0 +1,133 @@
+# File: grid_parser_project/utils/interaction_store.py
+# Purpose: Interaction screenshots as one keyframe per page + changed-region patches per interaction
+
+import os, json
+import cv2
+import numpy as np
+from utils.instrumentation import count
+
+
+def _decode_png(png_bytes):
+    count("image_decodes")
+    return cv2.imdecode(np.frombuffer(png_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def changed_regions(base, frame, tile=32, tol=0):
+    """
+    Rectangles (x, y, w, h) covering every pixel that differs from `base` by more than `tol`.
+    The difference is evaluated per tile and neighbouring changed tiles are merged, so a
+    handful of rectangles describes a typical hover/dropdown/toast change.
+    """
+    if base.shape != frame.shape:
+        h, w = frame.shape[:2]
+        return [(0, 0, w, h)]
+    h, w = frame.shape[:2]
+    mask = (cv2.absdiff(base, frame).max(axis=2) > tol)
+    if not mask.any():
+        return []
+
+    th, tw = -(-h // tile), -(-w // tile)
+    padded = np.zeros((th * tile, tw * tile), dtype=bool)
+    padded[:h, :w] = mask
+    tiles = padded.reshape(th, tile, tw, tile).any(axis=(1, 3)).astype(np.uint8)
+
+    n, _, stats, _ = cv2.connectedComponentsWithStats(tiles, connectivity=8)
+    rects = []
+    for tx, ty, tw_, th_, _ in stats[1:n]:
+        x, y = int(tx * tile), int(ty * tile)
+        rects.append((x, y, min(int(tw_ * tile), w - x), min(int(th_ * tile), h - y)))
+    return rects
+
+
+class InteractionShotStore:
+    """
+    Per-page store of interaction screenshots.
+
+    mode="delta": the page's base state is saved once as `<domain>_keyframe.png`; every later
+    frame is stored as PNG patches of the regions that differ from it, listed in
+    `<domain>_frames.json`. mode="full" keeps the old one-PNG-per-interaction behaviour.
+    """
+
+    def __init__(self, screenshot_dir, domain, mode="delta", tile=32, tol=0):
+        self.screenshot_dir = screenshot_dir
+        self.domain = domain
+        self.mode = mode
+        self.tile = tile
+        self.tol = tol
+        self.keyframe = None
+        self.patch_dir = os.path.join(screenshot_dir, f"{domain}_patches")
+        self.manifest_path = os.path.join(screenshot_dir, f"{domain}_frames.json")
+        self.manifest = {"domain": domain, "keyframe": None, "frames": {}}
+
+    # --- writing ---
+    def set_keyframe(self, png_bytes):
+        if self.mode != "delta":
+            return
+        path = os.path.join(self.screenshot_dir, f"{self.domain}_keyframe.png")
+        with open(path, "wb") as f:
+            f.write(png_bytes)
+        self.keyframe = _decode_png(png_bytes)
+        self.manifest["keyframe"] = os.path.basename(path)
+
+    def reopen(self):
+        """Continue an interrupted run: keep the stored keyframe and frames. False if there are none."""
+        if self.mode != "delta" or not os.path.isfile(self.manifest_path):
+            return False
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.keyframe = cv2.imread(os.path.join(self.screenshot_dir, self.manifest["keyframe"]))
+        return self.keyframe is not None
+
+    def add_frame(self, name, png_bytes):
+        """Store one interaction screenshot; returns the path(s) written."""
+        if self.mode != "delta" or self.keyframe is None:
+            path = os.path.join(self.screenshot_dir, f"{self.domain}_{name}.png")
+            with open(path, "wb") as f:
+                f.write(png_bytes)
+            return [path]
+
+        frame = _decode_png(png_bytes)
+        os.makedirs(self.patch_dir, exist_ok=True)
+        patches, written = [], []
+        for k, (x, y, w, h) in enumerate(changed_regions(self.keyframe, frame, self.tile, self.tol)):
+            patch_name = f"{name}_{k}.png"
+            patch_path = os.path.join(self.patch_dir, patch_name)
+            cv2.imwrite(patch_path, frame[y:y + h, x:x + w], [cv2.IMWRITE_PNG_COMPRESSION, 6])
+            patches.append({"x": x, "y": y, "w": w, "h": h, "patch": patch_name})
+            written.append(patch_path)
+        self.manifest["frames"][name] = {"size": [frame.shape[1], frame.shape[0]], "patches": patches}
+        return written
+
+    def close(self):
+        if self.mode == "delta" and self.manifest["keyframe"]:
+            with open(self.manifest_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, indent=4)
+
+    # --- reading ---
+    @classmethod
+    def load(cls, screenshot_dir, domain):
+        store = cls(screenshot_dir, domain)
+        with open(store.manifest_path, "r", encoding="utf-8") as f:
+            store.manifest = json.load(f)
+        store.keyframe = cv2.imread(os.path.join(screenshot_dir, store.manifest["keyframe"]))
+        return store
+
+    def frame_names(self):
+        return list(self.manifest["frames"])
+
+    def reconstruct(self, name):
+        """Full BGR frame for an interaction: keyframe with that interaction's patches applied."""
+        entry = self.manifest["frames"][name]
+        w, h = entry["size"]
+        frame = self.keyframe.copy()
+        if frame.shape[:2] != (h, w):
+            frame = np.zeros((h, w, 3), dtype=np.uint8)
+        for p in entry["patches"]:
+            patch = cv2.imread(os.path.join(self.patch_dir, p["patch"]))
+            frame[p["y"]:p["y"] + p["h"], p["x"]:p["x"] + p["w"]] = patch
+        return frame
+
+    def export(self, name, output_path=None):
+        output_path = output_path or os.path.join(self.screenshot_dir, f"{self.domain}_{name}.png")
+        cv2.imwrite(output_path, self.reconstruct(name))
+        return output_path
@@ -0,0 +1,423 @@
+# File: grid_parser_project/utils/metric_registry.py
+# Purpose: Pluggable layout-metric registry with dependency resolution and per-page memoization
+
+import os, json
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import pandas as pd
+from utils.instrumentation import count, run_in_context
+
+# name -> {"fn", "inputs", "depends", "grid", "expensive", "columnar"} (+ "weights" for weighted scores)
+METRICS = {}
+
+# Default P_Score weighting (alpha..epsilon of the thesis formula), in formula order
+P_SCORE_WEIGHTS = {
+    "hit_rate": 0.3,
+    "sparsity": 0.2,           # 1 - density
+    "entropy": 0.2,
+    "compression_ratio": 0.15,
+    "cr_file": 0.15,
+}
+
+# Per-page layout metrics reported by steps 4 (evaluation table) and 1 (online), in order
+LAYOUT_METRICS = [
+    "grid_consistency", "hit_rate", "density", "variability", "tag_variety",
+    "compression_ratio", "entropy", "cr_file", "png_size", "jpg_size", "P_Score"
+]
+
+
+def register_metric(name, inputs=(), depends=(), expensive=False, columnar=False):
+    """
+    Register a metric function `fn(page, grid, deps) -> value`.
+
+    inputs: raw inputs the metric reads ("components", "grid", "screenshot").
+    depends: other metric names; their values are passed in `deps`.
+    A metric is grid-dependent if it reads "grid" or depends on a grid-dependent metric;
+    everything else is computed once per page. `expensive` results are also kept in the
+    optional persistent cache, keyed by screenshot file and mtime.
+
+    columnar=True registers `fn(frame, grid, deps) -> one value per page` over a
+    ComponentFrame instead (`deps` then hold one value per page as well). Columnar metrics
+    serve both PageMetrics (a one-page frame) and the all-pages metrics engine; an
+    expensive columnar metric reads and fills `frame.cache` itself.
+    """
+    def deco(fn):
+        grid = "grid" in inputs or any(METRICS[d]["grid"] for d in depends)
+        METRICS[name] = {"fn": fn, "inputs": tuple(inputs), "depends": tuple(depends),
+                         "grid": grid, "expensive": expensive, "columnar": columnar}
+        return fn
+    return deco
+
+
+def register_weighted_score(name, weights):
+    """Register a score as a weighted sum of other metrics (None counts as 0)."""
+    weights = dict(weights)
+
+    def score(frame, grid, deps):
+        total = np.zeros(len(frame.pages))
+        for key, w in weights.items():
+            total = total + w * np.array([v if v else 0 for v in deps[key]], dtype=np.float64)
+        return total
+
+    register_metric(name, depends=tuple(weights), columnar=True)(score)
+    METRICS[name]["weights"] = weights
+    return score
+
+
+def metric_closure(names):
+    """`names` and every metric they depend on, dependencies first."""
+    order = []
+
+    def visit(name):
+        if name not in order:
+            for d in METRICS[name]["depends"]:
+                visit(d)
+            order.append(name)
+    for name in names:
+        visit(name)
+    return order
+
+
+# ----------------------
+# Columnar input
+# ----------------------
+def component_columns(components):
+    """The component fields columnar metrics read, as arrays (one page)."""
+    return {
+        "X": np.array([c["X"] for c in components], dtype=np.float64),
+        "Y": np.array([c["Y"] for c in components], dtype=np.float64),
+        "Area": np.array([c["Width"] * c["Height"] for c in components], dtype=np.float64),
+        "Grid_Row": np.array([c.get("Grid_Row", 0) for c in components], dtype=np.float64),
+        "Grid_Col": np.array([c.get("Grid_Col", 0) for c in components], dtype=np.float64),
+        "Tag": [c["Tag"] for c in components],
+    }
+
+
+def components_table(columns):
+    """One row per component of all pages, from their component_columns; `page` is the page's position."""
+    cat = lambda key: np.concatenate([c[key] for c in columns]) if columns else np.empty(0)
+    return pd.DataFrame({
+        "page": np.repeat(np.arange(len(columns)), [len(c["Tag"]) for c in columns]),
+        "X": cat("X"), "Y": cat("Y"), "Area": cat("Area"),
+        "Grid_Row": cat("Grid_Row"), "Grid_Col": cat("Grid_Col"),
+        "Tag": [t for c in columns for t in c["Tag"]],
+    })
+
+
+class ComponentFrame:
+    """
+    Input of columnar metrics. `pages` has one row per page (Screen_W, Screen_H, Num_Components,
+    Sample_Size, Screenshot_Path, Approx), `comps` one row per component (see components_table).
+    A sampled page (Sample_Size < Num_Components) has only its sample in `comps` and its
+    approx_metrics estimates in Approx; otherwise Approx is None.
+
+    Metrics registered per page are evaluated on each page's component dicts, so they need
+    `components` (one list per page; the sample on sampled pages).
+    """
+
+    def __init__(self, pages, comps, cache=None, io_workers=8, components=None):
+        self.pages = pages.reset_index(drop=True)
+        self.comps = comps
+        self.cache = cache  # optional persistent dict for expensive metrics
+        self.io_workers = io_workers
+        self.components = components
+        self._page_metrics = {}
+
+    def per_page(self, name, grid, deps):
+        """A per-page metric for every page, with its dependencies pinned from `deps`."""
+        if self.components is None:
+            raise ValueError(f"metric {name!r} is registered per page; load the frame with its components")
+        values = []
+        for i, row in enumerate(self.pages.itertuples(index=False)):
+            page = self._page_metrics.get(i)
+            if page is None:
+                page = PageMetrics({"UI Components": self.components[i]}, row.Screenshot_Path,
+                                   row.Screen_W, row.Screen_H, cache=self.cache)
+                self._page_metrics[i] = page
+            for d, v in deps.items():
+                page.set(d, _scalar(v[i]), *grid)
+            values.append(page.get(name, *grid))
+        return values
+
+
+# ----------------------
+# Per-page evaluation
+# ----------------------
+def page_viewport(data, default_w=1920, default_h=1080):
+    """(viewport label, width, height) recorded by step 1; JSON without them are Desktop at the default size."""
+    try:
+        w, h = (int(v) for v in str(data.get("Resolution", "")).lower().split("x"))
+    except ValueError:
+        w, h = default_w, default_h
+    return data.get("Viewport") or "Desktop", w, h
+
+
+def viewport_suffix(label):
+    """File name tag of a viewport's outputs: none for Desktop (the historical names), "_mobile" etc. otherwise."""
+    return "" if label == "Desktop" else f"_{label.lower()}"
+
+
+class PageMetrics:
+    """
+    Lazily computes requested metrics for one page; grid-independent values are memoized.
+    The screen defaults to the page's recorded resolution.
+    """
+
+    def __init__(self, data, screenshot_path=None, screen_w=None, screen_h=None, cache=None):
+        self.components = data.get("UI Components", [])
+        self.screenshot_path = screenshot_path
+        _, w, h = page_viewport(data)
+        self.screen_w, self.screen_h = screen_w or w, screen_h or h
+        self.cache = cache  # optional persistent dict for expensive metrics
+        self._memo = {}
+        self._frame = None
+
+    @property
+    def frame(self):
+        """This page as a one-page ComponentFrame, for the columnar metrics."""
+        if self._frame is None:
+            n = len(self.components)
+            pages = pd.DataFrame({
+                "Screen_W": [self.screen_w], "Screen_H": [self.screen_h],
+                "Num_Components": [n], "Sample_Size": [n],
+                "Screenshot_Path": [self.screenshot_path], "Approx": [None],
+            })
+            columns = [component_columns(self.components)]
+            self._frame = ComponentFrame(pages, components_table(columns), cache=self.cache)
+        return self._frame
+
+    def _cache_key(self, name):
+        return metric_cache_key(self.screenshot_path, name) if self.cache is not None else None
+
+    def get(self, name, rows=8, cols=8):
+        spec = METRICS[name]
+        key = (name, rows, cols) if spec["grid"] else (name,)
+        if key in self._memo:
+            return self._memo[key]
+
+        cache_key = self._cache_key(name) if spec["expensive"] and not spec["columnar"] else None
+        if cache_key is not None and cache_key in self.cache:
+            value = self.cache[cache_key]
+        else:
+            deps = {d: self.get(d, rows, cols) for d in spec["depends"]}
+            if spec["columnar"]:
+                value = _scalar(spec["fn"](self.frame, (rows, cols), {d: _one(v) for d, v in deps.items()})[0])
+            else:
+                value = spec["fn"](self, (rows, cols), deps)
+            if cache_key is not None:
+                self.cache[cache_key] = value
+        self._memo[key] = value
+        return value
+
+    def set(self, name, value, rows=8, cols=8):
+        """Pin a metric value (e.g. a sampled estimate); metrics computed later depend on it."""
+        key = (name, rows, cols) if METRICS[name]["grid"] else (name,)
+        self._memo[key] = value
+
+    def compute(self, names, rows=8, cols=8):
+        return {n: self.get(n, rows, cols) for n in names}
+
+
+def _one(value):
+    """A single page's value as the per-page sequence columnar metrics take."""
+    out = np.empty(1, dtype=object)
+    out[0] = value
+    return out
+
+
+def _scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# ----------------------
+# Persistent cache of expensive metrics
+# ----------------------
+def metric_cache_key(screenshot_path, name):
+    """Cache key of an expensive metric: screenshot path + mtime + metric; None without a screenshot."""
+    if not screenshot_path or not os.path.isfile(screenshot_path):
+        return None
+    return f"{os.path.abspath(screenshot_path)}|{os.path.getmtime(screenshot_path)}|{name}"
+
+
+def metric_cache_path(cache_dir, screenshot_dir):
+    """One cache file per screenshot directory, so parallel pipeline branches never share one."""
+    return os.path.join(cache_dir, os.path.basename(os.path.normpath(screenshot_dir)) + ".json")
+
+
+def load_metric_cache(path):
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}  # a broken cache only costs recomputation
+
+
+def save_metric_cache(cache, path):
+    """Write the cache, dropping entries of screenshots that were removed or re-captured since."""
+    live = {}
+    for key, value in cache.items():
+        shot, mtime, _ = key.rsplit("|", 2)
+        if os.path.isfile(shot) and str(os.path.getmtime(shot)) == mtime:
+            live[key] = value
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(live, f)
+    os.replace(tmp, path)
+
+
+# ----------------------
+# Built-in metrics (columnar: one vectorized pass over all pages of a frame)
+# ----------------------
+def jpeg_compression_ratio(png_path):
+    """CR_File = 1 - jpg/png bytes, with the JPEG (quality 85) encoded in memory."""
+    try:
+        img = cv2.imread(png_path)
+        count("image_decodes")
+        if img is None:
+            return None, None, None
+        ok, jpg = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+        if not ok:
+            return None, None, None
+        png_size = os.path.getsize(png_path)
+        jpg_size = int(jpg.size)
+        return (1 - (jpg_size / png_size) if png_size else 0), png_size, jpg_size
+    except Exception:
+        return None, None, None
+
+
+def _screen_area(frame):
+    return (frame.pages["Screen_W"] * frame.pages["Screen_H"]).to_numpy().astype(np.float64)
+
+
+def _tag_counts(frame, tags):
+    """(page x distinct tag) count matrix."""
+    n_pages = len(frame.pages)
+    codes, uniq = pd.factorize(tags)
+    n_tags = max(len(uniq), 1)
+    page = frame.comps["page"].to_numpy()
+    return np.bincount(page * n_tags + codes, minlength=n_pages * n_tags).reshape(n_pages, n_tags)
+
+
+@register_metric("total", inputs=("components",), columnar=True)
+def _total(frame, grid, deps):
+    return frame.pages["Num_Components"].to_numpy()
+
+@register_metric("density", depends=("total",), columnar=True)
+def _density(frame, grid, deps):
+    screen_area = _screen_area(frame)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(screen_area > 0, np.asarray(deps["total"], dtype=np.float64) / screen_area, 0.0)
+
+@register_metric("sparsity", depends=("density",), columnar=True)
+def _sparsity(frame, grid, deps):
+    return 1 - np.asarray(deps["density"], dtype=np.float64)
+
+@register_metric("entropy", inputs=("components",), columnar=True)
+def _entropy(frame, grid, deps):
+    # Shannon entropy over lower-cased tags (of the sample, on sampled pages)
+    counts = _tag_counts(frame, frame.comps["Tag"].str.lower())
+    n = frame.pages["Sample_Size"].to_numpy().astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = counts / n[:, None]
+        ent = -np.where(counts > 0, p * np.log2(p), 0.0).sum(axis=1)
+    return np.where(n > 0, ent, 0.0)
+
+@register_metric("variability", depends=("entropy",), columnar=True)
+def _variability(frame, grid, deps):
+    return np.asarray(deps["entropy"], dtype=np.float64)
+
+@register_metric("tag_variety", inputs=("components",), depends=("total",), columnar=True)
+def _tag_variety(frame, grid, deps):
+    total = np.asarray(deps["total"], dtype=np.float64)
+    distinct = (_tag_counts(frame, frame.comps["Tag"]) > 0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variety = np.where(total > 0, distinct / total, 0.0)
+    # Distinct tags do not scale with the sample; sampled pages use the Chao1 extrapolation
+    for i, est in enumerate(frame.pages["Approx"]):
+        if est is not None:
+            variety[i] = est["metrics"]["tag_variety"]
+    return variety
+
+@register_metric("compression_ratio", inputs=("components",), columnar=True)
+def _bbox_ratio(frame, grid, deps):
+    # Summed bbox area over the screen; a sample's sum is scaled up to the page
+    total = frame.pages["Num_Components"].to_numpy().astype(np.float64)
+    n = frame.pages["Sample_Size"].to_numpy().astype(np.float64)
+    area = np.bincount(frame.comps["page"].to_numpy(), weights=frame.comps["Area"].to_numpy(),
+                       minlength=len(frame.pages))
+    screen_area = _screen_area(frame)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(screen_area > 0, area / screen_area, 0.0)
+        return np.where(n < total, ratio * (total / n), ratio)
+
+@register_metric("file_compression", inputs=("screenshot",), expensive=True, columnar=True)
+def _file_compression(frame, grid, deps):
+    # One JPEG encode per screenshot, in threads since OpenCV releases the GIL; screenshots
+    # unchanged since they were cached in `frame.cache` are not encoded again
+    paths = list(frame.pages["Screenshot_Path"])
+    cache = frame.cache
+    keys = [metric_cache_key(p, "file_compression") if cache is not None else None for p in paths]
+    todo = sorted({p for p, k in zip(paths, keys) if p and (k is None or k not in cache)})
+    if len(todo) > 1:
+        with ThreadPoolExecutor(max_workers=frame.io_workers) as pool:
+            # Each encode runs in the caller's step/domain context, so its decode is counted there
+            futures = [pool.submit(run_in_context(jpeg_compression_ratio), p) for p in todo]
+            fresh = {p: f.result() for p, f in zip(todo, futures)}
+    else:
+        fresh = {p: jpeg_compression_ratio(p) for p in todo}
+    out = []
+    for p, k in zip(paths, keys):
+        if not p:
+            out.append([None, None, None])
+        elif p in fresh:
+            out.append(list(fresh[p]))
+            if k is not None:
+                cache[k] = out[-1]
+        else:
+            out.append(cache[k])
+    return out
+
+@register_metric("cr_file", depends=("file_compression",), columnar=True)
+def _cr_file(frame, grid, deps):
+    return [fc[0] for fc in deps["file_compression"]]
+
+@register_metric("png_size", depends=("file_compression",), columnar=True)
+def _png_size(frame, grid, deps):
+    return [fc[1] for fc in deps["file_compression"]]
+
+@register_metric("jpg_size", depends=("file_compression",), columnar=True)
+def _jpg_size(frame, grid, deps):
+    return [fc[2] for fc in deps["file_compression"]]
+
+@register_metric("grid_hits", inputs=("components", "grid"), columnar=True)
+def _grid_hits(frame, grid, deps):
+    # (exact, fuzzy) hits of step 2's assignment on a rows x cols grid over each page's screen
+    rows, cols = grid
+    n_pages = len(frame.pages)
+    page = frame.comps["page"].to_numpy()
+    cell_h = (frame.pages["Screen_H"].to_numpy() // rows)[page]
+    cell_w = (frame.pages["Screen_W"].to_numpy() // cols)[page]
+    dr = np.abs(frame.comps["Grid_Row"].to_numpy() - np.floor_divide(frame.comps["Y"].to_numpy(), cell_h))
+    dc = np.abs(frame.comps["Grid_Col"].to_numpy() - np.floor_divide(frame.comps["X"].to_numpy(), cell_w))
+    exact = np.bincount(page, weights=(dr == 0) & (dc == 0), minlength=n_pages).astype(np.int64)
+    fuzzy = np.bincount(page, weights=(dr <= 1) & (dc <= 1), minlength=n_pages).astype(np.int64)
+    return list(zip(exact.tolist(), fuzzy.tolist()))
+
+def _hit_share(frame, hits):
+    n = frame.pages["Sample_Size"].to_numpy().astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(n > 0, np.array(hits, dtype=np.float64) / n, 0.0)
+
+@register_metric("grid_consistency", depends=("grid_hits",), columnar=True)
+def _grid_consistency(frame, grid, deps):
+    return _hit_share(frame, [h[0] for h in deps["grid_hits"]])
+
+@register_metric("hit_rate", depends=("grid_hits",), columnar=True)
+def _hit_rate(frame, grid, deps):
+    return _hit_share(frame, [h[1] for h in deps["grid_hits"]])
+
+
+register_weighted_score("P_Score", P_SCORE_WEIGHTS)
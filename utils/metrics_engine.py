@@ -0,0 +1,166 @@
+# File: grid_parser_project/utils/metrics_engine.py
+# Purpose: Columnar metrics engine - all domains and grid sizes of a step in one pass
+
+import os, json
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+from utils.metric_registry import (
+    METRICS, LAYOUT_METRICS, ComponentFrame, component_columns, components_table, metric_closure, page_viewport
+)
+from utils.approx_metrics import approximate_page_metrics
+
+
+# ----------------------
+# Loading: one row per component, one row per page
+# ----------------------
+def _load_page(path, approx=None, grid_sizes=(), keep_components=False):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    comps = data.get("UI Components", [])
+    total = len(comps)
+    viewport, screen_w, screen_h = page_viewport(data)
+
+    # Approximate mode: large pages keep only an adaptively sized sample (see approx_metrics);
+    # pages that would need too large a sample stay exact
+    estimate = None
+    if approx and total >= approx["min_components"]:
+        estimate = approximate_page_metrics(comps, [(g, g) for g in grid_sizes],
+                                            tolerance=approx["tolerance"],
+                                            entropy_tolerance=approx["entropy_tolerance"],
+                                            confidence=approx["confidence"],
+                                            screen_w=screen_w, screen_h=screen_h)
+        comps = estimate.pop("sample")
+        if not estimate["approximate"]:
+            estimate = None
+    return {
+        "JSON_File": os.path.basename(path),
+        "Domain": urlparse(data["URL"]).netloc.replace("www.", "").replace(".", "_"),
+        "Screenshot": os.path.basename(data.get("Screenshot", "")),
+        "Viewport": viewport,
+        "Screen_W": screen_w,
+        "Screen_H": screen_h,
+        "Columns": component_columns(comps),
+        "Components": comps if keep_components else None,
+        "Total": total,
+        "Approx": estimate,
+    }
+
+
+def load_components_frame(json_dir, workers=None, approx=None, grid_sizes=(), keep_components=False):
+    """
+    Load every JSON of a step into (pages, comps): `pages` has one row per JSON file,
+    `comps` one row per component with a `page` index into `pages`. With `approx`
+    ({"min_components", "tolerance", "entropy_tolerance", "confidence"}), large pages contribute a sample only;
+    `Sample_Size` < `Num_Components` and `Approx` holds their estimates and intervals.
+    `keep_components` also keeps each page's component dicts in `Components`.
+    """
+    files = [os.path.join(json_dir, f) for f in os.listdir(json_dir) if f.endswith(".json")]
+    load = partial(_load_page, approx=approx, grid_sizes=tuple(grid_sizes), keep_components=keep_components)
+    if len(files) >= 32 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            loaded = list(pool.map(load, files, chunksize=16))
+    else:
+        loaded = [load(f) for f in files]
+
+    pages = pd.DataFrame({
+        "JSON_File": [p["JSON_File"] for p in loaded],
+        "Domain": [p["Domain"] for p in loaded],
+        "Screenshot": [p["Screenshot"] for p in loaded],
+        "Viewport": [p["Viewport"] for p in loaded],
+        "Screen_W": np.array([p["Screen_W"] for p in loaded], dtype=np.int64),
+        "Screen_H": np.array([p["Screen_H"] for p in loaded], dtype=np.int64),
+        "Num_Components": [p["Total"] for p in loaded],
+        "Sample_Size": [len(p["Columns"]["Tag"]) for p in loaded],
+        "Approx": [p["Approx"] for p in loaded],
+        "Components": [p["Components"] for p in loaded],
+    })
+    return pages, components_table([p["Columns"] for p in loaded])
+
+
+# ----------------------
+# Evaluation through the metric registry
+# ----------------------
+def evaluate_metrics(frame, names, grid, memo):
+    """
+    Values of the registered metrics `names` (and their dependencies) for every page of `frame`
+    on a rows x cols `grid`. `memo` is shared across grid sizes, so grid-independent metrics
+    (entropy, CR_File, ...) are computed once. Columnar metrics run over all pages at once,
+    metrics registered per page page by page.
+    """
+    def get(name):
+        spec = METRICS[name]
+        key = (name, *grid) if spec["grid"] else (name,)
+        if key not in memo:
+            deps = {d: get(d) for d in spec["depends"]}
+            if spec["columnar"]:
+                memo[key] = spec["fn"](frame, grid, deps)
+            else:
+                memo[key] = frame.per_page(name, grid, deps)
+        return memo[key]
+    return {name: get(name) for name in names}
+
+
+def _interval(pages, key, values):
+    """(low, high) arrays for `key`; exact pages get a zero-width interval."""
+    low, high = np.array(values, dtype=np.float64), np.array(values, dtype=np.float64)
+    for i, est in enumerate(pages["Approx"]):
+        if est is not None:
+            low[i], high[i] = est["ci"][key]
+    return low, high
+
+
+def compute_step_metrics(json_dir, screenshot_dir, grid_sizes=(4, 8, 16), workers=None, approx=None, cache=None,
+                         metrics=LAYOUT_METRICS):
+    """
+    Registered `metrics` (default: the layout metrics, P_Score with its registered weights) for
+    every JSON in `json_dir` and every grid size, as one long frame (one row per JSON file per
+    grid size, in the same order as the per-file loop; one column per metric).
+    `approx` enables sampled metrics for large pages (see load_components_frame); `cache` is
+    the persistent metric cache for the screenshot-based metrics.
+    """
+    per_page = any(not METRICS[m]["columnar"] for m in metric_closure(metrics))
+    pages, comps = load_components_frame(json_dir, workers=workers, approx=approx, grid_sizes=grid_sizes,
+                                         keep_components=per_page)
+    if pages.empty:
+        return pages, pd.DataFrame()
+    pages["Screenshot_Path"] = [os.path.join(screenshot_dir, s) for s in pages["Screenshot"]]
+    frame = ComponentFrame(pages, comps, cache=cache, components=list(pages["Components"]) if per_page else None)
+    nonempty = pages["Num_Components"].to_numpy() > 0
+    approximate = (pages["Sample_Size"] < pages["Num_Components"]).to_numpy()
+
+    memo, frames = {}, []
+    for g in grid_sizes:
+        values = evaluate_metrics(frame, metrics, (g, g), memo)
+        interval = evaluate_metrics(frame, ["entropy", "hit_rate"], (g, g), memo)
+        entropy_low, entropy_high = _interval(pages, "entropy", interval["entropy"])
+        hit_low, hit_high = _interval(pages, ("hit_rate", g, g), interval["hit_rate"])
+        frame_g = pd.DataFrame({
+            "order": np.arange(len(pages)),
+            "grid": g,
+            "JSON_File": pages["JSON_File"],
+            "Domain": pages["Domain"],
+            "Viewport": pages["Viewport"],
+            "Num_Components": pages["Num_Components"],
+        })
+        for name in metrics:
+            if name in ("cr_file", "png_size", "jpg_size"):
+                # object dtype keeps ints as ints and missing values as None; pages without
+                # components keep the legacy "no screenshot metrics" result
+                frame_g[name] = pd.Series(list(values[name]), dtype=object).where(nonempty, None)
+            elif name == "P_Score":
+                frame_g[name] = np.where(nonempty, values[name], 0.0)
+            elif name in LAYOUT_METRICS:
+                frame_g[name] = np.asarray(values[name], dtype=np.float64)
+            else:
+                frame_g[name] = pd.Series(list(values[name]))
+        frame_g["approximate"] = approximate
+        frame_g["sample_size"] = pages["Sample_Size"]
+        frame_g["hit_rate_ci_low"], frame_g["hit_rate_ci_high"] = hit_low, hit_high
+        frame_g["entropy_ci_low"], frame_g["entropy_ci_high"] = entropy_low, entropy_high
+        frames.append(frame_g)
+
+    metrics = pd.concat(frames, ignore_index=True).sort_values(["order", "grid"], kind="stable")
+    return pages, metrics.drop(columns="order").reset_index(drop=True)
@@ -0,0 +1,203 @@
+# File: grid_parser_project/utils/page_archive.py
+# Purpose: Record every response of a captured page to a local archive and replay it through a local HTTP proxy
+
+import os, json, base64, hashlib, threading
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Layout: <archive_dir>/<domain>/manifest.json + <archive_dir>/<domain>/bodies/<sha1>.bin
+# manifest: {"url", "recorded", "resources": {url: {"status", "headers", "body"}}}
+_KEEP_HEADERS = ("content-type", "location", "access-control-allow-origin", "content-language")
+_TEXT_TYPES = ("text/", "javascript", "json", "xml", "svg")
+
+
+def _key(url):
+    """Archive key: scheme-less, fragment-less URL (replay downgrades https to http)."""
+    parts = urlsplit(url)
+    return urlunsplit(("", parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+def _key_without_query(url):
+    parts = urlsplit(url)
+    return urlunsplit(("", parts.netloc.lower(), parts.path or "/", "", ""))
+
+
+def replay_url(url):
+    """URL to navigate to in replay mode (the proxy only speaks plain HTTP)."""
+    return "http://" + url[len("https://"):] if url.startswith("https://") else url
+
+
+# ----------------------
+# Recording
+# ----------------------
+def start_recording(driver):
+    """Enable the network domain with large body buffers and drop performance log entries so far."""
+    driver.execute_cdp_cmd("Network.enable", {"maxTotalBufferSize": 200_000_000,
+                                              "maxResourceBufferSize": 50_000_000})
+    driver.get_log("performance")
+
+
+def _network_events(driver):
+    for entry in driver.get_log("performance"):
+        try:
+            msg = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        if msg.get("method", "").startswith("Network."):
+            yield msg["method"], msg.get("params", {})
+
+
+def save_recording(driver, archive_dir, domain, url):
+    """
+    Store every response seen since start_recording(): redirects (status + Location) and
+    bodies of finished requests (read through Network.getResponseBody). Returns the count.
+    """
+    responses, finished, redirects = {}, set(), []
+    for method, params in _network_events(driver):
+        if method == "Network.responseReceived":
+            responses[params["requestId"]] = params["response"]
+        elif method == "Network.loadingFinished":
+            finished.add(params["requestId"])
+        elif method == "Network.requestWillBeSent" and params.get("redirectResponse"):
+            redirects.append(params["redirectResponse"])
+
+    page_dir = os.path.join(archive_dir, domain)
+    body_dir = os.path.join(page_dir, "bodies")
+    os.makedirs(body_dir, exist_ok=True)
+    resources = {}
+
+    def headers_of(resp):
+        return {k.lower(): v for k, v in (resp.get("headers") or {}).items() if k.lower() in _KEEP_HEADERS}
+
+    for resp in redirects:
+        if resp.get("url", "").startswith("http"):
+            resources[_key(resp["url"])] = {"status": resp.get("status", 302), "headers": headers_of(resp), "body": None}
+
+    for request_id, resp in responses.items():
+        if request_id not in finished or not resp.get("url", "").startswith("http"):
+            continue
+        try:
+            got = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception:
+            continue  # evicted from the buffer or no body (e.g. 204)
+        body = base64.b64decode(got["body"]) if got.get("base64Encoded") else got["body"].encode("utf-8")
+        name = hashlib.sha1(body).hexdigest() + ".bin"
+        path = os.path.join(body_dir, name)
+        if not os.path.isfile(path):
+            with open(path, "wb") as f:
+                f.write(body)
+        headers = headers_of(resp)
+        headers.setdefault("content-type", resp.get("mimeType", "application/octet-stream"))
+        resources[_key(resp["url"])] = {"status": resp.get("status", 200), "headers": headers, "body": name}
+
+    with open(os.path.join(page_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"url": url, "recorded": datetime.utcnow().isoformat(), "resources": resources}, f, indent=1)
+    return len(resources)
+
+
+# ----------------------
+# Replay
+# ----------------------
+class ReplayServer:
+    """
+    HTTP proxy answering from the archive only (no network). Misses get 404, HTTPS tunnels
+    (CONNECT) get 502. Exact URL first, then the same URL without its query string (cache
+    busters). Text bodies are served with https:// rewritten to http:// so sub-resources come
+    back through the proxy. Counts hits/misses in `stats`.
+    """
+
+    def __init__(self, archive_dir, host="127.0.0.1", port=0):
+        self.archive_dir = archive_dir
+        self.index, self.loose = {}, {}
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self.load()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_CONNECT(self):
+                server._count("misses")
+                self.send_error(502, "replay proxy does not tunnel HTTPS")
+
+            def do_GET(self):
+                # Proxy requests carry the absolute URL; direct requests only the path
+                url = self.path if "://" in self.path else f"http://{self.headers.get('Host', '')}{self.path}"
+                entry = server.lookup(url)
+                if entry is None:
+                    server._count("misses")
+                    self.send_error(404, "not in archive")
+                    return
+                server._count("hits")
+                body = entry["data"]
+                headers = dict(entry["headers"])
+                if "location" in headers:
+                    headers["location"] = replay_url(headers["location"])
+                if body and any(t in headers.get("content-type", "") for t in _TEXT_TYPES):
+                    body = body.replace(b"https://", b"http://").replace(b"https:\\/\\/", b"http:\\/\\/")
+                self.send_response(entry["status"])
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            do_HEAD = do_GET
+            do_POST = do_GET  # recorded POST responses are looked up by URL as well
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.address = f"{host}:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def load(self):
+        """(Re)index all recorded pages."""
+        if not os.path.isdir(self.archive_dir):
+            return
+        for domain in sorted(os.listdir(self.archive_dir)):
+            manifest = os.path.join(self.archive_dir, domain, "manifest.json")
+            if not os.path.isfile(manifest):
+                continue
+            with open(manifest, "r", encoding="utf-8") as f:
+                resources = json.load(f)["resources"]
+            for key, res in resources.items():
+                res = dict(res, dir=os.path.join(self.archive_dir, domain, "bodies"))
+                self.index[key] = res
+                self.loose.setdefault(_key_without_query("http:" + key), res)
+
+    def lookup(self, url):
+        res = self.index.get(_key(url)) or self.loose.get(_key_without_query(url))
+        if res is None:
+            return None
+        data = b""
+        if res.get("body"):
+            with open(os.path.join(res["dir"], res["body"]), "rb") as f:
+                data = f.read()
+        return {"status": res["status"], "headers": res["headers"], "data": data}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_SERVERS = {}
+_SERVERS_LOCK = threading.Lock()
+
+def replay_proxy(archive_dir):
+    """The process-wide replay server for `archive_dir` (started on first use)."""
+    with _SERVERS_LOCK:
+        if archive_dir not in _SERVERS:
+            _SERVERS[archive_dir] = ReplayServer(archive_dir)
+            print(f"[REPLAY] Serving {len(_SERVERS[archive_dir].index)} archived responses "
+                  f"from {archive_dir} on {_SERVERS[archive_dir].address}")
+        return _SERVERS[archive_dir]
@@ -0,0 +1,144 @@
+# File: grid_parser_project/utils/page_reset.py
+# Purpose: Restore a page to its captured base state after an interaction, cheapest strategy first
+
+import time
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Signature used to decide whether the page still matches its base state
+_SIGNATURE_JS = "return [location.href, document.getElementsByTagName('*').length];"
+
+_SNAPSHOT_JS = """
+window.__gpSnapshot = { body: document.body.cloneNode(true), x: window.scrollX, y: window.scrollY };
+return true;
+"""
+
+_RESTORE_JS = """
+var s = window.__gpSnapshot;
+if (!s) { return false; }
+document.querySelectorAll('dialog[open]').forEach(function (d) { try { d.close(); } catch (e) {} });
+document.body.replaceWith(s.body.cloneNode(true));
+window.scrollTo(s.x, s.y);
+return true;
+"""
+
+STRATEGIES = ("history_back", "dom_snapshot", "cached_reload")
+
+
+class PageStateReset:
+    """
+    Brings the page back to the state the JSON coordinates describe.
+
+    capture() records the base URL, an element-count signature, the number of event listeners
+    bound inside <body> and an in-page clone of <body>. reset() tries, in order: history back
+    (URL changed), DOM snapshot restore (same document), and a cache-friendly reload through
+    DevTools (Page.navigate). Each attempt is timed in `stats[strategy] = {"attempts",
+    "successes", "seconds"}`.
+
+    A cloned <body> keeps listeners delegated to document/window but loses the ones bound to
+    its nodes (and any framework state), so a snapshot restore only counts as clean if the
+    listener count inside <body> is back to the base count; framework-rendered pages (React
+    roots, jQuery bindings, ...) therefore fall through to the reload.
+    """
+
+    def __init__(self, driver, tolerance=0.02, load_timeout=30, on_restore=None):
+        self.driver = driver
+        self.tolerance = tolerance
+        self.load_timeout = load_timeout
+        self.on_restore = on_restore  # called after a reload, e.g. to re-arm the change tracker
+        self.base_url = None
+        self.base_count = 0
+        self.base_listeners = None
+        self.stats = {s: {"attempts": 0, "successes": 0, "seconds": 0.0} for s in STRATEGIES}
+
+    def _signature(self):
+        return self.driver.execute_script(_SIGNATURE_JS)
+
+    def _wait_loaded(self):
+        WebDriverWait(self.driver, self.load_timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script("return document.readyState") == "complete")
+
+    def _listener_count(self):
+        """Event listeners bound to <body> and its descendants (None if DevTools cannot tell)."""
+        try:
+            obj = self.driver.execute_cdp_cmd("Runtime.evaluate", {"expression": "document.body"})["result"]["objectId"]
+            try:
+                found = self.driver.execute_cdp_cmd("DOMDebugger.getEventListeners",
+                                                    {"objectId": obj, "depth": -1, "pierce": True})
+            finally:
+                self.driver.execute_cdp_cmd("Runtime.releaseObject", {"objectId": obj})
+            return len(found["listeners"])
+        except (WebDriverException, KeyError):
+            return None
+
+    def _listeners_intact(self):
+        count = self._listener_count()
+        return count is not None and count >= self.base_listeners * (1 - self.tolerance)
+
+    def capture(self):
+        self.base_url, self.base_count = self._signature()
+        self.base_listeners = self._listener_count()
+        self.driver.execute_script(_SNAPSHOT_JS)
+
+    def is_clean(self):
+        try:
+            url, count = self._signature()
+        except WebDriverException:
+            return False
+        same_count = abs(count - self.base_count) <= self.tolerance * max(self.base_count, 1)
+        return url == self.base_url and same_count
+
+    def _try(self, strategy, action, check=None):
+        entry = self.stats[strategy]
+        entry["attempts"] += 1
+        t0 = time.perf_counter()
+        try:
+            action()
+            ok = self.is_clean() and (check is None or check())
+        except WebDriverException:
+            ok = False
+        entry["seconds"] += time.perf_counter() - t0
+        entry["successes"] += ok
+        return ok
+
+    def _history_back(self):
+        self.driver.back()
+        self._wait_loaded()
+        # Without the back/forward cache the base document was reloaded: snapshot it again
+        if not self.driver.execute_script("return !!window.__gpSnapshot;"):
+            self.driver.execute_script(_SNAPSHOT_JS)
+
+    def _dom_snapshot(self):
+        if self.base_listeners is None:
+            raise WebDriverException("listeners cannot be verified; not restoring a DOM snapshot")
+        if not self.driver.execute_script(_RESTORE_JS):
+            raise WebDriverException("no DOM snapshot in this document")
+        # Same document: the change tracker's observer on <html> keeps working, no re-arm needed
+
+    def _cached_reload(self):
+        # Page.navigate uses the HTTP cache (unlike a hard reload) and also leaves foreign pages
+        self.driver.execute_cdp_cmd("Page.navigate", {"url": self.base_url})
+        self._wait_loaded()
+        self.driver.execute_script(_SNAPSHOT_JS)
+        if self.on_restore:
+            self.on_restore()
+
+    def reset(self, effect=None):
+        """
+        Restore the base state if the page changed. Returns the strategy that worked,
+        None if nothing needed resetting, or "failed".
+        """
+        if self.is_clean() and (effect or {}).get("effect") in (None, "popup"):
+            return None
+
+        if self.driver.current_url != self.base_url and self._try("history_back", self._history_back):
+            return "history_back"
+        if self.driver.current_url == self.base_url and self._try("dom_snapshot", self._dom_snapshot,
+                                                                  check=self._listeners_intact):
+            return "dom_snapshot"
+        if self._try("cached_reload", self._cached_reload):
+            return "cached_reload"
+        return "failed"
+
+    def summary(self):
+        return {s: dict(v, seconds=round(v["seconds"], 3)) for s, v in self.stats.items()}
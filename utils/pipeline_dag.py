@@ -0,0 +1,221 @@
+# File: grid_parser_project/utils/pipeline_dag.py
+# Purpose: Small DAG executor for the pipeline: declared inputs/outputs, content-hash skipping, parallel branches
+
+import os, json, time, hashlib
+from contextlib import nullcontext
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.instrumentation import span, sampling_profiler
+
+
+class Node:
+    """
+    One pipeline stage.
+
+    `func(**kwargs)` is run when the node is selected and not up to date. `inputs` / `outputs`
+    are files or directories; `params` (URL lists, flags) count as inputs too. Disabled nodes
+    only run when asked for explicitly (--only / --from).
+    """
+
+    def __init__(self, name, func, kwargs=None, deps=(), inputs=(), outputs=(), params=None, enabled=True):
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs or {}
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params if params is not None else self.kwargs
+        self.enabled = enabled
+
+
+# ----------------------
+# Content hashing
+# ----------------------
+def _files(path):
+    if os.path.isfile(path):
+        yield path
+    elif os.path.isdir(path):
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                if not name.endswith(".tmp"):
+                    yield os.path.join(root, name)
+
+
+def _file_digest(path, cache):
+    """sha256 of a file; cached by (size, mtime) so unchanged screenshots are not re-read."""
+    st = os.stat(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    hit = cache.get(path)
+    if hit and hit[:2] == stamp:
+        return hit[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    cache[path] = stamp + [h.hexdigest()]
+    return cache[path][2]
+
+
+def digest_paths(paths, cache):
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode())
+        for fp in _files(path):
+            try:
+                h.update(os.path.relpath(fp, path).encode() + _file_digest(fp, cache).encode())
+            except OSError:  # removed while walking
+                continue
+    return h.hexdigest()
+
+
+def digest_params(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _outputs_present(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            if not any(True for _ in _files(path)):
+                return False
+        elif not os.path.isfile(path):
+            return False
+    return True
+
+
+# ----------------------
+# Executor
+# ----------------------
+class Pipeline:
+    """
+    Runs nodes as soon as their dependencies are done, up to `workers` at a time. Each node
+    runs inside an instrumentation span labelled with its name; nodes named in `profile` are
+    also sampled by the stack profiler (folded stacks in `profile_dir`).
+
+    A node is skipped when its params and input contents match the state recorded after its
+    last successful run and its outputs exist. State is recorded when the whole run is over,
+    so in-place rewrites by later nodes (steps 2 and 3 annotate the step 1 JSON) do not make
+    the next run look changed.
+    """
+
+    def __init__(self, nodes, state_path, workers=3, profile=(), profile_dir=None, profile_interval_ms=5):
+        self.nodes = {n.name: n for n in nodes}
+        self.order = [n.name for n in nodes]
+        self.state_path = state_path
+        self.workers = workers
+        self.profile = set(profile or ())
+        self.profile_dir = profile_dir or os.path.dirname(state_path)
+        self.profile_interval_ms = profile_interval_ms
+        for n in nodes:
+            missing = [d for d in n.deps if d not in self.nodes]
+            if missing:
+                raise ValueError(f"{n.name}: unknown dependencies {missing}")
+        self.state = {"nodes": {}, "files": {}}
+        if os.path.isfile(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    self.state.update(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                pass
+
+    def descendants(self, name):
+        out, frontier = {name}, [name]
+        while frontier:
+            cur = frontier.pop()
+            for n in self.nodes.values():
+                if cur in n.deps and n.name not in out:
+                    out.add(n.name)
+                    frontier.append(n.name)
+        return out
+
+    def select(self, only=None, start=None):
+        """Selected node names and whether they were asked for explicitly (explicit = always re-run)."""
+        for name in (only or []) + ([start] if start else []):
+            if name not in self.nodes:
+                raise ValueError(f"Unknown step '{name}' (known: {', '.join(self.order)})")
+        if only:
+            return set(only), True
+        if start:
+            return {n for n in self.descendants(start) if self.nodes[n].enabled or n == start}, True
+        return {n for n in self.order if self.nodes[n].enabled}, False
+
+    def _up_to_date(self, node):
+        prev = self.state["nodes"].get(node.name)
+        if not prev:
+            return False
+        return (prev.get("params") == digest_params(node.params)
+                and prev.get("inputs") == digest_paths(node.inputs, self.state["files"])
+                and _outputs_present(node.outputs))
+
+    def _execute(self, node, force):
+        t0 = time.perf_counter()
+        if not force and self._up_to_date(node):
+            return "skipped", time.perf_counter() - t0
+        print(f"\n[DAG] >>> {node.name}")
+        profiler = (sampling_profiler(node.name, self.profile_dir, self.profile_interval_ms)
+                    if node.name in self.profile else nullcontext())
+        with span(step=node.name), profiler:
+            node.func(**node.kwargs)
+        return "ran", time.perf_counter() - t0
+
+    def run(self, only=None, start=None, force=False):
+        selected, explicit = self.select(only, start)
+        force = force or explicit
+        status, seconds = {}, {}
+        pending = [n for n in self.order if n in selected]
+        t_start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    deps = [d for d in self.nodes[name].deps if d in selected]
+                    if any(status.get(d) in ("failed", "blocked") for d in deps):
+                        status[name], seconds[name] = "blocked", 0.0
+                        pending.remove(name)
+                    elif all(status.get(d) in ("ran", "skipped") for d in deps):
+                        running[pool.submit(self._execute, self.nodes[name], force)] = name
+                        pending.remove(name)
+                if not running:
+                    if pending:
+                        raise ValueError(f"Dependency cycle among {pending}")
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        status[name], seconds[name] = fut.result()
+                    except Exception as e:
+                        status[name], seconds[name] = "failed", 0.0
+                        print(f"[DAG] {name} failed: {e}")
+
+        self._record(status, seconds)
+        self.report(status, seconds, time.perf_counter() - t_start)
+        return status
+
+    def _record(self, status, seconds):
+        for name, st in status.items():
+            node = self.nodes[name]
+            if st == "skipped":
+                # Later nodes may have rewritten its inputs in place during this run
+                self.state["nodes"][name]["inputs"] = digest_paths(node.inputs, self.state["files"])
+            elif st == "ran":
+                self.state["nodes"][name] = {
+                    "params": digest_params(node.params),
+                    "inputs": digest_paths(node.inputs, self.state["files"]),
+                    "seconds": round(seconds[name], 3),
+                    "finished": datetime.utcnow().isoformat(),
+                }
+            elif st == "failed":
+                self.state["nodes"].pop(name, None)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def report(self, status, seconds, total):
+        print("\n[DAG] Step timings")
+        for name in self.order:
+            if name in status:
+                print(f"  {name:<8} {status[name]:<8} {seconds[name]:9.2f}s")
+        print(f"  {'total':<8} {'':<8} {total:9.2f}s (wall clock, branches overlap)")
@@ -0,0 +1,117 @@
+# File: grid_parser_project/utils/report_figures.py
+# Purpose: Step 8 figures, each rendered on its own Agg figure (no pyplot state) so they can run in worker processes
+
+import os, base64, html
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+import seaborn as sns
+
+
+# ----------------------
+# Figures: fn(ctx, ax) draws into `ax`; ctx holds best_grids, corr_matrix, score_corr, cr_pred
+# ----------------------
+def _scatter_cr_file(ctx, ax):
+    bg = ctx["best_grids"]
+    sns.scatterplot(data=bg, x="Entropy*Density", y="CR_File", hue="Dataset_Type", ax=ax)
+    ax.plot(bg["Entropy*Density"], ctx["cr_pred"], color='black', linestyle='--', label="Regression Line")
+    ax.set_title("CR_File vs Entropy × Density")
+    ax.set_xlabel("Entropy × Density")
+    ax.set_ylabel("CR_File")
+    ax.grid(True)
+    ax.legend()
+
+def _correlation_heatmap(ctx, ax):
+    sns.heatmap(ctx["corr_matrix"], annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5, ax=ax)
+    ax.set_title("Correlation Heatmap of Metrics")
+
+def _grid_consistency(ctx, ax):
+    sns.boxplot(data=ctx["best_grids"], x="Dataset_Type", y="Grid_Consistency(%)", hue="Dataset_Type",
+                palette="Set2", legend=False, ax=ax)
+    ax.set_title("Grid Consistency (%) by Dataset Type")
+
+def _p_score_correlation(ctx, ax):
+    ctx["score_corr"].drop("P_Score").plot(kind='barh', color='teal', ax=ax)
+    ax.set_title("Correlation of P_Score with Metrics")
+    ax.set_xlabel("Pearson Correlation")
+
+def _score_by_grid_size(ctx, ax):
+    ctx["best_grids"].groupby("Grid_Size")["P_Score"].mean().plot(kind='bar', color='royalblue', ax=ax)
+    ax.set_title("Parsing Score Across Grid Sizes")
+    ax.set_xlabel("Grid Size")
+    ax.set_ylabel("Mean P_Score")
+
+def _best_grid_per_domain(ctx, ax):
+    per_domain = ctx["best_grids"].groupby("Domain")["Grid_Size"].agg(lambda x: x.mode()[0])  # most frequent grid size
+    per_domain.value_counts().plot(kind='bar', color='forestgreen', ax=ax)
+    ax.set_title("Best Grid Size per Domain")
+    ax.set_xlabel("Grid Size")
+    ax.set_ylabel("Frequency")
+
+def _train_vs_test(column):
+    def draw(ctx, ax):
+        sns.boxplot(x="Dataset_Type", y=column, data=ctx["best_grids"], hue="Dataset_Type",
+                    palette="Set2", legend=False, ax=ax)
+        ax.set_title(f"Train vs Test: {column} Comparison")
+    return draw
+
+# name -> (file name, figure size, draw function)
+FIGURES = {
+    "scatter_cr_file": ("scatter_cr_file_vs_entropy_density.png", (8, 6), _scatter_cr_file),
+    "correlation_heatmap": ("correlation_heatmap.png", (10, 8), _correlation_heatmap),
+    "grid_consistency": ("grid_consistency_by_type.png", (8, 6), _grid_consistency),
+    "p_score_correlation": ("p_score_metric_correlation.png", (8, 5), _p_score_correlation),
+    "score_by_grid_size": ("parsing_score_across_grid_sizes.png", (8, 6), _score_by_grid_size),
+    "best_grid_per_domain": ("best_grid_size_per_domain.png", (8, 6), _best_grid_per_domain),
+    "p_score_train_vs_test": ("train_vs_test_p_score_comparison.png", (10, 6), _train_vs_test("P_Score")),
+    "density_train_vs_test": ("train_vs_test_density_comparison.png", (10, 6), _train_vs_test("Density")),
+}
+
+
+def render_figure(name, ctx, out_dir):
+    """Draw one figure and save it; the Figure is not registered with pyplot, so it is freed on return."""
+    filename, size, draw = FIGURES[name]
+    fig = Figure(figsize=size)
+    ax = fig.subplots()
+    draw(ctx, ax)
+    fig.tight_layout()
+    path = os.path.join(out_dir, filename)
+    fig.savefig(path)
+    fig.clf()
+    return path
+
+
+def _render_one(args):
+    return render_figure(*args)
+
+
+def render_figures(names, ctx, out_dir, workers=4):
+    """Render `names` with up to `workers` processes (inline for one worker / one figure)."""
+    jobs = [(name, ctx, out_dir) for name in names]
+    if workers <= 1 or len(jobs) <= 1:
+        return [_render_one(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(_render_one, jobs))
+
+
+# ----------------------
+# Static HTML bundle
+# ----------------------
+def write_html_report(path, title, tables, figure_paths):
+    """One self-contained HTML file: tables as HTML, figures inlined as base64 PNG."""
+    parts = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>",
+             "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;font-size:12px}"
+             "td,th{border:1px solid #ccc;padding:2px 6px}img{max-width:100%;margin:1em 0}</style>",
+             f"</head><body><h1>{html.escape(title)}</h1>"]
+    for caption, df in tables.items():
+        parts.append(f"<h2>{html.escape(caption)}</h2>{df.to_html(float_format=lambda v: f'{v:.4f}')}")
+    for fp in figure_paths:
+        with open(fp, "rb") as f:
+            data = base64.b64encode(f.read()).decode("ascii")
+        name = os.path.basename(fp)
+        parts.append(f"<h2>{html.escape(name)}</h2><img alt='{html.escape(name)}' src='data:image/png;base64,{data}'>")
+    parts.append("</body></html>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+    return path
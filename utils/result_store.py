@@ -0,0 +1,134 @@
+# File: grid_parser_project/utils/result_store.py
+# Purpose: Typed, schema-versioned metric result store (Parquet/Feather); CSV is only an export
+
+import os, json, threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
+
+SCHEMA_VERSION = 2  # 2: "Viewport" column (multi-viewport capture)
+_META_KEY = b"grid_parser_schema"
+
+# Column -> pandas dtype. "Int64" is nullable (missing screenshot sizes stay <NA>, not float).
+SCHEMAS = {
+    # Step 2: evaluate_grid_variants
+    "grid_metrics": {
+        "Domain": "string",
+        "Viewport": "string",
+        "Grid_Size": "string",
+        "Num_Components": "Int64",
+        "Hit_Rate": "float64",
+        "Density": "float64",
+        "Entropy": "float64",
+        "CR_BBox": "float64",
+        "CR_File": "float64",
+        "Screenshot_Size(Bytes)": "Int64",
+        "Compressed_JPG_Size(Bytes)": "Int64",
+    },
+    # Step 4: step4_evaluation
+    "evaluation": {
+        "JSON_File": "string",
+        "Domain": "string",
+        "Viewport": "string",
+        "Grid_Size": "string",
+        "Grid_Consistency(%)": "float64",
+        "Hit_Rate(%)": "float64",
+        "Density": "float64",
+        "Variability": "float64",
+        "Compression_Ratio": "float64",
+        "Entropy": "float64",
+        "CR_File": "float64",
+        "Screenshot_Size(Bytes)": "Int64",
+        "Compressed_JPG_Size(Bytes)": "Int64",
+        "P_Score": "float64",
+    },
+}
+
+# Filled in when a column is missing (tables written before it existed)
+DEFAULTS = {"Viewport": "Desktop"}
+
+
+def apply_schema(df, kind):
+    """Cast a frame to the schema of `kind`; extra columns are kept, "N/A"-style text becomes missing."""
+    df = df.copy()
+    for col, dtype in SCHEMAS[kind].items():
+        if col not in df.columns:
+            df[col] = DEFAULTS.get(col, pd.NA)
+        if dtype == "string":
+            df[col] = df[col].astype("string")
+        else:
+            num = pd.to_numeric(df[col], errors="coerce")
+            df[col] = num.round().astype(dtype) if dtype == "Int64" else num.astype(dtype)
+    ordered = list(SCHEMAS[kind]) + [c for c in df.columns if c not in SCHEMAS[kind]]
+    return df[ordered]
+
+
+def write_results(df, kind, path, fmt=None):
+    """Write typed results to `path` (.parquet or .feather), tagged with kind + schema version."""
+    fmt = fmt or ("feather" if path.endswith(".feather") else "parquet")
+    table = pa.Table.from_pandas(apply_schema(df, kind), preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[_META_KEY] = json.dumps({"kind": kind, "version": SCHEMA_VERSION}).encode()
+    table = table.replace_schema_metadata(meta)
+
+    # Write-then-rename: readers (and parallel pipeline branches) never see a half-written file
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if fmt == "feather":
+        feather.write_feather(table, tmp, compression="zstd")
+    else:
+        pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+    return path
+
+
+def _read_table(path, columns=None):
+    if path.endswith(".feather"):
+        return feather.read_table(path, columns=columns)
+    return pq.read_table(path, columns=columns)
+
+
+def read_results(path, columns=None):
+    table = _read_table(path, columns)
+    raw = (table.schema.metadata or {}).get(_META_KEY)
+    info = json.loads(raw) if raw else {"kind": None, "version": 0}
+    if info["version"] > SCHEMA_VERSION:
+        raise ValueError(f"{path}: schema version {info['version']} is newer than supported ({SCHEMA_VERSION})")
+    df = table.to_pandas()
+    if info["kind"] in SCHEMAS and columns is None:
+        df = apply_schema(df, info["kind"])
+    return df
+
+
+def load_many(paths, columns=None, label_col="Source_File"):
+    """Concatenate several stored result files (e.g. many runs), reading only the needed columns."""
+    frames = []
+    for p in paths:
+        if os.path.isfile(p):
+            df = read_results(p, columns)
+            df[label_col] = os.path.basename(p)
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def export_csv(df, path):
+    """Legacy CSV export: missing CR_File is written as "N/A", like the old string tables."""
+    out = df.copy()
+    if "CR_File" in out.columns:
+        out["CR_File"] = out["CR_File"].astype(object).where(out["CR_File"].notna(), "N/A")
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    out.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def load_step_results(name, results_dir, csv_dir, kind="evaluation"):
+    """Load `<name>` from the typed store, falling back to (and typing) the legacy CSV."""
+    stored = os.path.join(results_dir, f"{name}.parquet")
+    if os.path.isfile(stored):
+        return read_results(stored)
+    csv_path = os.path.join(csv_dir, f"{name}.csv")
+    if os.path.isfile(csv_path):
+        return apply_schema(pd.read_csv(csv_path), kind)
+    return None
@@ -0,0 +1,188 @@
+# File: grid_parser_project/utils/run_history.py
+# Purpose: Per-run evaluation history (Parquet partitioned by step and run) and bounded-memory analysis over run ranges
+
+import os, math, time, threading, collections
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.result_store import apply_schema
+
+# Layout: <history_dir>/step=<step>/run_id=<run_id>/<part>.parquet (hive-style, readable by pyarrow.dataset).
+# Run IDs are UTC timestamps, so string order is time order and a run range is a directory range.
+_RUN_STARTED = datetime.now(timezone.utc)
+_RUN_ID = os.environ.get("GRID_PARSER_RUN_ID") or _RUN_STARTED.strftime("%Y%m%dT%H%M%SZ")
+
+DATASET_TYPES = {"step1": "Training", "step5": "Test", "step7": "General"}
+SITE_TYPES = {"step1": "E-Commerce", "step5": "Test", "step7": "General"}
+METRICS = ["Density", "Variability", "Compression_Ratio", "CR_File", "Entropy", "P_Score", "Grid_Consistency(%)"]
+
+
+def current_run_id():
+    """ID shared by everything this process writes (override with GRID_PARSER_RUN_ID)."""
+    return _RUN_ID
+
+
+def append_run_results(df, step, history_dir, run_id=None):
+    """Store one step's evaluation table for this run (a re-run of the step replaces its part)."""
+    run_id = run_id or current_run_id()
+    out = apply_schema(df, "evaluation")
+    out["Run_Timestamp"] = pd.Timestamp(_RUN_STARTED if run_id == _RUN_ID else datetime.now(timezone.utc))
+    part_dir = os.path.join(history_dir, f"step={step}", f"run_id={run_id}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, "part-0.parquet")
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(pa.Table.from_pandas(out, preserve_index=False), tmp, compression="zstd")
+    os.replace(tmp, path)
+    return path
+
+
+def list_runs(history_dir, steps=None, run_from=None, run_to=None, last=None):
+    """[(run_id, step, part_dir)] in run order, pruned by directory name (no data is read)."""
+    found = []
+    if not os.path.isdir(history_dir):
+        return found
+    for step_dir in sorted(os.listdir(history_dir)):
+        if not step_dir.startswith("step="):
+            continue
+        step = step_dir[len("step="):]
+        if steps and step not in steps:
+            continue
+        for run_dir in sorted(os.listdir(os.path.join(history_dir, step_dir))):
+            run_id = run_dir[len("run_id="):]
+            if not run_dir.startswith("run_id=") or (run_from and run_id < run_from) or (run_to and run_id > run_to):
+                continue
+            found.append((run_id, step, os.path.join(history_dir, step_dir, run_dir)))
+    found.sort()
+    if last:
+        keep = sorted({r for r, _, _ in found})[-last:]
+        found = [f for f in found if f[0] in keep]
+    return found
+
+
+# ----------------------
+# Streaming aggregates
+# ----------------------
+class _Moments:
+    """count / mean / sample std per column, from running sums."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.n = np.zeros(len(columns))
+        self.s = np.zeros(len(columns))
+        self.ss = np.zeros(len(columns))
+
+    def add(self, frame):
+        x = frame[self.columns].to_numpy(dtype=float)
+        ok = ~np.isnan(x)
+        self.n += ok.sum(axis=0)
+        self.s += np.where(ok, x, 0).sum(axis=0)
+        self.ss += np.where(ok, x * x, 0).sum(axis=0)
+
+    def result(self):
+        out = {}
+        for i, col in enumerate(self.columns):
+            n = self.n[i]
+            mean = self.s[i] / n if n else math.nan
+            var = (self.ss[i] - n * mean * mean) / (n - 1) if n > 1 else math.nan
+            out[(col, "mean")] = mean
+            out[(col, "std")] = math.sqrt(max(var, 0.0)) if n > 1 else math.nan
+            out[(col, "count")] = int(n)
+        return out
+
+
+class _OLS:
+    """Simple linear regression y ~ x from sufficient statistics."""
+
+    def __init__(self):
+        self.n = self.sx = self.sy = self.sxx = self.sxy = self.syy = 0.0
+
+    def add(self, x, y):
+        ok = np.isfinite(x) & np.isfinite(y)
+        x, y = x[ok], y[ok]
+        self.n += len(x)
+        self.sx += x.sum(); self.sy += y.sum()
+        self.sxx += (x * x).sum(); self.sxy += (x * y).sum(); self.syy += (y * y).sum()
+
+    def result(self):
+        n = self.n
+        if n < 2:
+            return {"n": int(n), "slope": math.nan, "intercept": math.nan, "r2": math.nan}
+        vxx = self.sxx - self.sx * self.sx / n
+        vxy = self.sxy - self.sx * self.sy / n
+        vyy = self.syy - self.sy * self.sy / n
+        slope = vxy / vxx if vxx else math.nan
+        intercept = (self.sy - slope * self.sx) / n
+        r2 = (vxy * vxy) / (vxx * vyy) if vxx and vyy else math.nan
+        return {"n": int(n), "slope": slope, "intercept": intercept, "r2": r2}
+
+
+def _best_grids(part_dir, step, batch_rows=65_536):
+    """Best grid (max P_Score) per domain of one run, read in record batches."""
+    best = None
+    for name in sorted(os.listdir(part_dir)):
+        if not name.endswith(".parquet"):
+            continue
+        pf = pq.ParquetFile(os.path.join(part_dir, name))
+        cols = [c for c in ["Domain", "Viewport", "Grid_Size", "Site_Type"] + METRICS if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=batch_rows, columns=cols):
+            chunk = batch.to_pandas().dropna(subset=["P_Score"])
+            if "Viewport" not in chunk.columns:
+                chunk["Viewport"] = "Desktop"  # runs from before multi-viewport capture
+            best = chunk if best is None else pd.concat([best, chunk], ignore_index=True)
+            best = best.loc[best.groupby(["Domain", "Viewport"])["P_Score"].idxmax()].reset_index(drop=True)
+    if best is None:
+        return None
+    if "Site_Type" not in best.columns:
+        best["Site_Type"] = SITE_TYPES.get(step, "General")
+    best["Dataset_Type"] = DATASET_TYPES.get(step, step)
+    return best
+
+
+def analyze_runs(history_dir, steps=("step1", "step5", "step7"), run_from=None, run_to=None, last=None):
+    """
+    Grouped stats, best grid per domain, regression CR_File ~ Entropy x Density and per-run
+    trends over a run range.
+
+    One run partition is in memory at a time (and only its best-grid rows are kept), so
+    memory depends on the domains per run, not on the number of runs.
+    """
+    t0 = time.perf_counter()
+    runs = list_runs(history_dir, steps, run_from, run_to, last)
+    groups, trend, ols = {}, [], _OLS()
+    best_counts = collections.Counter()  # (step, domain, viewport, grid) -> runs in which that grid was best
+    for run_id, step, part_dir in runs:
+        best = _best_grids(part_dir, step)
+        if best is None or best.empty:
+            continue
+        for key, frame in best.groupby(["Dataset_Type", "Site_Type"]):
+            groups.setdefault(key, _Moments(METRICS)).add(frame)
+        x = (best["Entropy"] * best["Density"]).to_numpy(dtype=float)
+        ols.add(x, best["CR_File"].to_numpy(dtype=float))
+        best_counts.update(zip([step] * len(best), best["Domain"], best["Viewport"], best["Grid_Size"]))
+        trend.append({"Run_ID": run_id, "Step": step, "Domains": len(best),
+                      **{f"Mean_{m}": best[m].mean() for m in ("P_Score", "Density", "Entropy", "CR_File")},
+                      "Best_Grid_Mode": best["Grid_Size"].mode().iat[0] if not best["Grid_Size"].mode().empty else None})
+
+    stats = pd.DataFrame({k: m.result() for k, m in groups.items()}).T
+    if not stats.empty:
+        stats.index.names = ["Dataset_Type", "Site_Type"]
+        stats.columns = pd.MultiIndex.from_tuples(stats.columns)
+        counts = [c for c in stats.columns if c[1] == "count"]
+        stats[counts] = stats[counts].astype(int)
+    best = pd.DataFrame([(s, d, v, g, n) for (s, d, v, g), n in best_counts.items()],
+                        columns=["Step", "Domain", "Viewport", "Grid_Size", "Runs_Best"])
+    if not best.empty:
+        # Most frequent best grid per step, domain and viewport over the range
+        best = (best.sort_values(["Step", "Domain", "Viewport", "Runs_Best", "Grid_Size"],
+                                 ascending=[True, True, True, False, True])
+                    .drop_duplicates(["Step", "Domain", "Viewport"]).reset_index(drop=True))
+    return {
+        "runs": sorted({r for r, _, _ in runs}),
+        "best_grids": best,
+        "stats": stats,
+        "trend": pd.DataFrame(trend),
+        "regression": ols.result(),
+        "seconds": time.perf_counter() - t0,
+    }
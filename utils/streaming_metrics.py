@@ -0,0 +1,187 @@
+# File: grid_parser_project/utils/streaming_metrics.py
+# Purpose: Online layout metrics - per-page accumulators fed while step 1 extracts components
+
+import os, math, time, queue, threading
+import pandas as pd
+from utils.metric_registry import P_SCORE_WEIGHTS, jpeg_compression_ratio
+from utils.result_store import apply_schema, write_results, read_results, export_csv
+from utils.run_history import append_run_results
+
+
+class PageAccumulator:
+    """
+    Constant-memory running metrics for one page: component count, tag histogram (bounded by
+    the number of distinct tags), summed bbox area and, per grid size, exact/fuzzy hit counts
+    against the 8x8 assignment step 2 would make.
+    """
+
+    def __init__(self, grid_sizes=(4, 8, 16), screen_w=1920, screen_h=1080, assign_grid=8):
+        self.grid_sizes = tuple(grid_sizes)
+        self.screen_w, self.screen_h = screen_w, screen_h
+        self.assign_cell = (screen_w // assign_grid, screen_h // assign_grid)
+        self.total = 0
+        self.tag_counts = {}
+        self.sum_area = 0
+        self.exact = dict.fromkeys(self.grid_sizes, 0)
+        self.fuzzy = dict.fromkeys(self.grid_sizes, 0)
+
+    def update(self, comp):
+        self.total += 1
+        tag = comp["Tag"].lower()
+        self.tag_counts[tag] = self.tag_counts.get(tag, 0) + 1
+        self.sum_area += comp["Width"] * comp["Height"]
+
+        assigned_r = comp["Y"] // self.assign_cell[1]
+        assigned_c = comp["X"] // self.assign_cell[0]
+        for g in self.grid_sizes:
+            real_r = comp["Y"] // (self.screen_h // g)
+            real_c = comp["X"] // (self.screen_w // g)
+            if assigned_r == real_r and assigned_c == real_c:
+                self.exact[g] += 1
+            if abs(assigned_r - real_r) <= 1 and abs(assigned_c - real_c) <= 1:
+                self.fuzzy[g] += 1
+
+    def entropy(self):
+        if not self.total:
+            return 0.0
+        return -sum((n / self.total) * math.log2(n / self.total) for n in self.tag_counts.values())
+
+    def snapshot(self, cr_file=None):
+        """Current metrics per grid size (same keys as calculate_layout_metrics)."""
+        screen_area = self.screen_w * self.screen_h
+        density = self.total / screen_area
+        comp_ratio = self.sum_area / screen_area
+        entropy = self.entropy()
+        out = {}
+        for g in self.grid_sizes:
+            hit_rate = self.fuzzy[g] / self.total if self.total else 0
+            terms = {"hit_rate": hit_rate, "sparsity": 1 - density, "entropy": entropy,
+                     "compression_ratio": comp_ratio, "cr_file": cr_file or 0}
+            score = 0
+            for key, w in P_SCORE_WEIGHTS.items():
+                score += w * terms[key]
+            out[g] = {
+                "grid_consistency": self.exact[g] / self.total if self.total else 0,
+                "hit_rate": hit_rate,
+                "density": density,
+                "variability": entropy,
+                "compression_ratio": comp_ratio,
+                "entropy": entropy,
+                "P_Score": score if self.total else 0,
+            }
+        return out
+
+
+class StreamingMetricsConsumer:
+    """
+    Background consumer for component events published during capture.
+
+    Events: ("begin", page_id, info), ("component", page_id, comp), ("end", page_id, None),
+    ("discard", page_id, None). Metrics for a page are final as soon as its "end" event is
+    processed; a page whose capture failed is discarded instead. close() writes the step's
+    evaluation table in the same typed/CSV form as step 4, so the batch pass can be skipped:
+    pages captured in this run replace their previous rows, the other pages with a JSON in
+    `json_dir` keep theirs.
+    """
+
+    def __init__(self, csv_filename, results_dir, csv_dir, grid_sizes=(4, 8, 16), max_queue=10_000,
+                 history_dir=None, json_dir=None):
+        self.csv_filename = csv_filename
+        self.history_dir = history_dir
+        self.json_dir = json_dir
+        self.results_dir = results_dir
+        self.csv_dir = csv_dir
+        self.grid_sizes = grid_sizes
+        self.events = queue.Queue(maxsize=max_queue)
+        self.pages = {}
+        self.rows = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # --- producer side ---
+    def begin_page(self, page_id, json_file, domain, screenshot_path, viewport="Desktop", screen_w=1920, screen_h=1080):
+        self.events.put(("begin", page_id, {"json_file": json_file, "domain": domain, "viewport": viewport,
+                                            "screen": (screen_w, screen_h), "screenshot": screenshot_path,
+                                            "t0": time.perf_counter()}))
+
+    def publish(self, page_id, comp):
+        self.events.put(("component", page_id, comp))
+
+    def end_page(self, page_id):
+        self.events.put(("end", page_id, None))
+
+    def discard_page(self, page_id):
+        """Drop a page begun but not ended (its capture failed): no rows, no accumulator left behind."""
+        self.events.put(("discard", page_id, None))
+
+    # --- consumer side ---
+    def _run(self):
+        while True:
+            kind, page_id, payload = self.events.get()
+            if kind == "stop":
+                return
+            if kind == "begin":
+                self.pages[page_id] = (PageAccumulator(self.grid_sizes, *payload["screen"]), payload)
+            elif kind == "component" and page_id in self.pages:
+                self.pages[page_id][0].update(payload)
+            elif kind == "end" and page_id in self.pages:
+                self._finish(page_id)
+            elif kind == "discard" and self.pages.pop(page_id, None) is not None:
+                print(f"[ONLINE] Discarded partial metrics for {page_id}")
+
+    def _finish(self, page_id):
+        acc, info = self.pages.pop(page_id)
+        cr_file, png_size, jpg_size = (None, None, None)
+        if acc.total:
+            cr_file, png_size, jpg_size = jpeg_compression_ratio(info["screenshot"])
+        for g, m in acc.snapshot(cr_file).items():
+            self.rows.append({
+                "JSON_File": info["json_file"],
+                "Domain": info["domain"],
+                "Viewport": info["viewport"],
+                "Grid_Size": f"{g}x{g}",
+                "Grid_Consistency(%)": m["grid_consistency"] * 100,
+                "Hit_Rate(%)": m["hit_rate"] * 100,
+                "Density": m["density"],
+                "Variability": m["variability"],
+                "Compression_Ratio": m["compression_ratio"],
+                "Entropy": m["entropy"],
+                "CR_File": cr_file,
+                "Screenshot_Size(Bytes)": png_size,
+                "Compressed_JPG_Size(Bytes)": jpg_size,
+                "P_Score": m["P_Score"]
+            })
+        lag = time.perf_counter() - info["t0"]
+        print(f"[ONLINE] Metrics for {info['domain']} ({info['viewport']}) ready ({acc.total} components, {lag:.1f}s after capture start)")
+
+    def close(self):
+        self.events.put(("stop", None, None))
+        self._thread.join()
+        if not self.rows:
+            return None
+        df = apply_schema(pd.DataFrame(self.rows), "evaluation")
+        name = os.path.splitext(self.csv_filename)[0]
+        path = os.path.join(self.results_dir, f"{name}.parquet")
+        df = self._with_previous_rows(df, path)
+        stored = write_results(df, "evaluation", path)
+        export_csv(df, os.path.join(self.csv_dir, self.csv_filename))
+        if self.history_dir:
+            append_run_results(df, name.replace("evaluation_results_", ""), self.history_dir)
+        print(f"Online metrics saved to {stored}")
+        return df
+
+    def _with_previous_rows(self, df, path):
+        """Previous rows of pages not captured in this run (and whose JSON is still there), then this run's."""
+        if not os.path.isfile(path):
+            return df
+        try:
+            prev = read_results(path)
+        except (OSError, ValueError) as e:
+            print(f"[ONLINE] Previous results unreadable ({e}); writing this run's pages only")
+            return df
+        keep = ~prev["JSON_File"].isin(set(df["JSON_File"]))
+        if self.json_dir:
+            keep &= prev["JSON_File"].map(lambda f: isinstance(f, str) and os.path.isfile(os.path.join(self.json_dir, f)))
+        if not keep.any():
+            return df
+        return apply_schema(pd.concat([prev[keep], df], ignore_index=True), "evaluation")
@@ -0,0 +1,275 @@
+# File: grid_parser_project/utils/work_queue.py
+# Purpose: Crawl work queue (leases, retries with backoff, dead letters) and a shared result store keyed by run + domain
+
+import os, json, time, random, sqlite3, threading
+from datetime import datetime
+
+
+class Task:
+    def __init__(self, id, run_id, kind, key, payload, attempts, owner=None):
+        self.id = id
+        self.run_id = run_id
+        self.kind = kind          # "capture", "step6", ...
+        self.key = key            # usually the URL
+        self.payload = payload
+        self.attempts = attempts  # including the current lease
+        self.owner = owner        # worker holding the lease
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.kind}, {self.key}, attempt {self.attempts})"
+
+
+class WorkQueue:
+    """
+    Queue interface used by crawl_worker.py. A networked backend implements the same methods.
+
+    Lifecycle: queued -> leased -> done, or back to queued after fail() (available again after
+    an exponential backoff), or dead after `max_attempts`. A lease that is not completed,
+    failed or extended before it expires counts as a failed attempt (crashed worker).
+
+    extend(), complete() and fail() only act while `task.owner` still holds the lease; once it
+    has expired and the task was requeued or leased by another worker they change nothing
+    (extend/complete return False, fail returns "lost").
+    """
+
+    def enqueue(self, run_id, kind, keys, payload=None):
+        raise NotImplementedError
+
+    def lease(self, worker_id, kinds, lease_s, limit=1):
+        """Up to `limit` tasks of `kinds` for `worker_id`; [] if nothing is available."""
+        raise NotImplementedError
+
+    def extend(self, task, lease_s):
+        """True if the lease was extended, False if it was lost."""
+        raise NotImplementedError
+
+    def complete(self, task):
+        """True if the task is now done, False if the lease was lost."""
+        raise NotImplementedError
+
+    def fail(self, task, error):
+        """"retry", "dead" or "lost"."""
+        raise NotImplementedError
+
+    def stats(self, run_id=None):
+        raise NotImplementedError
+
+    def dead_letters(self, run_id=None):
+        raise NotImplementedError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    updated REAL NOT NULL,
+    UNIQUE (run_id, kind, key)
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, kind, available_at);
+"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    WorkQueue on one SQLite file (WAL mode) for a single host and for testing: any number of
+    worker processes on that host can share it. SQLite locking is not reliable on network file
+    systems, so several hosts need a networked backend.
+    """
+
+    def __init__(self, path, max_attempts=3, backoff_s=30.0, backoff_max_s=900.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        # One short-lived connection per call keeps the queue safe to share between threads
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return _Closing(db)
+
+    def enqueue(self, run_id, kind, keys, payload=None):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            added = 0
+            for key in keys:
+                cur = db.execute(
+                    "INSERT OR IGNORE INTO tasks (run_id, kind, key, payload, available_at, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (run_id, kind, key, json.dumps(payload or {}), now, now))
+                added += cur.rowcount
+            db.execute("COMMIT")
+        return added
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max_s, self.backoff_s * 2 ** max(attempts - 1, 0))
+        return delay * random.uniform(0.5, 1.0)  # jitter so failed hosts do not retry in lockstep
+
+    def lease(self, worker_id, kinds, lease_s, limit=1):
+        now = time.time()
+        marks = ",".join("?" * len(kinds))
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            # Expired leases: the holder died; that attempt failed
+            expired = db.execute(
+                f"SELECT id, attempts FROM tasks WHERE state = 'leased' AND lease_expires < ? AND kind IN ({marks})",
+                (now, *kinds)).fetchall()
+            for row in expired:
+                dead = row["attempts"] >= self.max_attempts
+                db.execute("UPDATE tasks SET state = ?, available_at = ?, lease_owner = NULL, "
+                           "last_error = 'lease expired', updated = ? WHERE id = ?",
+                           ("dead" if dead else "queued", now + (0 if dead else self._backoff(row["attempts"])),
+                            now, row["id"]))
+            rows = db.execute(
+                f"SELECT * FROM tasks WHERE state = 'queued' AND available_at <= ? AND kind IN ({marks}) "
+                f"ORDER BY available_at, id LIMIT ?", (now, *kinds, limit)).fetchall()
+            for row in rows:
+                db.execute("UPDATE tasks SET state = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                           "lease_expires = ?, updated = ? WHERE id = ?", (worker_id, now + lease_s, now, row["id"]))
+            db.execute("COMMIT")
+        return [Task(r["id"], r["run_id"], r["kind"], r["key"], json.loads(r["payload"] or "{}"), r["attempts"] + 1,
+                     worker_id) for r in rows]
+
+    # Every transition of a leased task checks that the caller still holds the lease
+    _HELD = "WHERE id = ? AND state = 'leased' AND lease_owner = ?"
+
+    def extend(self, task, lease_s):
+        now = time.time()
+        with self._connect() as db:
+            return db.execute(f"UPDATE tasks SET lease_expires = ?, updated = ? {self._HELD}",
+                              (now + lease_s, now, task.id, task.owner)).rowcount == 1
+
+    def complete(self, task):
+        with self._connect() as db:
+            return db.execute(f"UPDATE tasks SET state = 'done', lease_owner = NULL, last_error = NULL, "
+                              f"updated = ? {self._HELD}", (time.time(), task.id, task.owner)).rowcount == 1
+
+    def fail(self, task, error):
+        now = time.time()
+        dead = task.attempts >= self.max_attempts
+        with self._connect() as db:
+            held = db.execute(f"UPDATE tasks SET state = ?, available_at = ?, lease_owner = NULL, last_error = ?, "
+                              f"updated = ? {self._HELD}",
+                              ("dead" if dead else "queued", now + (0 if dead else self._backoff(task.attempts)),
+                               str(error)[:2000], now, task.id, task.owner)).rowcount == 1
+        if not held:
+            return "lost"
+        return "dead" if dead else "retry"
+
+    def stats(self, run_id=None):
+        where, args = ("WHERE run_id = ?", (run_id,)) if run_id else ("", ())
+        with self._connect() as db:
+            rows = db.execute(f"SELECT kind, state, COUNT(*) AS n FROM tasks {where} GROUP BY kind, state", args)
+            out = {}
+            for r in rows:
+                out.setdefault(r["kind"], {})[r["state"]] = r["n"]
+        return out
+
+    def dead_letters(self, run_id=None):
+        where, args = ("AND run_id = ?", (run_id,)) if run_id else ("", ())
+        with self._connect() as db:
+            rows = db.execute(f"SELECT run_id, kind, key, attempts, last_error FROM tasks "
+                              f"WHERE state = 'dead' {where} ORDER BY id", args).fetchall()
+        return [dict(r) for r in rows]
+
+    def requeue_dead(self, run_id=None):
+        """Give dead-lettered tasks a fresh set of attempts (e.g. after fixing a site-specific bug)."""
+        where, args = ("AND run_id = ?", (run_id,)) if run_id else ("", ())
+        with self._connect() as db:
+            return db.execute(f"UPDATE tasks SET state = 'queued', attempts = 0, available_at = ?, updated = ? "
+                              f"WHERE state = 'dead' {where}", (time.time(), time.time(), *args)).rowcount
+
+
+class _Closing:
+    """`with` block that closes the connection (sqlite3's own context manager only commits)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is not None and self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+        self.db.close()
+
+
+class LeaseKeeper:
+    """Extends the leases of `tasks` every `lease_s / 3` seconds while the work runs."""
+
+    def __init__(self, queue, tasks, lease_s):
+        self.queue, self.tasks, self.lease_s = queue, tasks, lease_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        held = list(self.tasks)
+        while held and not self._stop.wait(self.lease_s / 3):
+            for task in list(held):
+                try:
+                    if not self.queue.extend(task, self.lease_s):
+                        held.remove(task)  # expired and taken over; complete()/fail() will report it
+                except sqlite3.Error:
+                    pass  # next heartbeat retries; the lease is only lost after lease_s
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._stop.set()
+        self._thread.join()
+
+
+# ----------------------
+# Shared result store
+# ----------------------
+class FileResultStore:
+    """
+    Results keyed by (run, kind, domain) as JSON files under `root`:
+    <root>/<run_id>/<kind>/<domain>.json. On a shared mount every host writes its own keys
+    (write-then-rename), so no locking is needed.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, run_id, kind, domain):
+        return os.path.join(self.root, run_id, kind, f"{domain}.json")
+
+    def put(self, run_id, kind, domain, record):
+        path = self._path(run_id, kind, domain)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = dict(record, run_id=run_id, kind=kind, domain=domain, stored=datetime.utcnow().isoformat())
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, default=str)
+        os.replace(tmp, path)
+        return path
+
+    def get(self, run_id, kind, domain):
+        path = self._path(run_id, kind, domain)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self, run_id, kind):
+        folder = os.path.join(self.root, run_id, kind)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(name[:-len(".json")] for name in os.listdir(folder) if name.endswith(".json"))
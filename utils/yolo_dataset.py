@@ -0,0 +1,198 @@
+# File: grid_parser_project/utils/yolo_dataset.py
+# Purpose: Build a YOLO dataset (images, labels, train/val split, dataset YAML) from step JSONs
+
+import os, json, shutil, struct, hashlib
+from multiprocessing import Pool
+
+
+# ----------------------
+# Image size from file headers (no pixel decode)
+# ----------------------
+def read_image_size(path):
+    """
+    Return (width, height) from the PNG/JPEG header, or None if the format is not recognised
+    or the header is cut short (a half-written screenshot).
+    """
+    with open(path, "rb") as f:
+        head = f.read(26)
+        if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR" and len(head) >= 24:
+            w, h = struct.unpack(">II", head[16:24])
+            return w, h
+        if head[:2] == b"\xff\xd8":
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC) carry the frame size
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    frame = f.read(7)
+                    if len(frame) < 7:
+                        return None
+                    h, w = struct.unpack(">HH", frame[3:7])
+                    return w, h
+                seg = f.read(2)
+                if len(seg) < 2:
+                    return None
+                f.seek(struct.unpack(">H", seg)[0] - 2, os.SEEK_CUR)
+    return None
+
+
+def file_sha1(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ----------------------
+# Labels
+# ----------------------
+def yolo_label_lines(comps, img_w, img_h, label_map, default_label):
+    """YOLO label lines with boxes clipped to the image; boxes fully outside are dropped."""
+    lines = []
+    for c in comps:
+        x1 = min(max(c["X"], 0), img_w)
+        y1 = min(max(c["Y"], 0), img_h)
+        x2 = min(max(c["X"] + c["Width"], 0), img_w)
+        y2 = min(max(c["Y"] + c["Height"], 0), img_h)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        lid = label_map.get(c["Tag"].lower(), default_label)
+        x_c = (x1 + x2) / 2 / img_w
+        y_c = (y1 + y2) / 2 / img_h
+        lines.append(f"{lid} {x_c:.6f} {y_c:.6f} {(x2 - x1) / img_w:.6f} {(y2 - y1) / img_h:.6f}\n")
+    return lines
+
+
+def iter_step_jsons(sources):
+    """Stream (json_path, screenshot_path) for every JSON in the given (json_dir, screenshot_dir) pairs."""
+    for json_dir, screenshot_dir in sources:
+        if not os.path.isdir(json_dir):
+            continue
+        for entry in sorted(os.scandir(json_dir), key=lambda e: e.name):
+            if entry.name.endswith(".json"):
+                yield entry.path, screenshot_dir
+
+
+# ----------------------
+# Worker functions (top-level so they can run in a process pool)
+# ----------------------
+def _probe(args):
+    """Screenshot size, content hash and label lines of one JSON (None if it cannot be used)."""
+    json_path, screenshot_dir, label_map, default_label = args
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        shot = os.path.basename(data.get("Screenshot", ""))
+        shot_path = os.path.join(screenshot_dir, shot)
+        if not shot or not os.path.isfile(shot_path):
+            return None
+        size = read_image_size(shot_path)
+        if size is None:
+            import cv2
+            img = cv2.imread(shot_path)
+            if img is None:
+                return None
+            size = (img.shape[1], img.shape[0])
+        labels = yolo_label_lines(data.get("UI Components", []), size[0], size[1], label_map, default_label)
+        return {"json": json_path, "image": shot_path, "sha1": file_sha1(shot_path), "labels": labels}
+    except (OSError, ValueError, KeyError, struct.error) as ex:
+        print(f"Skipping {json_path}: {ex}")
+        return None
+
+
+def _sample_paths(rec, out_dir):
+    """(image, label) paths of a sample in the dataset; the content hash in the name keeps them unique."""
+    stem = f"{os.path.splitext(os.path.basename(rec['image']))[0]}_{rec['sha1'][:10]}"
+    ext = os.path.splitext(rec["image"])[1]
+    return (os.path.join(out_dir, "images", rec["split"], stem + ext),
+            os.path.join(out_dir, "labels", rec["split"], stem + ".txt"))
+
+
+def _write_sample(task):
+    rec, out_dir = task
+    img_out, lbl_out = _sample_paths(rec, out_dir)
+
+    if not os.path.exists(img_out):
+        try:
+            os.link(rec["image"], img_out)
+        except OSError:
+            shutil.copy2(rec["image"], img_out)
+    with open(lbl_out, "w") as tf:
+        tf.writelines(rec["labels"])
+    return len(rec["labels"])
+
+
+# ----------------------
+# Builder
+# ----------------------
+def _split_of(sha1, val_fraction):
+    # Content-hash based split: stable across runs, machines and file order
+    return "val" if int(sha1[:8], 16) % 10_000 < val_fraction * 10_000 else "train"
+
+
+def _prune(out_dir, keep):
+    """Remove images/labels of earlier builds that are not in `keep`, and the trainer's stale label caches."""
+    removed = 0
+    for sub in ("images", "labels"):
+        for split in ("train", "val"):
+            folder = os.path.join(out_dir, sub, split)
+            for entry in os.scandir(folder):
+                if entry.is_file() and entry.path not in keep:
+                    os.remove(entry.path)
+                    removed += 1
+    for split in ("train", "val"):
+        cache = os.path.join(out_dir, "labels", f"{split}.cache")
+        if os.path.isfile(cache):
+            os.remove(cache)
+    return removed
+
+
+def build_yolo_dataset(sources, out_dir, yaml_path, class_names, val_fraction=0.2, workers=None, chunksize=64):
+    """
+    Stream all step JSONs, de-duplicate identical screenshots by content hash, write clipped
+    YOLO labels in parallel into images/{train,val} + labels/{train,val}, and write the dataset YAML.
+    The dataset is rebuilt from scratch: samples of earlier builds that are no longer produced
+    (removed or re-captured screenshots) are deleted.
+    """
+    label_map = {name: i for i, name in enumerate(class_names)}
+    default_label = len(class_names) - 1
+
+    for sub in ("images", "labels"):
+        for split in ("train", "val"):
+            os.makedirs(os.path.join(out_dir, sub, split), exist_ok=True)
+
+    with Pool(processes=workers) as pool:
+        # Results arrive in completion order; of identical screenshots the first JSON by path wins
+        unique, dupes = {}, 0
+        probes = ((path, shot_dir, label_map, default_label) for path, shot_dir in iter_step_jsons(sources))
+        for rec in pool.imap_unordered(_probe, probes, chunksize=chunksize):
+            if rec is None:
+                continue
+            if rec["sha1"] in unique:
+                dupes += 1
+                if rec["json"] >= unique[rec["sha1"]]["json"]:
+                    continue
+            rec["split"] = _split_of(rec["sha1"], val_fraction)
+            unique[rec["sha1"]] = rec
+
+        tasks = ((rec, out_dir) for rec in unique.values())
+        n_labels = sum(pool.imap_unordered(_write_sample, tasks, chunksize=chunksize))
+
+    keep = {path for rec in unique.values() for path in _sample_paths(rec, out_dir)}
+    stale = _prune(out_dir, keep)
+
+    n_val = sum(1 for r in unique.values() if r["split"] == "val")
+    with open(yaml_path, "w", encoding="utf-8") as yf:
+        yf.write(f"path: {os.path.abspath(out_dir)}\n")
+        yf.write("train: images/train\n")
+        yf.write("val: images/val\n")
+        yf.write("names:\n")
+        for i, name in enumerate(class_names):
+            yf.write(f"  {i}: {name}\n")
+
+    print(f"YOLO dataset: {len(unique)} images ({len(unique) - n_val} train / {n_val} val), "
+          f"{n_labels} boxes, {dupes} duplicate screenshots skipped, {stale} stale files removed -> {yaml_path}")
+    return {"images": len(unique), "val": n_val, "labels": n_labels, "duplicates": dupes, "removed": stale}
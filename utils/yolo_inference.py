@@ -0,0 +1,215 @@
+# File: grid_parser_project/utils/yolo_inference.py
+# Purpose: CPU YOLO inference (ONNX / OpenVINO export, batched letterbox inference, tiling, benchmarks)
+
+import os, time
+import cv2
+import numpy as np
+
+
+# ----------------------
+# Export
+# ----------------------
+def export_yolo_model(weights, export_format="onnx", imgsz=640):
+    """
+    Export trained YOLO weights for CPU inference and return the exported model path.
+    The export is cached next to the weights and only redone when the weights are newer.
+    """
+    from ultralytics import YOLO
+
+    stem = os.path.splitext(weights)[0]
+    exported = f"{stem}.onnx" if export_format == "onnx" else f"{stem}_openvino_model"
+    if os.path.exists(exported) and os.path.getmtime(exported) >= os.path.getmtime(weights):
+        return exported
+
+    print(f"Exporting {weights} to {export_format} (imgsz={imgsz})...")
+    # dynamic=True keeps the batch axis free so the same file serves every batch size
+    kwargs = {"format": export_format, "imgsz": imgsz}
+    if export_format == "onnx":
+        kwargs["dynamic"] = True
+    return YOLO(weights).export(**kwargs)
+
+
+def load_cpu_model(model_path, num_threads=None):
+    """Return a callable mapping a float32 NCHW batch to the raw YOLO output (B, 4 + nc, N)."""
+    if model_path.endswith(".onnx"):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        if num_threads:
+            opts.intra_op_num_threads = num_threads
+        session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+        return lambda batch: session.run(None, {input_name: batch})[0]
+
+    import openvino as ov
+    core = ov.Core()
+    xml = next(os.path.join(model_path, f) for f in os.listdir(model_path) if f.endswith(".xml"))
+    model = core.read_model(xml)
+    model.reshape([-1, 3, -1, -1])  # dynamic batch
+    config = {"INFERENCE_NUM_THREADS": num_threads} if num_threads else {}
+    compiled = core.compile_model(model, "CPU", config)
+    return lambda batch: compiled(batch)[0]
+
+
+# ----------------------
+# Pre / post processing
+# ----------------------
+def letterbox(img, imgsz=640, pad_value=114):
+    """Resize keeping aspect ratio and pad to a square; returns (image, ratio, (pad_x, pad_y))."""
+    h, w = img.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else img
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    out = np.full((imgsz, imgsz, 3), pad_value, dtype=np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return out, ratio, (pad_x, pad_y)
+
+
+def tile_offsets(img_h, tile_h, overlap=0.2):
+    """Vertical tile start rows covering a tall page; short images get a single tile."""
+    if img_h <= tile_h * 1.25:
+        return [0]
+    step = max(1, int(tile_h * (1 - overlap)))
+    offsets = list(range(0, img_h - tile_h, step))
+    offsets.append(img_h - tile_h)
+    return offsets
+
+
+def decode_yolo_output(pred, ratio, pad, y_offset=0, conf_thresh=0.25):
+    """Turn one (4 + nc, N) YOLOv8 prediction into page-space [x, y, w, h], scores, class ids."""
+    scores_all = pred[4:].T
+    cls = scores_all.argmax(axis=1)
+    conf = scores_all[np.arange(len(cls)), cls]
+    keep = conf >= conf_thresh
+    cx, cy, w, h = pred[:4, keep]
+    x = (cx - w / 2 - pad[0]) / ratio
+    y = (cy - h / 2 - pad[1]) / ratio + y_offset
+    boxes = np.stack([x, y, w / ratio, h / ratio], axis=1)
+    return boxes, conf[keep], cls[keep]
+
+
+def nms_per_class(boxes, scores, classes, iou_thresh=0.45):
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # Offsetting boxes by class id makes one NMS call class-aware
+    offset = classes[:, None] * (boxes[:, :2].max() + boxes[:, 2:].max() + 1)
+    shifted = boxes.copy()
+    shifted[:, :2] += offset
+    keep = cv2.dnn.NMSBoxes(shifted.tolist(), scores.tolist(), 0.0, iou_thresh)
+    return np.asarray(keep, dtype=np.int64).reshape(-1)
+
+
+def detections_to_components(boxes, scores, classes, class_names, img_w, img_h):
+    """Emit detections in the same schema as the DOM-extracted UI components."""
+    comps = []
+    for (x, y, w, h), conf, cid in zip(boxes.tolist(), scores.tolist(), classes.tolist()):
+        x1, y1 = max(0, int(round(x))), max(0, int(round(y)))
+        x2, y2 = min(img_w, int(round(x + w))), min(img_h, int(round(y + h)))
+        if x2 <= x1 or y2 <= y1:
+            continue
+        comps.append({
+            "Tag": class_names[cid] if cid < len(class_names) else str(cid),
+            "Text": "N/A",
+            "Role": "",
+            "AriaLabel": "",
+            "Class": "",
+            "InnerHTML": "",
+            "X": x1,
+            "Y": y1,
+            "Width": x2 - x1,
+            "Height": y2 - y1,
+            "YOLO_Class": int(cid),
+            "Confidence": round(float(conf), 4),
+            "Source": "yolo"
+        })
+    return comps
+
+
+# ----------------------
+# Batched inference over many images
+# ----------------------
+def _iter_tiles(image_paths, imgsz, overlap):
+    for idx, path in enumerate(image_paths):
+        img = cv2.imread(path)
+        if img is None:
+            print(f"Could not load for YOLO inference: {path}")
+            yield idx, None, None, 0, None, (0, 0)
+            continue
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        img_h, img_w = img.shape[:2]
+        offsets = tile_offsets(img_h, img_w, overlap)
+        for y0 in offsets:
+            tile, ratio, pad = letterbox(img[y0:y0 + img_w] if len(offsets) > 1 else img, imgsz)
+            yield idx, tile, (ratio, pad, y0), len(offsets), path, (img_w, img_h)
+
+
+def run_batched_inference(model_fn, image_paths, class_names, imgsz=640, batch_size=8,
+                          conf_thresh=0.25, iou_thresh=0.45, overlap=0.2):
+    """
+    Run letterboxed inference over all images, packing tiles of several images into each batch.
+    Tall full-page screenshots are cut into overlapping square tiles; detections from all tiles
+    of a page are merged with class-aware NMS. Returns {image_path: [component, ...]}.
+    """
+    results = {}
+    pending = {}  # idx -> [boxes, scores, classes, tiles_left, path, size]
+    batch, metas = [], []
+
+    def flush():
+        if not batch:
+            return
+        arr = np.stack(batch).transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        preds = model_fn(arr)
+        for pred, (idx, (ratio, pad, y0)) in zip(preds, metas):
+            b, s, c = decode_yolo_output(pred, ratio, pad, y0, conf_thresh)
+            entry = pending[idx]
+            entry[0].append(b); entry[1].append(s); entry[2].append(c)
+            entry[3] -= 1
+            if entry[3] == 0:
+                _finish(idx)
+        batch.clear()
+        metas.clear()
+
+    def _finish(idx):
+        boxes_l, scores_l, classes_l, _, path, (img_w, img_h) = pending.pop(idx)
+        boxes = np.concatenate(boxes_l) if boxes_l else np.empty((0, 4))
+        scores = np.concatenate(scores_l) if scores_l else np.empty(0)
+        classes = np.concatenate(classes_l) if classes_l else np.empty(0, dtype=np.int64)
+        keep = nms_per_class(boxes, scores, classes, iou_thresh)
+        results[path] = detections_to_components(boxes[keep], scores[keep], classes[keep],
+                                                 class_names, img_w, img_h)
+
+    for idx, tile, meta, n_tiles, path, size in _iter_tiles(image_paths, imgsz, overlap):
+        if tile is None:
+            continue
+        if idx not in pending:
+            pending[idx] = [[], [], [], n_tiles, path, size]
+        batch.append(tile)
+        metas.append((idx, meta))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return results
+
+
+# ----------------------
+# Benchmark
+# ----------------------
+def benchmark_inference(model_fn, image_paths, class_names, batch_sizes=(1, 4, 8, 16), imgsz=640, warmup=1):
+    """Images/second of the full decode -> letterbox -> infer -> NMS path at several batch sizes."""
+    rows = []
+    if not image_paths:
+        return rows
+    for _ in range(warmup):
+        run_batched_inference(model_fn, image_paths[:1], class_names, imgsz=imgsz, batch_size=1)
+    for bs in batch_sizes:
+        t0 = time.perf_counter()
+        run_batched_inference(model_fn, image_paths, class_names, imgsz=imgsz, batch_size=bs)
+        elapsed = time.perf_counter() - t0
+        rows.append({
+            "Batch_Size": bs,
+            "Images": len(image_paths),
+            "Seconds": round(elapsed, 4),
+            "Images_Per_Second": round(len(image_paths) / elapsed, 3) if elapsed else None
+        })
+        print(f"[YOLO BENCH] batch={bs}: {rows[-1]['Images_Per_Second']} images/s")
+    return rows